@@ -1,3 +1,18 @@
 from django.contrib import admin
 
+from .jobs import requeue_dead
+from .models import Job
+
 # Register your models here.
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'updated_at')
+    list_filter = ('status', 'name')
+    search_fields = ('idempotency_key',)
+    readonly_fields = ('last_error',)
+    actions = ['requeue']
+    
+    @admin.action(description="Requeue selected dead jobs")
+    def requeue(self, request, queryset):
+        self.message_user(request, f"{requeue_dead(queryset)} jobs requeued")
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BaseAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base_app'
+
+    def ready(self):
+        # registers the job handlers
+        from . import tasks
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+
+
+class AsyncAPIView(View):
+    """
+    Small async counterpart of DRF's APIView for read endpoints served under
+    ASGI: authentication classes with an `aauthenticate()` coroutine, an
+    optional login requirement and DRF style JSON errors. Handlers are
+    `async def` methods returning Django responses.
+    """
+    authentication_classes = ()
+    authentication_required = False
+
+    async def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            result = await authentication_class().aauthenticate(request)
+            if result is not None:
+                return result[0]
+        return AnonymousUser()
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, None) if method in self.http_method_names else None
+        if handler is None:
+            return HttpResponseNotAllowed(self._allowed_methods())
+        try:
+            request.user = await self.authenticate(request)
+            if self.authentication_required and not request.user.is_authenticated:
+                raise NotAuthenticated()
+            return await handler(request, *args, **kwargs)
+        except Http404:
+            return self.handle_exception(request, NotFound())
+        except APIException as exc:
+            return self.handle_exception(request, exc)
+
+    def handle_exception(self, request, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = JsonResponse(data, status=exc.status_code, safe=False)
+        if exc.status_code == 401 and self.authentication_classes:
+            response['WWW-Authenticate'] = self.authentication_classes[0]().authenticate_header(request)
+        return response
@@ -0,0 +1,136 @@
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+from .metrics import incr
+
+
+class NotModified(Exception):
+    """Carries a 304/412 response out of a view, before anything is serialized."""
+    def __init__(self, response):
+        self.response = response
+
+
+def resolve(obj, path):
+    """getattr() over a dotted path, None when any part is missing."""
+    for name in path.split('.'):
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def conditional_response(request, etag=None, last_modified=None):
+    """
+    304 (or 412) response for `request` when its validators match, otherwise
+    None. `last_modified` is an HTTP date string, as stored in the header.
+    """
+    timestamp = parse_http_date_safe(last_modified) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        incr('conditional.not_modified')
+    return response
+
+
+def record_full_response(response, started):
+    """
+    Counts payload bytes and serialization + render CPU time of responses
+    sent in full; together with `conditional.not_modified` they give the
+    bytes and CPU that 304 responses saved.
+    """
+    def callback(rendered):
+        incr('conditional.full')
+        incr('conditional.full_bytes', len(rendered.content))
+        incr('conditional.full_cpu_us', int((time.process_time() - started) * 1000000))
+    response.add_post_render_callback(callback)
+
+
+class ConditionalGetMixin:
+    """
+    Weak ETags for list and retrieve endpoints, computed from the objects on
+    the page before they are serialized. An object contributes its pk and the
+    attributes in `etag_fields` (dotted paths, e.g. 'author.updated_at'),
+    which must cover everything in its representation that can change:
+    `updated_at` for edits and the denormalized counters for likes/comments.
+    Matching `If-None-Match` requests are answered with 304 and nothing is
+    serialized.
+
+    `last_modified_fields` enables Last-Modified/If-Modified-Since on
+    retrieve(); only set it when those timestamps alone cover the payload.
+    """
+    etag_fields = ('updated_at',)
+    last_modified_fields = ()
+
+    def prepare_objects(self, objects):
+        """Hook to load extra data for the objects of the page before they are checked."""
+        return objects
+
+    def get_etag_parts(self, obj):
+        return [obj.pk] + [resolve(obj, field) for field in self.etag_fields]
+
+    def compute_etag(self, objects):
+        request = self.request
+        digest = hashlib.md5()
+        # payloads differ per viewer (`request_user_liked`) and per renderer
+        digest.update(f"{request.user.pk}:{request.accepted_renderer.format}".encode())
+        paginator = getattr(self, 'paginator', None)
+        for name in ('count', 'has_next', 'has_previous'):
+            digest.update(repr(getattr(paginator, name, None)).encode())
+        for obj in objects:
+            digest.update(repr(self.get_etag_parts(obj)).encode())
+        return f'W/"{digest.hexdigest()}"'
+
+    def compute_last_modified(self, obj):
+        timestamps = [value for value in (resolve(obj, field) for field in self.last_modified_fields) if value]
+        if timestamps:
+            return http_date(max(timestamps).timestamp())
+        return None
+
+    def check_not_modified(self, objects, last_modified=None):
+        self.etag = self.compute_etag(objects)
+        self.last_modified = last_modified
+        response = conditional_response(self.request, etag=self.etag, last_modified=last_modified)
+        if response is not None:
+            raise NotModified(self.set_validators(response))
+
+    def set_validators(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified:
+            response['Last-Modified'] = self.last_modified
+        # clients may keep the payload but have to revalidate it every time
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = self.prepare_objects(page if page is not None else list(queryset))
+        self.check_not_modified(objects)
+
+        started = time.process_time()
+        serializer = self.get_serializer(objects, many=True)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        record_full_response(response, started)
+        return self.set_validators(response)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        self.prepare_objects([instance])
+        self.check_not_modified([instance], self.compute_last_modified(instance))
+
+        started = time.process_time()
+        response = Response(self.get_serializer(instance).data)
+        record_full_response(response, started)
+        return self.set_validators(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
@@ -0,0 +1,21 @@
+from django.db.models import F
+from django.db.models.functions import Greatest, Now
+
+
+def shift_counter(queryset, field, delta):
+    """
+    Atomically add `delta` to a counter column without reading it first.
+    Decrements are clamped at zero so a drifted counter never goes negative.
+    `updated_at` is bumped in the same statement, so it stays a valid
+    Last-Modified for rows whose representation includes the counter.
+    """
+    if delta == 0:
+        return 0
+    if delta > 0:
+        expression = F(field) + delta
+    else:
+        expression = Greatest(F(field) + delta, 0)
+    values = {field: expression}
+    if any(model_field.name == 'updated_at' for model_field in queryset.model._meta.concrete_fields):
+        values['updated_at'] = Now()
+    return queryset.update(**values)
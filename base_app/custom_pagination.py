@@ -1,5 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 class CustomPagination(PageNumberPagination):
     page_size = 10
@@ -12,4 +22,209 @@ class CustomPagination(PageNumberPagination):
             "previous":self.get_previous_link(),
             "count":self.page.paginator.count,
             "results":data
-        })
\ No newline at end of file
+        })
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, id).
+
+    Unlike CustomPagination there is no OFFSET and no COUNT(*) per request:
+    every page is a range scan that starts right after the previous one,
+    so page N costs the same as page 1.
+    Cursors are signed, so clients can not forge or tamper with them.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    include_count = True
+    count_cache_timeout = 60
+    cursor_salt = 'base_app.custom_pagination.KeysetPagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.start(request)
+        self.count = self.get_count(queryset)
+
+        results = list(self.get_page_queryset(queryset)[:self.page_size + 1])
+        return self.get_page(results)
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() for async views, on the async ORM."""
+        self.start(request)
+        self.count = await self.aget_count(queryset)
+
+        page_queryset = self.get_page_queryset(queryset)[:self.page_size + 1]
+        # chunk_size lets aiterator() honour prefetch_related() too
+        results = [obj async for obj in page_queryset.aiterator(chunk_size=self.page_size + 1)]
+        return self.get_page(results)
+
+    def start(self, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+    def get_page_queryset(self, queryset):
+        """
+        Filter and order `queryset` for the requested page. The caller fetches
+        page_size + 1 rows and passes them to get_page().
+        """
+        reverse = self.cursor is not None and self.cursor['reverse']
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(self.cursor['position'], reverse))
+        return queryset.order_by(*self.get_ordering(reverse))
+
+    def get_page(self, results):
+        reverse = self.cursor is not None and self.cursor['reverse']
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        self.page = results
+        return results
+
+    @property
+    def fields(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def get_cursor_filter(self, position, reverse=False):
+        descending = self.ordering[0].startswith('-') != reverse
+        lookup = 'lt' if descending else 'gt'
+        (first, second), (value, pk) = self.fields, position
+        # The redundant `first <= value` bound lets the database use a plain
+        # index range scan on (first, second) instead of evaluating the OR.
+        bound = Q(**{f'{first}__{lookup}e': value})
+        after = Q(**{f'{first}__{lookup}': value}) | Q(**{first: value, f'{second}__{lookup}': pk})
+        return bound & after
+
+    def get_page_size(self, request):
+        query_params = getattr(request, 'query_params', request.GET)
+        try:
+            page_size = int(query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, obj, reverse):
+        position = []
+        for field in self.fields:
+            value = getattr(obj, field)
+            position.append(value.isoformat() if isinstance(value, datetime) else str(value))
+        return signing.dumps({'p': position, 'r': int(reverse)}, salt=self.cursor_salt, compress=True)
+
+    def decode_cursor(self, request):
+        query_params = getattr(request, 'query_params', request.GET)
+        token = query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            data = signing.loads(token, salt=self.cursor_salt)
+            value, pk = data['p']
+            return {'position': (value, pk), 'reverse': bool(data['r'])}
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(self.page[-1], reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.page[0], reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_count(self, queryset):
+        """
+        Cheap, possibly approximate row count. Unfiltered tables on PostgreSQL
+        use the planner estimate from pg_class, everything else is an exact
+        count cached for `count_cache_timeout` seconds.
+        """
+        if not self.include_count:
+            return None
+        estimate = self.estimate_table_count(queryset)
+        if estimate is not None:
+            return estimate
+        key = self.count_cache_key(queryset)
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    async def aget_count(self, queryset):
+        if not self.include_count:
+            return None
+        estimate = await sync_to_async(self.estimate_table_count)(queryset)
+        if estimate is not None:
+            return estimate
+        key = self.count_cache_key(queryset)
+        count = await cache.aget(key)
+        if count is None:
+            count = await queryset.order_by().acount()
+            await cache.aset(key, count, self.count_cache_timeout)
+        return count
+
+    @staticmethod
+    def count_cache_key(queryset):
+        return 'keyset-count:' + hashlib.md5(str(queryset.order_by().query).encode()).hexdigest()
+
+    @staticmethod
+    def estimate_table_count(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 for tables that were never vacuumed or analyzed
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
+
+    def get_paginated_data(self, data):
+        return {
+            "next":self.get_next_link(),
+            "previous":self.get_previous_link(),
+            "count":self.count,
+            "results":data
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class OldestFirstKeysetPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
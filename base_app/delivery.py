@@ -0,0 +1,163 @@
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from .metrics import incr
+
+
+DEFAULTS = {
+    'MAIL': {
+        'RATE': 20,             # messages per second per worker process, None for no limit
+        'BURST': 50,
+        'IDLE_TIMEOUT': 60,     # seconds; most SMTP servers drop idle clients after a few minutes
+        'MAX_MESSAGES': 100,    # messages per connection before it is reopened
+    },
+    'SMS': {
+        'RATE': 1,
+        'BURST': 5,
+    },
+}
+
+
+def delivery_setting(provider, name):
+    return {**DEFAULTS[provider], **getattr(settings, 'DELIVERY', {}).get(provider, {})}[name]
+
+
+class TokenBucket:
+    """
+    Allows `rate` operations per second on average and bursts of `burst`.
+    acquire() blocks until a token is free, which slows the worker down to
+    what the provider accepts instead of collecting rejections.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token and return the seconds spent waiting for it."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def throttle(provider):
+    """Wait for the rate limit of `provider` ('MAIL' or 'SMS'); shared by every thread of the process."""
+    rate = delivery_setting(provider, 'RATE')
+    if not rate:
+        return
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None or (limiter.rate, limiter.burst) != (rate, delivery_setting(provider, 'BURST')):
+            limiter = _limiters[provider] = TokenBucket(rate, delivery_setting(provider, 'BURST'))
+    waited = limiter.acquire()
+    if waited:
+        incr(f'delivery.{provider.lower()}.throttled_us', int(waited * 1000000))
+
+
+class MailConnection:
+    """
+    A long-lived connection of the configured email backend, one per worker
+    thread (see mail_connection()). It is opened on first use and reopened
+    when it was idle for IDLE_TIMEOUT, after MAX_MESSAGES messages, or when
+    the server dropped it.
+    """
+    def __init__(self):
+        self.connection = None
+        self.sent = 0
+        self.last_used = 0.0
+
+    def open(self):
+        self.close()
+        self.connection = get_connection()
+        self.connection.open()
+        self.sent = 0
+        incr('delivery.mail.connections')
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                # the server may already be gone, there is nothing left to clean up
+                pass
+            self.connection = None
+
+    def stale(self):
+        return (
+            self.connection is None
+            or self.sent >= delivery_setting('MAIL', 'MAX_MESSAGES')
+            or time.monotonic() - self.last_used > delivery_setting('MAIL', 'IDLE_TIMEOUT')
+        )
+
+    def send(self, message):
+        throttle('MAIL')
+        if self.stale():
+            self.open()
+        started = time.perf_counter()
+        try:
+            try:
+                self.deliver(message)
+            except smtplib.SMTPServerDisconnected:
+                # dropped between two messages; one reconnect, real errors still propagate
+                self.open()
+                self.deliver(message)
+        except Exception:
+            incr('delivery.mail.failed')
+            # the session may be left mid-transaction, the next message starts a fresh one
+            self.close()
+            raise
+        finally:
+            self.last_used = time.monotonic()
+        incr('delivery.mail.sent')
+        incr('delivery.mail.send_us', int((time.perf_counter() - started) * 1000000))
+
+    def deliver(self, message):
+        message.connection = self.connection
+        message.send()
+        self.sent += 1
+
+
+_local = threading.local()
+
+
+def mail_connection():
+    if not hasattr(_local, 'mail'):
+        _local.mail = MailConnection()
+    return _local.mail
+
+
+def close_connections():
+    """Close the connection of the calling thread, e.g. when a worker shuts down."""
+    if hasattr(_local, 'mail'):
+        _local.mail.close()
+
+
+def send_sms(sender, to, body):
+    throttle('SMS')
+    started = time.perf_counter()
+    try:
+        sender.send(to, body)
+    except Exception:
+        incr('delivery.sms.failed')
+        raise
+    incr('delivery.sms.sent')
+    incr('delivery.sms.send_us', int((time.perf_counter() - started) * 1000000))
@@ -0,0 +1,187 @@
+import logging
+import traceback
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .metrics import incr
+from .models import Job, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_DEAD
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # run jobs in the enqueueing process right after commit, for development and tests
+    'EAGER': False,
+    'WORKERS': 4,
+    'CLAIM_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 10,
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 5 * 60,
+    'POLL_INTERVAL': 1,
+    'KEEP_DONE': 7 * 24 * 60 * 60,
+}
+
+
+def jobs_setting(name):
+    return getattr(settings, 'JOBS', {}).get(name, DEFAULTS[name])
+
+
+# name -> (handler, batch_size)
+handlers = {}
+
+
+def task(name, batch_size=None):
+    """
+    Register a job handler under `name`.
+
+    A plain handler is called with the payload of one job. With `batch_size`
+    the handler gets a list of up to that many payloads, so it can share a
+    connection between them, and returns a list with an exception (or None)
+    per payload; only the failed jobs are retried.
+    """
+    def register(handler):
+        handlers[name] = (handler, batch_size)
+        return handler
+    return register
+
+
+def enqueue(name, payload, key=None, delay=0, max_attempts=None):
+    """
+    Queue a job; it becomes visible to workers when the current transaction
+    commits. With `key`, a job that was already queued under the same key is
+    returned instead of queueing a second one.
+    """
+    fields = {
+        'name': name,
+        'payload': payload,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+        'max_attempts': max_attempts or jobs_setting('MAX_ATTEMPTS'),
+    }
+    if key is None:
+        job, created = Job.objects.create(**fields), True
+    else:
+        job, created = Job.objects.get_or_create(idempotency_key=key, defaults=fields)
+    if created:
+        incr('jobs.enqueued')
+        if jobs_setting('EAGER') and not delay:
+            # robust: the job is stored, a failure here is retried by the worker
+            transaction.on_commit(lambda: run(claim(ids=[job.pk])), robust=True)
+    return job
+
+
+def claim(limit=None, ids=None):
+    """
+    Lease up to `limit` due jobs to the calling worker. Rows locked by
+    another worker are skipped instead of waited on, so workers never run
+    the same job twice or block each other.
+    """
+    now = timezone.now()
+    due = Q(status=JOB_QUEUED, run_at__lte=now) | Q(status=JOB_RUNNING, locked_until__lt=now)
+    queryset = Job.objects.filter(due)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    with transaction.atomic():
+        pks = list(
+            queryset.select_for_update(skip_locked=True)
+            .order_by('run_at').values_list('pk', flat=True)[:limit or jobs_setting('CLAIM_SIZE')]
+        )
+        Job.objects.filter(pk__in=pks).update(
+            status=JOB_RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=jobs_setting('LEASE')),
+            updated_at=now,
+        )
+    return list(Job.objects.filter(pk__in=pks).order_by('run_at'))
+
+
+def batches(jobs):
+    """Split claimed jobs into the units handed to a handler: one job, or up to `batch_size` of the same name."""
+    by_name = {}
+    for job in jobs:
+        by_name.setdefault(job.name, []).append(job)
+    for name, group in by_name.items():
+        batch_size = handlers.get(name, (None, None))[1]
+        if not batch_size:
+            yield from ([job] for job in group)
+            continue
+        group = iter(group)
+        while batch := list(islice(group, batch_size)):
+            yield batch
+
+
+def run(jobs):
+    for batch in batches(jobs):
+        run_batch(batch)
+
+
+def run_batch(jobs):
+    name = jobs[0].name
+    if name not in handlers:
+        for job in jobs:
+            finish(job, LookupError(f"No handler registered for job '{name}'"), retry=False)
+        return
+    handler, batch_size = handlers[name]
+    try:
+        if batch_size:
+            errors = handler([job.payload for job in jobs])
+        else:
+            handler(jobs[0].payload)
+            errors = [None]
+    except Exception as exc:
+        errors = [exc] * len(jobs)
+    for job, error in zip(jobs, errors):
+        finish(job, error)
+
+
+def backoff(attempts):
+    return min(jobs_setting('BACKOFF_BASE') * 2 ** (attempts - 1), jobs_setting('BACKOFF_MAX'))
+
+
+def finish(job, error=None, retry=True):
+    now = timezone.now()
+    changes = {'locked_until': None, 'updated_at': now}
+    if error is None:
+        changes.update(status=JOB_DONE, last_error='')
+        incr('jobs.done')
+    else:
+        logger.warning("Job %s (%s) failed on attempt %s: %r", job.pk, job.name, job.attempts, error)
+        changes['last_error'] = ''.join(traceback.format_exception(error))
+        if retry and job.attempts < job.max_attempts:
+            changes.update(status=JOB_QUEUED, run_at=now + timedelta(seconds=backoff(job.attempts)))
+            incr('jobs.retried')
+        else:
+            changes['status'] = JOB_DEAD
+            incr('jobs.dead')
+    # only while this worker still holds the job, a job whose lease ran out
+    # may already belong to someone else
+    Job.objects.filter(pk=job.pk, status=JOB_RUNNING, attempts=job.attempts).update(**changes)
+
+
+def run_in_worker(jobs):
+    try:
+        run(jobs)
+    except Exception:
+        logger.exception("Job worker failed")
+    finally:
+        close_old_connections()
+
+
+def requeue_dead(queryset=None):
+    """Give dead jobs a fresh set of attempts."""
+    queryset = Job.objects.all() if queryset is None else queryset
+    return queryset.filter(status=JOB_DEAD).update(
+        status=JOB_QUEUED, attempts=0, run_at=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def purge_done(older_than=None):
+    seconds = jobs_setting('KEEP_DONE') if older_than is None else older_than
+    cutoff = timezone.now() - timedelta(seconds=seconds)
+    deleted, _ = Job.objects.filter(status=JOB_DONE, updated_at__lt=cutoff).delete()
+    return deleted
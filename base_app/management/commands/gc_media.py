@@ -0,0 +1,52 @@
+import os
+import time
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+
+from base_app.storage import ContentAddressedStorage, fields_using
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed blobs that no row refers to (left behind by crashes or rollbacks)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=ContentAddressedStorage.grace,
+                            help="Skip files younger than this many seconds; their rows may not be committed yet")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        storage = storages['default']
+        if not isinstance(storage, ContentAddressedStorage):
+            self.stderr.write("The default storage is not a ContentAddressedStorage, nothing to do")
+            return
+
+        cutoff = time.time() - options['grace']
+        root = storage.path(storage.prefix)
+        candidates = []
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.path.getmtime(path) < cutoff:
+                    candidates.append(os.path.relpath(path, storage.location).replace(os.sep, '/'))
+
+        deleted = freed = 0
+        for start in range(0, len(candidates), options['batch_size']):
+            batch = candidates[start:start + options['batch_size']]
+            referenced = set()
+            for model, field in fields_using(storage):
+                referenced.update(
+                    model._base_manager.filter(**{f'{field.name}__in': batch}).values_list(field.name, flat=True)
+                )
+            for name in batch:
+                if name in referenced:
+                    continue
+                freed += storage.size(name)
+                deleted += 1
+                if not options['dry_run']:
+                    # bypasses the per-file reference check, done above in bulk
+                    os.remove(storage.path(name))
+
+        action = "would be deleted" if options['dry_run'] else "deleted"
+        self.stdout.write(f"{deleted} orphaned blobs ({freed} bytes) {action}")
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import aiohttp
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent GET requests to a running server and report throughput and latency. "
+        "Run it once against a WSGI and once against an ASGI deployment to compare them, "
+        "e.g. /post/feed/ against /async/post/feed/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--header', action='append', default=[], help="'Name: value', may be repeated")
+
+    def handle(self, *args, **options):
+        headers = {}
+        for header in options['header']:
+            name, sep, value = header.partition(':')
+            if not sep:
+                raise CommandError(f"Invalid header '{header}', expected 'Name: value'")
+            headers[name.strip()] = value.strip()
+
+        started = time.perf_counter()
+        latencies, statuses = asyncio.run(self.run(options['url'], headers, options['requests'], options['concurrency']))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        self.stdout.write(f"{len(latencies)} requests in {elapsed:.2f}s, {len(latencies) / elapsed:.1f} req/s")
+        for name, quantile in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+            self.stdout.write(f"{name}: {latencies[min(int(len(latencies) * quantile), len(latencies) - 1)] * 1000:.1f}ms")
+        for status, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+            self.stdout.write(f"status {status}: {count}")
+
+    async def run(self, url, headers, total, concurrency):
+        latencies, statuses = [], {}
+        remaining = iter(range(total))
+
+        async def worker(session):
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                        status = response.status
+                except aiohttp.ClientError as exc:
+                    status = type(exc).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+            await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        return latencies, statuses
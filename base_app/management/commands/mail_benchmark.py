@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from base_app import delivery
+
+
+class StubSMTPServer:
+    """
+    Accepts and discards mail on localhost, answering like a real server
+    does, so the benchmark measures the client side and the round trips.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+
+    async def reply(self, writer, line):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(line)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        await self.reply(writer, b'220 stub ESMTP\r\n')
+        while line := await reader.readline():
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                await self.reply(writer, b'250 stub\r\n')
+            elif command == b'DATA':
+                await self.reply(writer, b'354 go ahead\r\n')
+                while (line := await reader.readline()) not in (b'.\r\n', b''):
+                    pass
+                self.messages += 1
+                await self.reply(writer, b'250 queued\r\n')
+            elif command == b'QUIT':
+                await self.reply(writer, b'221 bye\r\n')
+                break
+            else:
+                await self.reply(writer, b'250 ok\r\n')
+        writer.close()
+
+    def start(self):
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, '127.0.0.1', 0))
+            self.port = self.server.sockets[0].getsockname()[1]
+            self.ready.set()
+            self.loop.run_forever()
+        threading.Thread(target=serve, daemon=True).start()
+        self.ready.wait()
+        return self.port
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sending email over one pooled connection with a new connection per message. "
+        "Uses the configured EMAIL_* settings, or a local stub server with --stub"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500)
+        parser.add_argument('--stub', action='store_true', help="Send to an in-process SMTP stub")
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds the stub waits per reply")
+
+    def handle(self, *args, **options):
+        if not options['stub']:
+            return self.benchmark(options['count'])
+        stub = StubSMTPServer(options['latency'])
+        port = stub.start()
+        try:
+            with override_settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=port, EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+                EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            ):
+                self.benchmark(options['count'])
+        finally:
+            stub.stop()
+        self.stdout.write(f"stub received {stub.messages} messages")
+
+    def benchmark(self, count):
+        messages = [
+            EmailMessage('Benchmark', f'Message {number}', to=[f'user{number}@example.com'])
+            for number in range(count)
+        ]
+        # the rate limit would measure itself, not the delivery path
+        with override_settings(DELIVERY={'MAIL': {'RATE': None}}):
+            started = time.perf_counter()
+            for message in messages:
+                message.connection = get_connection()
+                message.send()
+            self.report('new connection per message', count, time.perf_counter() - started)
+
+            connection = delivery.MailConnection()
+            started = time.perf_counter()
+            for message in messages:
+                connection.send(message)
+            connection.close()
+            self.report('pooled connection', count, time.perf_counter() - started)
+
+    def report(self, name, count, elapsed):
+        self.stdout.write(f"{name}: {count} messages in {elapsed:.2f}s, {count / elapsed:.1f} msg/s")
@@ -0,0 +1,44 @@
+from collections import Counter
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+
+from base_app.storage import fields_using
+
+
+class Command(BaseCommand):
+    help = "Report how many file references share stored blobs and how many bytes that saves"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        storage = storages['default']
+        references = Counter()
+        for model, field in fields_using(storage):
+            names = model._base_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            count = 0
+            for name in names.values_list(field.name, flat=True).iterator(chunk_size=options['batch_size']):
+                references[name] += 1
+                count += 1
+            self.stdout.write(f"{model._meta.label}.{field.name}: {count} references")
+
+        logical = physical = missing = 0
+        for name, count in references.items():
+            try:
+                size = storage.size(name)
+            except OSError:
+                missing += 1
+                continue
+            logical += size * count
+            physical += size
+
+        ratio = logical / physical if physical else 1.0
+        self.stdout.write(f"References:   {sum(references.values())}")
+        self.stdout.write(f"Stored files: {len(references) - missing}")
+        self.stdout.write(f"Logical size: {logical} bytes")
+        self.stdout.write(f"Stored size:  {physical} bytes")
+        self.stdout.write(f"Dedup ratio:  {ratio:.2f}")
+        self.stdout.write(f"Bytes saved:  {logical - physical}")
+        if missing:
+            self.stdout.write(f"Missing files: {missing}")
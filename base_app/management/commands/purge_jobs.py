@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from base_app.jobs import purge_done
+
+
+class Command(BaseCommand):
+    help = "Delete finished jobs older than JOBS['KEEP_DONE'] seconds; dead jobs are kept"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=None, help="Seconds, overrides JOBS['KEEP_DONE']")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{purge_done(options['older_than'])} finished jobs purged")
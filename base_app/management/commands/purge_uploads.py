@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base_app.models import UploadSession
+from base_app.uploads import discard
+
+
+class Command(BaseCommand):
+    help = "Delete expired upload sessions together with their temporary files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        purged = 0
+        while True:
+            sessions = list(UploadSession.objects.filter(expires_at__lte=timezone.now())[:options['batch_size']])
+            if not sessions:
+                break
+            for session in sessions:
+                discard(session)
+            purged += len(sessions)
+        self.stdout.write(f"{purged} expired uploads purged")
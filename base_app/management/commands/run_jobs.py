@@ -0,0 +1,34 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from base_app.jobs import batches, claim, jobs_setting, requeue_dead, run_in_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (emails, SMS) with a bounded pool of worker threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--once', action='store_true', help="Exit when no job is due instead of polling")
+        parser.add_argument('--requeue-dead', action='store_true', help="Retry dead jobs before starting")
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f"{requeue_dead()} dead jobs requeued")
+        workers = options['workers'] or jobs_setting('WORKERS')
+        processed = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs') as executor:
+            while True:
+                # claiming no more than the pool can work off keeps leases
+                # from running out while jobs wait for a free thread
+                jobs = claim(limit=jobs_setting('CLAIM_SIZE'))
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(jobs_setting('POLL_INTERVAL'))
+                    continue
+                wait([executor.submit(run_in_worker, batch) for batch in batches(jobs)])
+                processed += len(jobs)
+        self.stdout.write(f"{processed} jobs processed")
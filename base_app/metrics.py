@@ -0,0 +1,17 @@
+import threading
+from collections import Counter
+
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot():
+    """Counters of the current process since it started."""
+    with _lock:
+        return dict(sorted(_counters.items()))
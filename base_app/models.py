@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 import uuid
 # Create your models here.
@@ -12,4 +13,82 @@ class BaseModel(models.Model):
         """
         This means that this model will be inherited by other classes 
         and django will not create a table for this model.
-        """
\ No newline at end of file
+        """
+
+
+class CounterFieldsMixin:
+    """
+    Counter columns are only changed with F() updates (see base_app.counters),
+    so saving a stale instance must never write them back.
+    """
+    counter_fields = ()
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+UPLOAD_OPEN, UPLOAD_COMPLETE = 'open', 'complete'
+
+
+class UploadSession(BaseModel):
+    """
+    A resumable upload. Chunks are appended to a temporary file outside
+    MEDIA_ROOT (see base_app.uploads); once complete, the file is attached
+    to a Post or to User.photo and the session is removed.
+    """
+    UPLOAD_STATUSES = (
+        (UPLOAD_OPEN, UPLOAD_OPEN),
+        (UPLOAD_COMPLETE, UPLOAD_COMPLETE),
+    )
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='uploads')
+    purpose = models.CharField(max_length=16)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=16, choices=UPLOAD_STATUSES, default=UPLOAD_OPEN)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self) -> str:
+        return f"{self.owner_id} {self.filename} {self.offset}/{self.size}"
+
+
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_DEAD = 'queued', 'running', 'done', 'dead'
+
+
+class Job(BaseModel):
+    """
+    A unit of background work, run by `manage.py run_jobs` (see base_app.jobs).
+    Failed jobs are retried with exponential backoff and end up `dead`
+    once `max_attempts` is used up; dead jobs stay in the table for inspection.
+    """
+    JOB_STATUSES = (
+        (JOB_QUEUED, JOB_QUEUED),
+        (JOB_RUNNING, JOB_RUNNING),
+        (JOB_DONE, JOB_DONE),
+        (JOB_DEAD, JOB_DEAD),
+    )
+    name = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=JOB_STATUSES, default=JOB_QUEUED)
+    # unique, so enqueueing the same work twice creates one job
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    # a running job whose lease ran out was lost with its worker and is claimed again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.name} {self.status} {self.attempts}/{self.max_attempts}"
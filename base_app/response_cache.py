@@ -0,0 +1,110 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .conditional import conditional_response
+from .metrics import incr
+
+
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60,
+    'KEY_PREFIX': 'response',
+}
+
+
+def cache_setting(name):
+    return getattr(settings, 'RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_response_cache():
+    return caches[cache_setting('ALIAS')]
+
+
+def version_key(scope):
+    return f"{cache_setting('KEY_PREFIX')}:version:{scope}"
+
+
+def scope_versions(scopes):
+    cache = get_response_cache()
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # A version evicted from the cache restarts from the current time,
+        # so it can never match a response cached under an older version.
+        for key, version in missing.items():
+            cache.add(key, version, timeout=None)
+        versions.update(cache.get_many(list(missing)))
+    return [versions.get(key, 0) for key in keys]
+
+
+def invalidate(*scopes):
+    """Make every cached response that depends on one of `scopes` unreachable."""
+    cache = get_response_cache()
+    for scope in scopes:
+        key = version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def response_key(request, scopes):
+    versions = ':'.join(str(version) for version in scope_versions(scopes))
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"{cache_setting('KEY_PREFIX')}:{url}:{versions}"
+
+
+class CachedResponseMixin:
+    """
+    Caches GET responses of anonymous requests, which are the same for every
+    caller. Entries are keyed by the full URL and the current version of
+    every scope in `get_cache_scopes()`; bumping a scope with invalidate()
+    retires all responses built from it.
+    Authenticated requests always bypass the cache, because their payload
+    contains viewer specific fields such as `request_user_liked`.
+    Validators set by ConditionalGetMixin are cached with the payload, so
+    a hit can still be answered with 304.
+    """
+    cache_scopes = ()
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def get(self, request, *args, **kwargs):
+        return self.cached_get(super().get, request, *args, **kwargs)
+
+    def cached_get(self, handler, request, *args, **kwargs):
+        """
+        Serve `handler(request, ...)` through the cache. Views that implement
+        get() themselves call this from their own get().
+        """
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        cache = get_response_cache()
+        key = response_key(request, self.get_cache_scopes())
+        entry = cache.get(key)
+        if entry is not None:
+            incr('response_cache.hits')
+            data, headers = entry
+            not_modified = conditional_response(request, headers.get('ETag'), headers.get('Last-Modified'))
+            if not_modified is not None:
+                for header, value in headers.items():
+                    not_modified[header] = value
+                return not_modified
+            return Response(data, headers=headers)
+
+        incr('response_cache.misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {header: response[header] for header in VALIDATOR_HEADERS if response.has_header(header)}
+            cache.set(key, (response.data, headers), cache_setting('TIMEOUT'))
+        return response
@@ -0,0 +1,73 @@
+import logging
+import threading
+from abc import ABCMeta, abstractmethod
+from functools import lru_cache
+
+import decouple
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'base_app.sms.ConsoleSMSSender',
+    'OPTIONS': {},
+}
+
+# messages sent with LocmemSMSSender, like django.core.mail.outbox
+outbox = []
+
+
+def sms_setting(name):
+    return getattr(settings, 'SMS', {}).get(name, DEFAULTS[name])
+
+
+class BaseSMSSender(metaclass=ABCMeta):
+    @abstractmethod
+    def send(self, to, body):
+        """Send the text `body` to the phone number `to`."""
+
+
+class ConsoleSMSSender(BaseSMSSender):
+    """Logs messages instead of sending them, for development."""
+    def send(self, to, body):
+        logger.info("SMS to %s: %s", to, body)
+
+
+class LocmemSMSSender(BaseSMSSender):
+    """Keeps messages in `base_app.sms.outbox`, for tests."""
+    def send(self, to, body):
+        outbox.append({'to': to, 'body': body})
+
+
+class TwilioSMSSender(BaseSMSSender):
+    """
+    Sends through Twilio; needs TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and
+    FROM_USER_PHONE_NUMBER, read once. Each thread keeps its own client,
+    whose HTTP session keeps the TLS connection to the API alive.
+    """
+    def __init__(self, account_sid=None, auth_token=None, from_number=None, timeout=10):
+        self.account_sid = account_sid or decouple.config('TWILIO_ACCOUNT_SID')
+        self.auth_token = auth_token or decouple.config('TWILIO_AUTH_TOKEN')
+        self.from_number = from_number or decouple.config('FROM_USER_PHONE_NUMBER')
+        self.timeout = timeout
+        self.local = threading.local()
+
+    @property
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            from twilio.http.http_client import TwilioHttpClient
+            from twilio.rest import Client
+
+            http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+            self.local.client = Client(self.account_sid, self.auth_token, http_client=http_client)
+        return self.local.client
+
+    def send(self, to, body):
+        self.client.messages.create(body=body, from_=self.from_number, to=to)
+
+
+@lru_cache(maxsize=None)
+def get_sms_sender():
+    return import_string(sms_setting('BACKEND'))(**sms_setting('OPTIONS'))
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import time
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .metrics import incr
+
+
+# (model, field) pairs registered with track_files()
+tracked_fields = []
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the sha256 of its content,
+    `blobs/ab/cd/<digest><ext>`, whatever name it was uploaded with.
+    Saving content that is already stored writes nothing and returns the
+    existing name, so identical posts and avatars share one blob.
+
+    Blobs are shared, so delete() only removes a blob that no tracked
+    FileField refers to any more (see track_files()), and that was not
+    written or deduplicated against within `grace` seconds: the row of that
+    upload may not be committed yet. Such blobs are left to
+    `manage.py gc_media`, which applies the same grace period.
+    """
+    prefix = 'blobs'
+    grace = 60 * 60
+
+    def __init__(self, *args, **kwargs):
+        # two uploads of the same content may race to create the same blob;
+        # both write identical bytes, so overwriting is harmless
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def hash(content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        return digest.hexdigest()
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f"{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.blob_name(self.hash(content), name)
+        if self.exists(name):
+            # a fresh mtime keeps `manage.py gc_media` away from a blob that
+            # is about to be referenced again
+            os.utime(self.path(name))
+            incr('storage.dedup_hits')
+            incr('storage.dedup_bytes', content.size or 0)
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def _save(self, name, content):
+        # written under a temporary name and renamed, so a blob is never
+        # visible (and never deduplicated against) while half written
+        temp_name = super()._save(f"{name}.{uuid.uuid4().hex}.part", content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
+
+    def recently_used(self, name):
+        try:
+            return os.path.getmtime(self.path(name)) > time.time() - self.grace
+        except FileNotFoundError:
+            return False
+
+    def delete(self, name):
+        if not name or self.recently_used(name):
+            return
+        if not is_referenced(self, name):
+            super().delete(name)
+
+
+def fields_using(storage):
+    return [
+        (model, field) for model, field in tracked_fields
+        if field.storage is storage or getattr(field.storage, '_wrapped', None) is storage
+    ]
+
+
+def is_referenced(storage, name):
+    return any(
+        model._base_manager.filter(**{field.name: name}).exists()
+        for model, field in fields_using(storage)
+    )
+
+
+def stored_name(value):
+    return getattr(value, 'name', value) or None
+
+
+def release(storage, name):
+    """Delete `name` from `storage` once the current transaction commits."""
+    if name:
+        transaction.on_commit(lambda: storage.delete(name), robust=True)
+
+
+def track_files(model):
+    """
+    Delete files that `model` instances stop referring to: the old file when
+    a FileField is changed, and every file when the instance is deleted.
+    With ContentAddressedStorage the blob survives while other rows share it.
+    """
+    fields = [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+    tracked_fields.extend((model, field) for field in fields if (model, field) not in tracked_fields)
+
+    def remember(sender, instance, **kwargs):
+        # deferred fields are skipped, reading them here would cost a query each
+        instance._stored_files = {
+            field.attname: stored_name(instance.__dict__[field.attname])
+            for field in fields if field.attname in instance.__dict__
+        }
+
+    def release_replaced(sender, instance, **kwargs):
+        stored = getattr(instance, '_stored_files', {})
+        for field in fields:
+            if field.attname not in instance.__dict__:
+                continue
+            old, new = stored.get(field.attname), stored_name(instance.__dict__[field.attname])
+            if old and old != new:
+                release(field.storage, old)
+        remember(sender, instance)
+
+    def release_deleted(sender, instance, **kwargs):
+        for field in fields:
+            # a deferred field can not be loaded any more, the row is gone
+            if field.attname in instance.__dict__:
+                release(field.storage, stored_name(instance.__dict__[field.attname]))
+
+    uid = f"track_files:{model._meta.label}"
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(release_replaced, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(release_deleted, sender=model, weak=False, dispatch_uid=uid)
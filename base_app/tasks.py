@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.mail import EmailMessage
+
+from . import delivery
+from .jobs import task
+from .sms import get_sms_sender
+
+
+MAIL_BATCH_SIZE = 50
+
+
+@task('mail.send', batch_size=MAIL_BATCH_SIZE)
+def send_mail_batch(payloads):
+    """
+    Send queued emails over the worker's long-lived SMTP connection, like
+    send_mass_mail() but with a result per message, so a refused recipient
+    does not fail the rest of the batch.
+    """
+    connection = delivery.mail_connection()
+    errors = []
+    for payload in payloads:
+        message = EmailMessage(
+            payload['subject'],
+            payload['message'],
+            settings.DEFAULT_FROM_EMAIL,
+            payload['recipient_list'],
+        )
+        try:
+            connection.send(message)
+        except Exception as exc:
+            errors.append(exc)
+        else:
+            errors.append(None)
+    return errors
+
+
+@task('sms.send')
+def send_sms(payload):
+    delivery.send_sms(get_sms_sender(), payload['to'], payload['body'])
@@ -1,3 +1,349 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+
+from post.models import Post
+from users.models import User
+from . import delivery, sms, uploads
+
+from .models import Job, UploadSession, UPLOAD_COMPLETE
+from .tasks import send_mail_batch
+from .storage import ContentAddressedStorage
+from .throttling import SlidingWindowThrottle
+from .utils import send_sms_verification_code
+
+
+class SMSVerificationCodeTests(TestCase):
+    def test_repeated_code_is_sent_again(self):
+        # 4 digit codes repeat; an earlier job must not swallow the new one
+        send_sms_verification_code('+998901234567', '1234')
+        send_sms_verification_code('+998901234567', '1234')
+        self.assertEqual(Job.objects.filter(name='sms.send').count(), 2)
+
+
+class FakeClock:
+    """Stands in for the time module; sleep() only moves the clock."""
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class DeliveryTests(TestCase):
+    def setUp(self):
+        # connections and limiters of other tests are not reused
+        for name, value in (('_local', threading.local()), ('_limiters', {}), ('time', FakeClock())):
+            patcher = mock.patch.object(delivery, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.clock = delivery.time
+        sms.outbox.clear()
+
+    def payloads(self, count):
+        return [
+            {'subject': f'subject {number}', 'message': 'body', 'recipient_list': [f'user{number}@example.com']}
+            for number in range(count)
+        ]
+
+    @override_settings(DELIVERY={'MAIL': {'RATE': None, 'MAX_MESSAGES': 4}})
+    def test_batch_is_sent_over_one_connection(self):
+        with mock.patch.object(delivery, 'get_connection', wraps=delivery.get_connection) as get_connection:
+            self.assertEqual(send_mail_batch(self.payloads(3)), [None] * 3)
+            self.assertEqual(get_connection.call_count, 1)
+            # the next batch reuses it until MAX_MESSAGES
+            send_mail_batch(self.payloads(3))
+            self.assertEqual(get_connection.call_count, 2)
+            # and after IDLE_TIMEOUT
+            self.clock.now += 61
+            send_mail_batch(self.payloads(1))
+            self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual([message.to for message in mail.outbox[:3]], [[f'user{number}@example.com'] for number in range(3)])
+        self.assertEqual(len(mail.outbox), 7)
+
+    @override_settings(DELIVERY={'SMS': {'RATE': 2, 'BURST': 2}})
+    def test_sends_past_the_rate_are_delayed(self):
+        sender = sms.LocmemSMSSender()
+        for number in range(4):
+            delivery.send_sms(sender, '+998901234567', f'code {number}')
+        # the burst goes out at once, then one message every 1 / RATE seconds
+        self.assertEqual(self.clock.slept, [0.5, 0.5])
+        self.assertEqual(len(sms.outbox), 4)
+        self.clock.now += 10
+        delivery.send_sms(sender, '+998901234567', 'later')
+        self.assertEqual(self.clock.slept, [0.5, 0.5])
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def test_identical_content_is_stored_once(self):
+        first = self.storage.save('a.jpg', ContentFile(b'same'))
+        second = self.storage.save('b.jpg', ContentFile(b'same'))
+        self.assertEqual(first, second)
+
+    def test_recent_blob_is_kept(self):
+        # an upload of the same content may be about to commit a row referring to it
+        name = self.storage.save('a.jpg', ContentFile(b'recent'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_old_unreferenced_blob_is_deleted(self):
+        name = self.storage.save('a.jpg', ContentFile(b'old'))
+        old = time.time() - self.storage.grace - 1
+        os.utime(self.storage.path(name), (old, old))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+    def test_deduplicated_blob_is_kept(self):
+        name = self.storage.save('a.jpg', ContentFile(b'dedup'))
+        old = time.time() - self.storage.grace - 1
+        os.utime(self.storage.path(name), (old, old))
+        self.storage.save('b.jpg', ContentFile(b'dedup'))
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+
+class ThrottledView:
+    throttle_scope = 'test'
+
+
+@override_settings(THROTTLING={'ALIAS': 'default', 'KEY_PREFIX': 'throttle-test', 'RATES': {'test': {'ip': '5/day'}}})
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.request = APIRequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+
+    def allow(self):
+        return SlidingWindowThrottle().allow_request(self.request, ThrottledView())
+
+    def test_limit(self):
+        self.assertEqual([self.allow() for number in range(7)], [True] * 5 + [False] * 2)
+
+    def test_rejected_requests_are_not_counted(self):
+        for number in range(8):
+            self.allow()
+        throttle = SlidingWindowThrottle()
+        limit, = throttle.get_limits(self.request, 'test', {'ip': '5/day'}, time.time())
+        self.assertEqual(caches['default'].get(limit['current']), 5)
+
+    def test_spoofed_forwarded_for_does_not_reset_the_count(self):
+        factory = APIRequestFactory()
+        allowed = [
+            SlidingWindowThrottle().allow_request(
+                factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR=f'192.0.2.{number}'), ThrottledView()
+            )
+            for number in range(7)
+        ]
+        self.assertEqual(allowed, [True] * 5 + [False] * 2)
+
+    def test_forwarded_for_of_a_trusted_proxy(self):
+        factory = APIRequestFactory()
+
+        def allow(client, spoofed='203.0.113.1'):
+            # the proxy appends the address it saw to whatever the client sent
+            request = factory.get('/', REMOTE_ADDR='10.0.0.3', HTTP_X_FORWARDED_FOR=f'{spoofed}, {client}')
+            return SlidingWindowThrottle().allow_request(request, ThrottledView())
+
+        with mock.patch('rest_framework.throttling.api_settings.NUM_PROXIES', 1):
+            self.assertEqual(
+                [allow('192.0.2.1', spoofed=f'203.0.113.{number}') for number in range(6)],
+                [True] * 5 + [False],
+            )
+            self.assertTrue(allow('192.0.2.2'))
+
+    def test_concurrent_requests_do_not_exceed_the_limit(self):
+        with ThreadPoolExecutor(8) as pool:
+            allowed = list(pool.map(lambda number: self.allow(), range(40)))
+        self.assertEqual(allowed.count(True), 5)
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(
+            MEDIA_ROOT=os.path.join(self.directory, 'media'),
+            UPLOADS={'TEMP_DIR': os.path.join(self.directory, 'uploads'), 'CHUNK_SIZE': 16},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create(username='uploader', email='uploader@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, content, filename='file.gif', **fields):
+        response = self.client.post('/uploads/', {'purpose': 'post', 'filename': filename, 'size': len(content), **fields})
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def put(self, upload_id, content, start):
+        return self.client.generic(
+            'PUT', f'/uploads/{upload_id}/', content, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(content) - 1}/*',
+        )
+
+    def send(self, upload_id, content):
+        for start in range(0, len(content), 16):
+            self.assertEqual(self.put(upload_id, content[start:start + 16], start).status_code, 200)
+
+    def test_chunks_are_appended(self):
+        content = b'GIF89a' + bytes(range(30))
+        upload_id = self.start(content)
+        self.send(upload_id, content)
+        self.assertEqual(self.client.get(f'/uploads/{upload_id}/').json()['offset'], len(content))
+        with open(uploads.temp_path(UploadSession.objects.get()), 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+    def test_chunk_that_lost_the_race_is_not_recorded(self):
+        content = b'GIF89a' + bytes(10)
+        upload_id = self.start(content)
+        session = UploadSession.objects.get()
+        # another request advanced the offset after this one read the session
+        UploadSession.objects.filter(pk=session.pk).update(offset=6)
+        self.assertIsNone(uploads.write_chunk(session, io.BytesIO(content), len(content)))
+        self.assertEqual(UploadSession.objects.get().offset, 6)
+
+        with mock.patch.object(uploads, 'write_chunk', return_value=None):
+            response = self.put(upload_id, content[6:], 6)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 6)
+
+    def test_chunk_at_another_offset_is_refused(self):
+        content = b'GIF89a' + bytes(20)
+        upload_id = self.start(content)
+        self.send(upload_id, content[:16])
+        response = self.put(upload_id, content[8:24], 8)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 16)
+
+    def test_chunk_larger_than_chunk_size_is_refused(self):
+        content = b'GIF89a' + bytes(20)
+        upload_id = self.start(content)
+        self.assertEqual(self.put(upload_id, content[:17], 0).status_code, 413)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+
+    def test_content_that_does_not_match_the_extension_is_refused(self):
+        content = b'\x89PNG\r\n\x1a\n' + bytes(8)
+        upload_id = self.start(content, filename='file.gif')
+        self.assertEqual(self.put(upload_id, content, 0).status_code, 400)
+        self.assertEqual(UploadSession.objects.get().offset, 0)
+
+    def test_checksum_mismatch_discards_the_upload(self):
+        content = b'GIF89a' + bytes(20)
+        upload_id = self.start(content, sha256=hashlib.sha256(b'something else').hexdigest())
+        self.send(upload_id, content)
+        response = self.client.post(f'/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'uploads')), [])
+
+    def test_finalized_upload_becomes_the_post_media(self):
+        image = io.BytesIO()
+        Image.new('RGB', (4, 4), 'red').save(image, 'GIF')
+        content = image.getvalue()
+        upload_id = self.start(content, sha256=hashlib.sha256(content).hexdigest())
+        self.send(upload_id, content)
+        response = self.client.post(f'/uploads/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UploadSession.objects.get().status, UPLOAD_COMPLETE)
+
+        response = self.client.post('/post/create/', {'caption': 'uploaded', 'upload': upload_id})
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get()
+        with post.media.open('rb') as file:
+            self.assertEqual(file.read(), content)
+        self.assertFalse(UploadSession.objects.exists())
+        # an upload is attached once
+        response = self.client.post('/post/create/', {'caption': 'again', 'upload': upload_id})
+        self.assertEqual(response.status_code, 400)
+
+
+class MediaFileViewTests(TestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.blob = f'blobs/{self.digest[:2]}/{self.digest[2:4]}/{self.digest}.mp4'
+        for name in ('posts/clip.mp4', self.blob):
+            os.makedirs(os.path.dirname(os.path.join(media_root, name)), exist_ok=True)
+            with open(os.path.join(media_root, name), 'wb') as file:
+                file.write(self.content)
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', **headers)
+
+    def test_whole_file(self):
+        response = self.get('posts/clip.mp4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.get('posts/clip.mp4', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_range(self):
+        response = self.get('posts/clip.mp4', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+        # an open range ends with the file
+        response = self.get('posts/clip.mp4', HTTP_RANGE='bytes=1000-')
+        self.assertEqual(b''.join(response.streaming_content), self.content[1000:])
+
+    def test_suffix_range(self):
+        response = self.get('posts/clip.mp4', HTTP_RANGE='bytes=-24')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-24:])
+
+    def test_unsatisfiable_range(self):
+        for name in ('posts/clip.mp4', self.blob):
+            response = self.get(name, HTTP_RANGE='bytes=2000-2010')
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'], 'bytes */1024')
+            self.assertFalse(response.has_header('Cache-Control'))
+            self.assertFalse(response.has_header('ETag'))
+
+    def test_if_range(self):
+        etag = self.get('posts/clip.mp4')['ETag']
+        response = self.get('posts/clip.mp4', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        # the file changed since the client got its part, so it gets all of it
+        response = self.get('posts/clip.mp4', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_blob_is_immutable(self):
+        response = self.get(self.blob)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{self.digest}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
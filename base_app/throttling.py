@@ -0,0 +1,143 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import incr
+
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'KEY_PREFIX': 'throttle',
+    'RATES': {},
+}
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def throttle_setting(name):
+    return getattr(settings, 'THROTTLING', {}).get(name, DEFAULTS[name])
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60), like DRF's rates: the period is read from its first letter."""
+    number, period = rate.split('/')
+    return int(number), PERIODS[period[0]]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Limits every view that sets `throttle_scope` to the rates configured
+    for that scope in THROTTLING['RATES'], e.g.
+
+        'login': {'ip': '10/min', 'endpoint': '1000/min'}
+
+    `ip` counts per client address, `user` per authenticated user (per
+    address for anonymous requests) and `endpoint` across all clients.
+    The client address is REMOTE_ADDR, or taken from X-Forwarded-For as
+    REST_FRAMEWORK['NUM_PROXIES'] trusted proxies added it.
+
+    Each limit is a sliding window approximated from two fixed windows:
+    the previous window's count weighted by how much of it still overlaps,
+    plus the current count. The current count is incremented first and the
+    value incr() returns is compared, so concurrent requests can not all
+    pass on the same stale count; a rejected request gives its increments
+    back. That is one get_many() and one incr() per limit on the cache in
+    THROTTLING['ALIAS'].
+
+    The limits only hold across processes with a shared cache (Redis,
+    Memcached or the database cache). The 'default' alias is a LocMemCache
+    unless CACHES is changed, which counts per process: with N workers a
+    client gets up to N times the configured rate.
+    Views without a scope cost nothing.
+    """
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_cache(self):
+        return caches[throttle_setting('ALIAS')]
+
+    def get_kind_ident(self, kind, request):
+        if kind == 'ip':
+            return self.get_ident(request)
+        if kind == 'user':
+            if request.user and request.user.is_authenticated:
+                return f'user-{request.user.pk}'
+            return f'ip-{self.get_ident(request)}'
+        if kind == 'endpoint':
+            return 'all'
+        raise ValueError(f"Unknown throttle kind '{kind}'")
+
+    def get_limits(self, request, scope, rates, now):
+        limits = []
+        for kind, rate in rates.items():
+            if rate is None:
+                continue
+            number, window = parse_rate(rate)
+            index = int(now // window)
+            prefix = f"{throttle_setting('KEY_PREFIX')}:{scope}:{kind}:{self.get_kind_ident(kind, request)}:{window}"
+            limits.append({
+                'kind': kind,
+                'number': number,
+                'window': window,
+                'current': f"{prefix}:{index}",
+                'previous': f"{prefix}:{index - 1}",
+                # share of the current window that has passed
+                'elapsed': (now % window) / window,
+            })
+        return limits
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        rates = throttle_setting('RATES').get(scope) if scope else None
+        if not rates:
+            return True
+
+        cache = self.get_cache()
+        limits = self.get_limits(request, scope, rates, time.time())
+        previous_counts = cache.get_many([limit['previous'] for limit in limits])
+        counted = []
+        for limit in limits:
+            current = self.hit(cache, limit['current'], limit['window'])
+            counted.append(limit)
+            previous = previous_counts.get(limit['previous'], 0)
+            if previous * (1 - limit['elapsed']) + current > limit['number']:
+                for hit in counted:
+                    self.unhit(cache, hit['current'])
+                self.wait_seconds = self.get_wait(limit, current - 1, previous)
+                incr('throttle.rejected')
+                incr(f"throttle.rejected.{scope}.{limit['kind']}")
+                return False
+        return True
+
+    @staticmethod
+    def hit(cache, key, window):
+        """Count a request in the window of `key` and return the window's count, this request included."""
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # first hit of the window; kept for two windows, because the
+            # next one still reads it as `previous`
+            if cache.add(key, 1, window * 2):
+                return 1
+            return cache.incr(key)
+
+    @staticmethod
+    def unhit(cache, key):
+        try:
+            cache.decr(key)
+        except ValueError:
+            # expired meanwhile, nothing left to give back
+            pass
+
+    @staticmethod
+    def get_wait(limit, current, previous):
+        window, elapsed = limit['window'], limit['elapsed']
+        if current < limit['number'] and previous:
+            # until enough of the previous window has slid out
+            needed = 1 - (limit['number'] - 1 - current) / previous
+            return max(0.0, (needed - elapsed) * window)
+        return (1 - elapsed) * window
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,261 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import UploadSession, UPLOAD_COMPLETE, UPLOAD_OPEN
+
+
+DEFAULTS = {
+    'TEMP_DIR': os.path.join(tempfile.gettempdir(), 'insta_clone_uploads'),
+    'CHUNK_SIZE': 8 * 1024 * 1024,
+    'EXPIRE_AFTER': 24 * 60 * 60,
+    'PURPOSES': {
+        'post': {
+            'max_size': 1024 * 1024 * 1024,
+            'extensions': ['png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov', 'mkv', 'heic'],
+        },
+        'avatar': {
+            'max_size': 10 * 1024 * 1024,
+            'extensions': ['jpg', 'jpeg', 'png', 'heic'],
+        },
+    },
+}
+BLOCK_SIZE = 64 * 1024
+HASH_CACHE_SIZE = 256
+
+# Leading bytes of every accepted format. The first chunk of an upload must
+# match its extension, so a mislabeled file is refused before it is stored.
+SIGNATURES = {
+    'jpg': [(0, b'\xff\xd8\xff')],
+    'jpeg': [(0, b'\xff\xd8\xff')],
+    'png': [(0, b'\x89PNG\r\n\x1a\n')],
+    'gif': [(0, b'GIF87a'), (0, b'GIF89a')],
+    'heic': [(4, b'ftyp')],
+    'mp4': [(4, b'ftyp')],
+    'mov': [(4, b'ftyp'), (4, b'moov'), (4, b'mdat'), (4, b'wide'), (4, b'free')],
+    'mkv': [(0, b'\x1a\x45\xdf\xa3')],
+    'avi': [(8, b'AVI ')],
+}
+SIGNATURE_LENGTH = 12
+VERIFIED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
+
+
+def upload_setting(name):
+    return getattr(settings, 'UPLOADS', {}).get(name, DEFAULTS[name])
+
+
+def upload_limits(purpose):
+    try:
+        return upload_setting('PURPOSES')[purpose]
+    except KeyError:
+        raise ValidationError({
+            'success': False,
+            'message': f"Unknown upload purpose '{purpose}'"
+        })
+
+
+def extension(filename):
+    return os.path.splitext(filename)[1].lstrip('.').lower()
+
+
+def check_file(purpose, filename, size):
+    """Raise ValidationError unless a file of `size` bytes named `filename` is allowed for `purpose`."""
+    limits = upload_limits(purpose)
+    if extension(filename) not in limits['extensions']:
+        raise ValidationError({
+            'success': False,
+            'message': f"File type not allowed. Allowed types: {', '.join(limits['extensions'])}"
+        })
+    if size > limits['max_size']:
+        raise ValidationError({
+            'success': False,
+            'message': f"File is too large. Maximum allowed size is {limits['max_size'] // (1024 * 1024)}MB."
+        })
+
+
+def matches_signature(filename, head):
+    signatures = SIGNATURES.get(extension(filename))
+    if not signatures:
+        return True
+    return any(head[start:start + len(magic)] == magic for start, magic in signatures)
+
+
+def temp_path(session):
+    return os.path.join(upload_setting('TEMP_DIR'), f"{session.pk}.part")
+
+
+def start_session(owner, purpose, filename, size, sha256=''):
+    check_file(purpose, filename, size)
+    session = UploadSession.objects.create(
+        owner=owner,
+        purpose=purpose,
+        filename=os.path.basename(filename),
+        size=size,
+        sha256=sha256.lower(),
+        expires_at=timezone.now() + timedelta(seconds=upload_setting('EXPIRE_AFTER')),
+    )
+    os.makedirs(upload_setting('TEMP_DIR'), exist_ok=True)
+    open(temp_path(session), 'wb').close()
+    return session
+
+
+def discard(session):
+    try:
+        os.remove(temp_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def is_valid_image(path):
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        # Pillow raises many different errors for corrupt files
+        return False
+    return True
+
+
+class HashCache:
+    """
+    Running sha256 of each upload in this process, so a chunk only hashes
+    its own bytes. A chunk that lands on another process (or after a
+    restart) rebuilds the state by hashing the stored prefix once.
+    """
+    def __init__(self, size=HASH_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, session):
+        with self.lock:
+            entry = self.entries.pop(session.pk, None)
+        if entry is not None and entry[0] == session.offset:
+            return entry[1]
+        digest = hashlib.sha256()
+        with open(temp_path(session), 'rb') as file:
+            remaining = session.offset
+            while remaining:
+                block = file.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest
+
+    def put(self, session, digest):
+        with self.lock:
+            self.entries[session.pk] = (session.offset, digest)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def pop(self, session):
+        with self.lock:
+            self.entries.pop(session.pk, None)
+
+
+hash_cache = HashCache()
+
+
+def write_chunk(session, stream, length):
+    """
+    Write up to `length` bytes read from `stream` at `session.offset`,
+    BLOCK_SIZE bytes at a time, then move the offset past them. A client
+    that disconnects mid-chunk keeps what arrived; it resumes from the
+    returned offset.
+
+    No transaction or row lock is held while the client sends, which may
+    take long on a slow connection. The offset is advanced with a
+    conditional UPDATE instead; when another request moved it meanwhile,
+    nothing is recorded and None is returned. Bytes written past the
+    recorded offset are overwritten by the next chunk.
+    """
+    start = session.offset
+    digest = hash_cache.get(session)
+    written = 0
+    with open(temp_path(session), 'r+b') as file:
+        file.seek(start)
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            if start == 0 and written == 0 and not matches_signature(session.filename, block[:SIGNATURE_LENGTH]):
+                raise ValidationError({
+                    'success': False,
+                    'message': 'File content does not match its type'
+                })
+            file.write(block)
+            digest.update(block)
+            written += len(block)
+    advanced = UploadSession.objects.filter(pk=session.pk, offset=start).update(
+        offset=start + written, updated_at=timezone.now()
+    )
+    if not advanced:
+        return None
+    session.offset = start + written
+    hash_cache.put(session, digest)
+    return written
+
+
+def finish_session(session):
+    if session.offset != session.size:
+        raise ValidationError({
+            'success': False,
+            'message': f"Upload is incomplete: {session.offset} of {session.size} bytes received"
+        })
+    digest = hash_cache.get(session).hexdigest()
+    hash_cache.pop(session)
+    if session.sha256 and session.sha256 != digest:
+        discard(session)
+        raise ValidationError({
+            'success': False,
+            'message': 'Checksum mismatch, the upload has been discarded'
+        })
+    if extension(session.filename) in VERIFIED_IMAGE_EXTENSIONS and not is_valid_image(temp_path(session)):
+        discard(session)
+        raise ValidationError({
+            'success': False,
+            'message': 'Uploaded file is not a valid image, the upload has been discarded'
+        })
+    session.sha256, session.status = digest, UPLOAD_COMPLETE
+    session.save(update_fields=['sha256', 'status', 'updated_at'])
+    return session
+
+
+def get_completed_session(user, upload_id, purpose):
+    session = UploadSession.objects.filter(
+        pk=upload_id, owner=user, purpose=purpose, status=UPLOAD_COMPLETE, expires_at__gt=timezone.now()
+    ).first()
+    if session is None:
+        raise ValidationError('Upload not found or not finalized')
+    return session
+
+
+class UploadedFile(File):
+    """
+    The assembled upload. Exposing temporary_file_path() lets
+    FileSystemStorage move it into place instead of copying it.
+    """
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def open_upload(session):
+    return UploadedFile(open(temp_path(session), 'rb'), name=session.filename)
+
+
+def get_open_session(user, upload_id):
+    return UploadSession.objects.filter(
+        pk=upload_id, owner=user, status=UPLOAD_OPEN, expires_at__gt=timezone.now()
+    ).first()
@@ -1,12 +1,9 @@
 import re
-import threading
 import phonenumbers
-import decouple
-from twilio.rest import Client
 
 from rest_framework.exceptions import ValidationError
-from django.core.mail import send_mail
-from django.conf import settings
+
+from . import jobs
 
 
 email_regex = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b')
@@ -40,32 +37,18 @@ def check_email_or_phone(email_or_phone):
             "message":"Email or Phone number invalid"
         })
         
-class EmailThread(threading.Thread):
-    def __init__(self, subject, message, recipient_list) :
-        self.subject = subject
-        self.message = message
-        self.recipient_list = recipient_list
-        threading.Thread.__init__(self)
-        
-    def run(self) -> None:
-        send_mail(
-            self.subject,
-            self.message,
-            settings.DEFAULT_FROM_EMAIL,
-            self.recipient_list
-        )
-        
-def send_async_mail(subject:str, message:str, recipient_list:list[str]):
-    EmailThread(subject, message, recipient_list).start()
+def send_async_mail(subject:str, message:str, recipient_list:list[str], key=None):
+    """Queue an email; `manage.py run_jobs` sends it, reusing SMTP connections across queued messages."""
+    return jobs.enqueue('mail.send', {
+        'subject': subject,
+        'message': message,
+        'recipient_list': list(recipient_list),
+    }, key=key)
 
 def send_sms_verification_code(phone_number, code):
-    account_sid = decouple.config('TWILIO_ACCOUNT_SID')
-    auth_token = decouple.config('TWILIO_AUTH_TOKEN')
-    from_user = decouple.config('FROM_USER_PHONE_NUMBER')
-    client = Client(account_sid, auth_token)
-    client.messages.create(
-        body=f"Your verification code: {code}",
-        from_= from_user,
-        to = str(phone_number)
-    )
-    
+    # no idempotency key: every call comes with a freshly created code, and
+    # codes repeat too often to tell one apart from an earlier one
+    return jobs.enqueue('sms.send', {
+        'to': str(phone_number),
+        'body': f"Your verification code: {code}",
+    })
@@ -1,3 +1,282 @@
+import mimetypes
+import mmap
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+from django.views import View
+from rest_framework import permissions, serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import incr, snapshot
+from .models import UploadSession
+from . import uploads
 
 # Create your views here.
+
+class MetricsAPIView(APIView):
+    permission_classes = [permissions.IsAdminUser,]
+    
+    def get(self, request, *args, **kwargs):
+        return Response(snapshot())
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+    chunk_size = serializers.SerializerMethodField('get_chunk_size')
+    
+    class Meta:
+        model = UploadSession
+        fields = ['id','purpose','filename','size','sha256','offset','status','expires_at','chunk_size']
+        read_only_fields = ['offset','status','expires_at']
+        
+    def get_chunk_size(self, obj):
+        return uploads.upload_setting('CHUNK_SIZE')
+    
+    def create(self, validated_data):
+        return uploads.start_session(owner=self.context['request'].user, **validated_data)
+    
+    
+class UploadCreateAPIView(APIView):
+    """Start a resumable upload; the file itself is sent with PUT /uploads/<id>/."""
+    permission_classes = [permissions.IsAuthenticated,]
+    serializer_class = UploadSessionSerializer
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=201)
+    
+    
+class UploadSessionMixin:
+    permission_classes = [permissions.IsAuthenticated,]
+    serializer_class = UploadSessionSerializer
+    
+    def get_session(self):
+        session = uploads.get_open_session(self.request.user, self.kwargs['pk'])
+        if session is None:
+            raise NotFound("Upload not found or expired")
+        return session
+    
+    
+class UploadChunkAPIView(UploadSessionMixin, APIView):
+    """
+    GET returns the current offset, so an interrupted client knows where to
+    resume. PUT appends the request body at the offset given by
+    `Content-Range: bytes <start>-<end>/<size>` (or `Upload-Offset: <start>`).
+    """
+    content_range_regex = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+    
+    def get(self, request, *args, **kwargs):
+        return Response(self.serializer_class(self.get_session()).data)
+    
+    def get_start(self, request):
+        content_range = request.META.get('HTTP_CONTENT_RANGE')
+        if content_range:
+            match = self.content_range_regex.match(content_range)
+            if match is None:
+                return None
+            return int(match.group(1))
+        offset = request.META.get('HTTP_UPLOAD_OFFSET', '')
+        return int(offset) if offset.isdigit() else None
+    
+    def put(self, request, *args, **kwargs):
+        start = self.get_start(request)
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if start is None or length <= 0:
+            return Response({
+                'success':False,
+                'message':'A Content-Range (or Upload-Offset) and Content-Length header are required'
+            }, status=400)
+        if length > uploads.upload_setting('CHUNK_SIZE'):
+            return Response({
+                'success':False,
+                'message':f"Chunk is too large. Maximum chunk size is {uploads.upload_setting('CHUNK_SIZE')} bytes"
+            }, status=413)
+        
+        session = self.get_session()
+        if start != session.offset:
+            return self.offset_mismatch(session)
+        if start + length > session.size:
+            return Response({
+                'success':False,
+                'message':'Chunk exceeds the declared file size',
+                'offset':session.offset
+            }, status=400)
+        # no transaction while the client sends; a chunk that raced another
+        # one for the same offset is not recorded
+        if uploads.write_chunk(session, request.stream, length) is None:
+            session.refresh_from_db(fields=['offset'])
+            return self.offset_mismatch(session)
+        return Response(self.serializer_class(session).data)
+    
+    @staticmethod
+    def offset_mismatch(session):
+        return Response({
+            'success':False,
+            'message':'Offset mismatch, resume from the returned offset',
+            'offset':session.offset
+        }, status=409)
+    
+    
+class UploadFinalizeAPIView(UploadSessionMixin, APIView):
+    """Verify size, checksum and content of a fully sent upload."""
+    
+    def post(self, request, *args, **kwargs):
+        session = uploads.finish_session(self.get_session())
+        return Response({
+            'success':True,
+            'message':'Upload complete',
+            'data':self.serializer_class(session).data
+        })
+
+
+MEDIA_SERVING_DEFAULTS = {
+    'SENDFILE': None,
+    'ACCEL_PREFIX': '/protected-media/',
+    'MAX_AGE': 24 * 60 * 60,
+    'PERMISSION_CHECK': None,
+}
+
+
+def media_serving_setting(name):
+    return getattr(settings, 'MEDIA_SERVING', {}).get(name, MEDIA_SERVING_DEFAULTS[name])
+
+
+class MediaFileView(View):
+    """
+    Serves files below MEDIA_ROOT with ETag/Last-Modified validation and
+    single `Range` requests (206), which video players need to seek.
+    Content-addressed blobs never change, so they are cacheable forever.
+
+    With MEDIA_SERVING['SENDFILE'] set to 'x-sendfile' or 'x-accel-redirect'
+    only the headers are built here and the front server sends the bytes
+    (and handles ranges). Otherwise full files go through FileResponse, which
+    WSGI servers hand to os.sendfile(), and ranges are sliced from an mmap.
+
+    Override has_permission() or set MEDIA_SERVING['PERMISSION_CHECK'] to a
+    `callable(request, name) -> bool` to restrict access.
+    """
+    block_size = 256 * 1024
+    blob_regex = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})')
+    range_regex = re.compile(r'^bytes=(\d*)-(\d*)$')
+    immutable_max_age = 365 * 24 * 60 * 60
+    
+    def has_permission(self, request, name):
+        check = media_serving_setting('PERMISSION_CHECK')
+        if check is None:
+            return True
+        return import_string(check)(request, name)
+    
+    def get_path(self, name):
+        try:
+            path = safe_join(settings.MEDIA_ROOT, name)
+        except SuspiciousFileOperation:
+            raise Http404("File not found")
+        if not os.path.isfile(path):
+            raise Http404("File not found")
+        return path
+    
+    def get_etag(self, name, stat):
+        match = self.blob_regex.match(name)
+        if match:
+            return f'"{match.group(1)}"'
+        return f'"{int(stat.st_mtime_ns):x}-{stat.st_size:x}"'
+    
+    def get_range(self, request, etag, stat):
+        """(start, end) of a satisfiable single range, None for the whole file, False if unsatisfiable."""
+        header = request.META.get('HTTP_RANGE', '').strip()
+        match = self.range_regex.match(header)
+        if match is None:
+            # absent, malformed and multi-range requests get the whole file
+            return None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range and if_range != etag and if_range != http_date(stat.st_mtime):
+            return None
+        first, last = match.groups()
+        size = stat.st_size
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        elif last:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            return None
+        if start >= size or start > end:
+            return False
+        return start, min(end, size - 1)
+    
+    def set_headers(self, response, name, etag, stat):
+        response['Accept-Ranges'] = 'bytes'
+        if response.status_code >= 400:
+            # not a representation of the file, so no validators and nothing to keep
+            return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if self.blob_regex.match(name):
+            patch_cache_control(response, public=True, max_age=self.immutable_max_age, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=media_serving_setting('MAX_AGE'))
+        return response
+    
+    def get(self, request, path):
+        name = posixpath.normpath(path).lstrip('/')
+        if not self.has_permission(request, name):
+            raise Http404("File not found")
+        full_path = self.get_path(name)
+        stat = os.stat(full_path)
+        etag = self.get_etag(name, stat)
+        
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if not_modified is not None:
+            incr('media.not_modified')
+            return self.set_headers(not_modified, name, etag, stat)
+        
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        sendfile = media_serving_setting('SENDFILE')
+        if sendfile:
+            incr('media.offloaded')
+            response = HttpResponse(content_type=content_type)
+            if sendfile == 'x-accel-redirect':
+                response['X-Accel-Redirect'] = media_serving_setting('ACCEL_PREFIX').rstrip('/') + '/' + name
+            else:
+                response['X-Sendfile'] = full_path
+            return self.set_headers(response, name, etag, stat)
+        
+        byte_range = self.get_range(request, etag, stat)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{stat.st_size}"
+            return self.set_headers(response, name, etag, stat)
+        if byte_range is None:
+            incr('media.full')
+            response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            return self.set_headers(response, name, etag, stat)
+        
+        incr('media.partial')
+        start, end = byte_range
+        response = StreamingHttpResponse(self.read_range(full_path, start, end), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+        return self.set_headers(response, name, etag, stat)
+    
+    def read_range(self, full_path, start, end):
+        # slices of the mapping come straight from the page cache, the file is
+        # never read into memory as a whole
+        with open(full_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(start, end + 1, self.block_size):
+                yield mapped[offset:min(offset + self.block_size, end + 1)]
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     #packags
     'rest_framework',
@@ -71,8 +72,54 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES':[
         # 'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
-    ]
+        'users.authentication.CachedJWTAuthentication'
+    ],
+    'DEFAULT_THROTTLE_CLASSES':[
+        'base_app.throttling.SlidingWindowThrottle',
+    ],
+    # reverse proxies in front of the app. Throttles key on the client
+    # address; with 0 that is REMOTE_ADDR, with N the Nth address from the
+    # right of X-Forwarded-For. Left unset, DRF would trust the whole header
+    # as sent by the client, so every new value would get a fresh limit.
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+}
+
+# Limits per `throttle_scope` of a view: `ip` per client address, `user` per
+# user (per address when anonymous), `endpoint` for all clients together.
+# Rejected requests get 429 and are counted as throttle.rejected.* in /metrics/.
+# Counts live in the ALIAS cache; it has to be shared by all processes
+# (e.g. django.core.cache.backends.redis.RedisCache or the database cache).
+THROTTLING = {
+    'ALIAS': 'default',
+    'KEY_PREFIX': 'throttle',
+    'RATES': {
+        'signup': {'ip': '5/hour', 'endpoint': '1000/hour'},
+        'verify': {'user': '10/hour'},
+        'verify-resend': {'user': '5/hour'},
+        'forgot-password': {'ip': '5/hour', 'endpoint': '500/hour'},
+        'login': {'ip': '20/min'},
+        'search': {'ip': '60/min'},
+        'like': {'user': '120/min'},
+        'like-batch': {'user': '30/min'},
+    },
+}
+
+# Users resolved from access tokens can be cached for GET requests. The cache must be
+# shared by all processes (Redis, Memcached), so saving a user invalidates it everywhere;
+# a per-process cache such as 'default' is refused. None keeps the cache off.
+AUTH_USER_CACHE = {
+    'ALIAS': None,
+    'TIMEOUT': 60,
+    'KEY_PREFIX': 'auth-user',
+    'FIELDS': ('id', 'username', 'is_active', 'is_staff', 'is_superuser', 'auth_type', 'auth_status'),
+}
+
+# Blacklisted refresh tokens are kept in a bloom filter per process (users.blacklist)
+TOKEN_BLACKLIST_FILTER = {
+    'ERROR_RATE': 0.01,         # share of refreshes that still query the blacklist table
+    'MIN_CAPACITY': 100000,
+    'SYNC_INTERVAL': 1,         # seconds before tokens blacklisted by other processes are picked up
+    'SYNC_LOOKBACK': 50,        # ids re-read by every sync, for rows committed out of id order
 }
 
 SIMPLE_JWT = {
@@ -159,6 +206,46 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,    # least recently used entries are culled above this
+        },
+    },
+}
+
+RESPONSE_CACHE = {
+    'ALIAS': 'responses',
+    'TIMEOUT': 60,
+    'KEY_PREFIX': 'response',
+}
+
+
+# The first hasher hashes new passwords, the others still verify old hashes.
+# A user whose hash was made by another hasher, or with another cost, is
+# rehashed on their next login. TunedArgon2PasswordHasher needs argon2-cffi.
+PASSWORD_HASHERS = [
+    'users.hashers.TunedPBKDF2PasswordHasher',
+    'users.hashers.TunedScryptPasswordHasher',
+    'users.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+PASSWORD_HASHER_COST = {
+    'pbkdf2_sha256': {'iterations': 870000},
+    'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 1},     # 16MB per hash
+    'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},      # memory in KiB
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -200,6 +287,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded media is stored by content hash, so identical files are kept once
+STORAGES = {
+    'default': {
+        'BACKEND': 'base_app.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -214,4 +311,128 @@ EMAIL_PORT = config('EMAIL_PORT')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS')
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
-DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
\ No newline at end of file
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
+
+#BACKGROUND JOBS (emails, SMS, timeline fan-out), run by `python manage.py run_jobs`
+JOBS = {
+    'EAGER': False,            # True runs jobs inline, after the request's transaction commits
+    'WORKERS': 4,              # threads per run_jobs process
+    'CLAIM_SIZE': 100,         # jobs leased per polling round
+    'MAX_ATTEMPTS': 5,         # then the job is marked dead
+    'BACKOFF_BASE': 10,        # seconds before the first retry, doubled for every further attempt
+    'BACKOFF_MAX': 60 * 60,
+    'LEASE': 5 * 60,           # seconds before a job of a crashed worker is claimed again
+    'POLL_INTERVAL': 1,
+    'KEEP_DONE': 7 * 24 * 60 * 60,     # finished jobs (and their idempotency keys) kept for `purge_jobs`
+}
+
+#DELIVERY: per worker process limits of the email and SMS providers
+DELIVERY = {
+    'MAIL': {
+        'RATE': 20,             # messages per second, None for no limit
+        'BURST': 50,
+        'IDLE_TIMEOUT': 60,     # seconds an SMTP connection is kept open without traffic
+        'MAX_MESSAGES': 100,    # messages sent over one SMTP connection before it is reopened
+    },
+    'SMS': {
+        'RATE': 1,
+        'BURST': 5,
+    },
+}
+
+#SMS: ConsoleSMSSender logs codes, LocmemSMSSender keeps them in base_app.sms.outbox,
+#TwilioSMSSender sends them (needs TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, FROM_USER_PHONE_NUMBER)
+SMS = {
+    'BACKEND': 'base_app.sms.ConsoleSMSSender',
+    'OPTIONS': {},
+}
+
+#HOME TIMELINE
+TIMELINE = {
+    'BACKEND': 'post.timeline.DatabaseTimelineStore',   # or InMemoryTimelineStore / RedisTimelineStore
+    'OPTIONS': {},
+    'MAX_ENTRIES': 800,                # posts kept per user timeline
+    'FANOUT_FOLLOWER_LIMIT': 10000,    # authors above this are merged at read time
+    'FANOUT_BATCH_SIZE': 1000,
+    'BACKFILL_POSTS': 50,              # posts copied into the timeline on follow
+}
+
+
+#COUNTER SHARDS: like/comment counters of hot posts are spread over PostCounterShard rows (post.counters)
+COUNTER_SHARDS = {
+    'ALIAS': 'default',        # shared cache holding write rates and the hot posts
+    'KEY_PREFIX': 'counter-shards',
+    'SHARDS': 16,              # rows per hot post
+    'WINDOW': 10,              # seconds over which counter writes are counted
+    'PROMOTE_RATE': 50,        # counter writes per second that make a post hot
+    'DEMOTE_RATE': 5,          # below this `manage.py fold_counter_shards` folds the shards back
+}
+
+#POST FRAGMENTS: viewer independent post representations cached per post version (post.fragments)
+POST_FRAGMENTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'KEY_PREFIX': 'post-fragment',
+    'TIMEOUT': 10 * 60,        # keys change with every version of a post, old entries just expire
+}
+
+#LIKE WRITE-BEHIND: likes are journaled and applied in batches by a thread per process (post.like_buffer)
+LIKE_WRITE_BEHIND = {
+    'ENABLED': False,          # True answers like requests with 202 before the like is written
+    'JOURNAL_DIR': os.path.join(BASE_DIR, 'tmp', 'likes'),   # local disk; segments of crashed processes are replayed from here
+    'FLUSH_INTERVAL': 0.5,     # seconds between batches
+    'FLUSH_SIZE': 5000,        # pending (author, target) pairs that trigger a batch early
+    'FSYNC': False,            # True survives a machine crash too, at one fsync per like
+    'MAX_ATTEMPTS': 3,         # flushes an event may fail before it is moved to JOURNAL_DIR/dead-letter.log
+}
+
+
+#SEARCH
+SEARCH = {
+    'BACKEND': None,       # None picks PostgresSearchBackend on PostgreSQL, InvertedIndexSearchBackend otherwise
+    'CONFIG': 'simple',    # text search configuration used for captions
+    'MAX_RESULTS': 1000,   # upper bound of ranked ids kept by the in-process index
+}
+
+
+#MEDIA PROCESSING
+MEDIA_PROCESSING = {
+    'EAGER': False,        # True processes uploads inline, after the request's transaction commits
+    'WORKERS': 2,          # threads resizing images in each web process
+    'RENDITIONS': {        # kind -> (width, height), height None keeps the aspect ratio
+        'thumbnail': (150, 150),
+        'small': (320, None),
+        'medium': (640, None),
+        'large': (1080, None),
+    },
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'STALE_AFTER': 600,    # seconds before a post stuck in `processing` may be claimed again
+}
+
+
+#RESUMABLE UPLOADS
+UPLOADS = {
+    'TEMP_DIR': os.path.join(BASE_DIR, 'tmp', 'uploads'),   # outside MEDIA_ROOT, same disk so finished files are moved, not copied
+    'CHUNK_SIZE': 8 * 1024 * 1024,     # largest body accepted by one PUT
+    'EXPIRE_AFTER': 24 * 60 * 60,      # seconds; expired sessions are removed by `manage.py purge_uploads`
+    'PURPOSES': {
+        'post': {
+            'max_size': 1024 * 1024 * 1024,
+            'extensions': ['png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov', 'mkv', 'heic'],
+        },
+        'avatar': {
+            'max_size': 10 * 1024 * 1024,
+            'extensions': ['jpg', 'jpeg', 'png', 'heic'],
+        },
+    },
+}
+
+
+#MEDIA SERVING
+MEDIA_SERVING = {
+    'SENDFILE': None,                       # 'x-sendfile' (Apache, lighttpd) or 'x-accel-redirect' (nginx)
+    'ACCEL_PREFIX': '/protected-media/',    # internal nginx location aliased to MEDIA_ROOT
+    'MAX_AGE': 24 * 60 * 60,                # cache lifetime of files that are not content-addressed
+    'PERMISSION_CHECK': None,               # dotted path to callable(request, name) -> bool
+}
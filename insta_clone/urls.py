@@ -1,3 +1,6 @@
+import re
+from urllib.parse import urlsplit
+
 from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
@@ -7,6 +10,9 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
 from post.views import SearchAPIView
+from users.views import UserPrefixSearchAPIView
+from base_app.views import MetricsAPIView, UploadCreateAPIView, UploadChunkAPIView, UploadFinalizeAPIView, \
+    MediaFileView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -25,8 +31,18 @@ urlpatterns = [
     path('users/', include('users.urls')),
     path('post/', include('post.urls')),
     path('search/', SearchAPIView.as_view(), name='search'),
+    path('async/', include('post.async_urls')),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
+    path('uploads/', UploadCreateAPIView.as_view(), name='upload-create'),
+    path('uploads/<uuid:pk>/', UploadChunkAPIView.as_view(), name='upload-chunk'),
+    path('uploads/<uuid:pk>/finalize/', UploadFinalizeAPIView.as_view(), name='upload-finalize'),
+    path('search/users/prefix/', UserPrefixSearchAPIView.as_view(), name='search-users-prefix'),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]+ static(settings.STATIC_URL , document_root = settings.STATIC_ROOT)
-urlpatterns+= static(settings.MEDIA_URL , document_root = settings.MEDIA_ROOT)
+if not urlsplit(settings.MEDIA_URL).netloc:
+    # media hosted elsewhere (e.g. a CDN) is not served by Django
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), MediaFileView.as_view(), name='media'),
+    ]
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'insta_clone.settings')
 
 application = get_wsgi_application()
+
+from users.prefix_index import user_prefix_index
+user_prefix_index.warm_in_background()
+
+from users.blacklist import blacklist_filter
+blacklist_filter.warm_in_background()
+
+from post.like_buffer import like_buffer
+like_buffer.start()
@@ -1,10 +1,18 @@
 from django.contrib import admin
-from .models import Post, PostComment, PostLike, CommentLike
+from .models import Post, PostComment, PostLike, CommentLike, PostMedia
 # Register your models here.
 
+class PostMediaInline(admin.TabularInline):
+    model = PostMedia
+    extra = 0
+    readonly_fields = ['kind','format','width','height','file']
+
+
 class PostAdmin(admin.ModelAdmin):
-    list_display = ['id','author','caption','created_at']
+    list_display = ['id','author','caption','media_status','created_at']
+    list_filter = ['media_status']
     search_fields = ['id','author__username','caption']
+    inlines = [PostMediaInline]
     
 
 class PostCommentAdmin(admin.ModelAdmin):
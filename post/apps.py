@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PostConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'post'
+
+    def ready(self):
+        from . import signals
+        # registers the job handlers
+        from . import tasks
@@ -0,0 +1,11 @@
+from django.urls import path
+from .async_views import AsyncPostListView, AsyncHomeFeedView, AsyncPostDetailView, AsyncPostCommentListView, AsyncSearchView
+
+
+urlpatterns = [
+    path('post/list/',AsyncPostListView.as_view()),
+    path('post/feed/',AsyncHomeFeedView.as_view()),
+    path('post/<uuid:pk>/',AsyncPostDetailView.as_view()),
+    path('post/<uuid:pk>/comments/',AsyncPostCommentListView.as_view()),
+    path('search/',AsyncSearchView.as_view()),
+]
@@ -0,0 +1,95 @@
+from abc import ABCMeta, abstractmethod
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.exceptions import NotFound
+
+from base_app.async_views import AsyncAPIView
+from base_app.custom_pagination import KeysetPagination, OldestFirstKeysetPagination
+from users.authentication import AsyncJWTAuthentication
+from .comment_tree import aload_replies
+from .models import Post, PostComment
+from .timeline import home_feed_queryset
+from .views import CommentTreeMixin, SearchMixin
+from . import serializers
+
+
+# Async counterparts of the hot read endpoints, for deployments that serve
+# the project with an ASGI server. Queries go through the async ORM and the
+# serializers only read what was loaded, so no request holds a thread while
+# it waits on the database or a slow client.
+
+
+class AsyncKeysetListView(AsyncAPIView, metaclass=ABCMeta):
+    """Keyset paginated list; subclasses set `serializer_class` and implement get_queryset()."""
+    authentication_classes = (AsyncJWTAuthentication,)
+    serializer_class = None
+    pagination_class = KeysetPagination
+    
+    @abstractmethod
+    async def get_queryset(self):
+        """The unevaluated queryset to paginate, usually depending on `self.request`."""
+    
+    async def prepare_objects(self, objects):
+        return objects
+    
+    async def get(self, request, *args, **kwargs):
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(await self.get_queryset(), request)
+        page = await self.prepare_objects(page)
+        serializer = self.serializer_class(page, many=True, context={'request': request})
+        return JsonResponse(paginator.get_paginated_data(serializer.data))
+    
+    
+class AsyncPostListView(AsyncKeysetListView):
+    serializer_class = serializers.PostSerializer
+    
+    async def get_queryset(self):
+        return Post.objects.with_stats(self.request.user)
+    
+    
+class AsyncHomeFeedView(AsyncKeysetListView):
+    authentication_required = True
+    serializer_class = serializers.PostSerializer
+    
+    async def get_queryset(self):
+        # timeline stores other than the database one may do blocking I/O
+        return await sync_to_async(home_feed_queryset)(self.request.user)
+    
+    
+class AsyncPostDetailView(AsyncAPIView):
+    authentication_classes = (AsyncJWTAuthentication,)
+    
+    async def get(self, request, *args, **kwargs):
+        try:
+            post = await Post.objects.with_stats(request.user).aget(pk=kwargs['pk'])
+        except Post.DoesNotExist:
+            raise NotFound()
+        serializer = serializers.PostSerializer(post, context={'request': request})
+        return JsonResponse(serializer.data)
+    
+    
+class AsyncPostCommentListView(CommentTreeMixin, AsyncKeysetListView):
+    serializer_class = serializers.CommentSerializer
+    pagination_class = OldestFirstKeysetPagination
+    
+    async def get_queryset(self):
+        return PostComment.objects.with_stats(self.request.user).filter(post__id=self.kwargs['pk'], parent=None)
+    
+    async def prepare_objects(self, objects):
+        return await aload_replies(objects, **self.get_reply_options())
+    
+    
+class AsyncSearchView(SearchMixin, AsyncAPIView):
+    
+    async def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        page, page_size = self.get_page_params(request)
+        if not query:
+            return JsonResponse(self.get_search_results(request, page, page_size))
+        
+        # the in-process search index may be rebuilt on first use, which blocks
+        users, posts = await sync_to_async(self.get_search_querysets)(query, page, page_size)
+        users = [user async for user in users]
+        posts = [post async for post in posts]
+        return JsonResponse(self.get_search_results(request, page, page_size, users, posts))
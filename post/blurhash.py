@@ -0,0 +1,75 @@
+import math
+
+
+CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+SAMPLE_SIZE = 32
+
+
+def base83(value, length):
+    return ''.join(CHARACTERS[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def srgb_to_linear(value):
+    value = value / 255
+    if value <= 0.04045:
+        return value / 12.92
+    return ((value + 0.055) / 1.055) ** 2.4
+
+
+def linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def sign_pow(value, exponent):
+    return math.copysign(abs(value) ** exponent, value)
+
+
+LINEAR = [srgb_to_linear(value) for value in range(256)]
+
+
+def encode(image, x_components=4, y_components=3):
+    """
+    BlurHash (https://blurha.sh) of a Pillow image. The hash only keeps a few
+    DCT components, so the image is downsampled first; that changes nothing
+    visible and keeps this pure Python encoder fast.
+    """
+    image = image.convert('RGB')
+    image.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    width, height = image.size
+    pixels = [(LINEAR[r], LINEAR[g], LINEAR[b]) for r, g, b in image.getdata()]
+
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            normalisation = 1 if i == 0 and j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    pr, pg, pb = pixels[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    blurhash = base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        actual_maximum = max(abs(value) for factor in ac for value in factor)
+        quantised_maximum = max(0, min(82, int(actual_maximum * 166 - 0.5)))
+        maximum = (quantised_maximum + 1) / 166
+    else:
+        quantised_maximum, maximum = 0, 1
+    blurhash += base83(quantised_maximum, 1)
+    blurhash += base83((linear_to_srgb(dc[0]) << 16) + (linear_to_srgb(dc[1]) << 8) + linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, int(math.floor(sign_pow(value / maximum, 0.5) * 9 + 9.5)))) for value in factor)
+        blurhash += base83(r * 19 * 19 + g * 19 + b, 2)
+    return blurhash
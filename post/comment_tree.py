@@ -0,0 +1,64 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import PostComment
+
+
+def load_replies(comments, user=None, depth=3, limit=5):
+    """
+    Attach replies to `comments` as `loaded_replies`, so CommentSerializer
+    can render the whole thread without touching the database.
+
+    Replies are loaded one level at a time (one query per level, at most
+    `depth` levels) and every comment gets at most `limit` replies, oldest
+    first. Comments below the depth limit get an empty list; clients can
+    use `replies_count` to decide whether to fetch the rest of a thread.
+    """
+    level = list(comments)
+    for _ in range(depth):
+        parents = collect_parents(level)
+        if not parents:
+            return comments
+        level = list(replies_queryset(parents, user, limit))
+        attach(parents, level)
+    for comment in level:
+        comment.loaded_replies = []
+    return comments
+
+
+async def aload_replies(comments, user=None, depth=3, limit=5):
+    """load_replies() on the async ORM, for async views."""
+    level = list(comments)
+    for _ in range(depth):
+        parents = collect_parents(level)
+        if not parents:
+            return comments
+        level = [reply async for reply in replies_queryset(parents, user, limit)]
+        attach(parents, level)
+    for comment in level:
+        comment.loaded_replies = []
+    return comments
+
+
+def collect_parents(level):
+    parents = {}
+    for comment in level:
+        comment.loaded_replies = []
+        if getattr(comment, 'replies_count', 1):
+            parents[comment.pk] = comment
+    return parents
+
+
+def replies_queryset(parents, user, limit):
+    return PostComment.objects.with_stats(user).filter(parent_id__in=parents).annotate(
+        reply_rank=Window(
+            RowNumber(),
+            partition_by=F('parent_id'),
+            order_by=[F('created_at').asc(), F('id').asc()],
+        )
+    ).filter(reply_rank__lte=limit).order_by('created_at', 'id')
+
+
+def attach(parents, replies):
+    for reply in replies:
+        parents[reply.parent_id].loaded_replies.append(reply)
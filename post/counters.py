@@ -0,0 +1,153 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+
+from base_app.counters import shift_counter
+from base_app.metrics import incr
+from .models import Post, PostComment, PostCounterShard
+
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'KEY_PREFIX': 'counter-shards',
+    'SHARDS': 16,
+    'WINDOW': 10,           # seconds over which counter writes per post are counted
+    'PROMOTE_RATE': 50,     # counter writes per second that make a post hot
+    'DEMOTE_RATE': 5,       # below this `fold_counter_shards` folds the shards back
+}
+
+
+def shards_setting(name):
+    return getattr(settings, 'COUNTER_SHARDS', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[shards_setting('ALIAS')]
+
+
+def hot_key(post_id):
+    return f"{shards_setting('KEY_PREFIX')}:hot:{post_id}"
+
+
+def rate_key(post_id, index):
+    return f"{shards_setting('KEY_PREFIX')}:rate:{post_id}:{index}"
+
+
+def window_index(offset=0):
+    return int(time.time() // shards_setting('WINDOW')) + offset
+
+
+def count_write(cache, post_id):
+    """Count one counter write of `post_id` in the current window and return the window's total."""
+    key = rate_key(post_id, window_index())
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # kept for two windows, the previous one is read when demoting
+        if cache.add(key, 1, shards_setting('WINDOW') * 2):
+            return 1
+        return cache.incr(key)
+
+
+def shift_post_counters(post_ids, field, delta):
+    """
+    Add `delta` to the `field` counter of every post in `post_ids`. Hot
+    posts take the write on one of their shards, picked at random; the
+    others on their own row. A post is promoted to shards once its writes
+    in one WINDOW exceed PROMOTE_RATE per second.
+
+    Which posts are hot is kept in the cache; losing that only sends writes
+    back to the Post row, counts stay right because readers always add the
+    shards that exist.
+    """
+    if delta == 0 or not post_ids:
+        return
+    cache = get_cache()
+    flags = cache.get_many([hot_key(post_id) for post_id in post_ids])
+    cold = [post_id for post_id in post_ids if not flags.get(hot_key(post_id))]
+    for post_id in post_ids:
+        shards = flags.get(hot_key(post_id))
+        if shards:
+            updated = PostCounterShard.objects.filter(post_id=post_id, shard=random.randrange(shards)).update(
+                **{field: F(field) + delta, 'updated_at': Now()}
+            )
+            if updated:
+                incr('counters.sharded_writes')
+            else:
+                # folded back since the flag was read
+                cold.append(post_id)
+    shift_counter(Post.objects.filter(pk__in=cold), field, delta)
+
+    threshold = shards_setting('PROMOTE_RATE') * shards_setting('WINDOW')
+    for post_id in post_ids:
+        if count_write(cache, post_id) == threshold and not flags.get(hot_key(post_id)):
+            # once per window, by the write that crosses the threshold
+            transaction.on_commit(lambda post_id=post_id: promote(post_id))
+
+
+def promote(post_id):
+    """Give `post_id` its counter shards and send further writes to them."""
+    shards = shards_setting('SHARDS')
+    try:
+        PostCounterShard.objects.bulk_create(
+            [PostCounterShard(post_id=post_id, shard=shard) for shard in range(shards)],
+            ignore_conflicts=True,
+        )
+    except IntegrityError:
+        # the post was deleted meanwhile
+        return False
+    get_cache().set(hot_key(post_id), shards, timeout=None)
+    incr('counters.promoted')
+    return True
+
+
+def demote(post_id):
+    """Fold the shards of `post_id` back into its row and remove them."""
+    get_cache().delete(hot_key(post_id))
+    with transaction.atomic():
+        # writers that still picked a shard wait here, then miss it and write to the post
+        shards = list(
+            PostCounterShard.objects.select_for_update().filter(post_id=post_id)
+            .values_list('pk', 'like_count', 'comment_count')
+        )
+        if not shards:
+            return False
+        PostCounterShard.objects.filter(pk__in=[pk for pk, likes, comments in shards]).delete()
+        posts = Post.objects.filter(pk=post_id)
+        shift_counter(posts, 'like_count', sum(likes for pk, likes, comments in shards))
+        shift_counter(posts, 'comment_count', sum(comments for pk, likes, comments in shards))
+    incr('counters.demoted')
+    return True
+
+
+def cooled_posts():
+    """
+    Posts with shards whose writes fell below DEMOTE_RATE both in the last
+    complete window and so far in the current one, so a post that heats up
+    again right after a quiet window keeps its shards.
+    """
+    post_ids = list(PostCounterShard.objects.values_list('post_id', flat=True).distinct())
+    windows = (window_index(-1), window_index())
+    rates = get_cache().get_many([rate_key(post_id, index) for post_id in post_ids for index in windows])
+    threshold = shards_setting('DEMOTE_RATE') * shards_setting('WINDOW')
+    return [
+        post_id for post_id in post_ids
+        if all(rates.get(rate_key(post_id, index), 0) < threshold for index in windows)
+    ]
+
+
+def add_post_likes(post_id, delta=1):
+    return shift_post_counters([post_id], 'like_count', delta)
+
+
+def add_post_comments(post_id, delta=1):
+    return shift_post_counters([post_id], 'comment_count', delta)
+
+
+def add_comment_likes(comment_id, delta=1):
+    return shift_counter(PostComment.objects.filter(pk=comment_id), 'like_count', delta)
@@ -0,0 +1,57 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from base_app.conditional import resolve
+from base_app.metrics import incr
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'KEY_PREFIX': 'post-fragment',
+    'TIMEOUT': 10 * 60,
+}
+
+# everything in a post's shared representation that can change; a new value is a new key
+VERSION_FIELDS = ('updated_at', 'total_like_count', 'total_comment_count', 'shards_updated_at', 'author.updated_at')
+
+
+def fragments_setting(name):
+    return getattr(settings, 'POST_FRAGMENTS', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[fragments_setting('ALIAS')]
+
+
+def fragment_key(post, base_url):
+    # media URLs are absolute, so the same post renders differently per host
+    version = hashlib.md5(repr([base_url] + [resolve(post, field) for field in VERSION_FIELDS]).encode()).hexdigest()
+    return f"{fragments_setting('KEY_PREFIX')}:{post.pk}:{version}"
+
+
+def get_fragments(posts, base_url, render):
+    """
+    Viewer independent representations of `posts`, in order. Cached ones
+    come from a single get_many(); the others are rendered with
+    `render(post)` and stored with a single set_many(). Keys change with
+    every version of the post, so entries are never invalidated, they
+    expire after TIMEOUT.
+    """
+    cache = get_cache()
+    keys = [fragment_key(post, base_url) for post in posts]
+    cached = cache.get_many(keys)
+    missing = {}
+    fragments = []
+    for post, key in zip(posts, keys):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment = missing[key] = render(post)
+        fragments.append(fragment)
+    if missing:
+        cache.set_many(missing, fragments_setting('TIMEOUT'))
+    incr('fragments.hit', len(cached))
+    incr('fragments.miss', len(missing))
+    return fragments
@@ -0,0 +1,275 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DataError, IntegrityError, close_old_connections
+
+from base_app.metrics import incr
+from .likes import apply_likes
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'JOURNAL_DIR': os.path.join(tempfile.gettempdir(), 'insta_clone_likes'),
+    'FLUSH_INTERVAL': 0.5,
+    'FLUSH_SIZE': 5000,
+    'FSYNC': False,
+    'MAX_ATTEMPTS': 3,
+}
+
+# errors caused by the events themselves; retrying the same batch cannot fix them
+BAD_EVENT_ERRORS = (DataError, IntegrityError, ValidationError)
+DEAD_LETTER_FILE = 'dead-letter.log'
+
+
+def write_behind_setting(name):
+    return getattr(settings, 'LIKE_WRITE_BEHIND', {}).get(name, DEFAULTS[name])
+
+
+def read_journal(path):
+    """Events of one journal segment, coalesced so the last event per (kind, author, target) wins."""
+    changes = {}
+    with open(path) as journal:
+        for line in journal:
+            try:
+                kind, author, target, liked = json.loads(line)
+            except ValueError:
+                # the last line of a crashed writer may be cut short
+                continue
+            changes[(kind, author, target)] = liked
+    return changes
+
+
+def apply_changes(changes):
+    by_kind = {}
+    for (kind, author, target), liked in changes.items():
+        by_kind.setdefault(kind, {})[(author, target)] = liked
+    for kind, kind_changes in by_kind.items():
+        apply_likes(kind, kind_changes)
+
+
+def apply_isolated(changes):
+    """
+    apply_changes(), falling back to one event at a time when the batch is
+    rejected for its data, so one bad event cannot hold back the others.
+    Returns the events that still failed, with their errors. Other errors,
+    such as a lost connection, propagate and the whole batch is retried.
+    """
+    try:
+        apply_changes(changes)
+        return {}
+    except BAD_EVENT_ERRORS:
+        incr('likes.write_behind.isolated')
+    failed = {}
+    for key, liked in changes.items():
+        try:
+            apply_changes({key: liked})
+        except BAD_EVENT_ERRORS as exc:
+            failed[key] = exc
+    return failed
+
+
+def dead_letter(events, errors, directory=None):
+    """Set aside events that cannot be applied, in DEAD_LETTER_FILE next to the journals."""
+    if not events:
+        return
+    directory = directory or write_behind_setting('JOURNAL_DIR')
+    with open(os.path.join(directory, DEAD_LETTER_FILE), 'a') as file:
+        for key, liked in events.items():
+            file.write(json.dumps([*key, liked, repr(errors[key])]) + '\n')
+    logger.warning("%s like events moved to %s", len(events), DEAD_LETTER_FILE)
+    incr('likes.write_behind.dead_lettered', len(events))
+
+
+class LikeBuffer:
+    """
+    Write-behind buffer for likes and unlikes. add() appends the event to a
+    journal file of this process and keeps only the latest event per
+    (kind, author, target) in memory; a background thread applies what
+    accumulated every FLUSH_INTERVAL seconds, or as soon as FLUSH_SIZE
+    pairs are pending, with post.likes.apply_likes(): one multi-row insert,
+    one delete and one counter update per distinct delta, instead of a
+    transaction per like on the same hot row.
+
+    A journal segment is deleted once its events are in the database.
+    Segments left behind by a crashed process are replayed by replay(),
+    which runs when a buffer starts and from `manage.py flush_likes`.
+    Each segment is flock()ed by the process writing it, so live segments
+    are never replayed. Applying a segment twice is harmless, because
+    apply_likes() only counts likes it really added or removed.
+
+    An event the database keeps rejecting is retried with the next flushes
+    and moved to DEAD_LETTER_FILE after MAX_ATTEMPTS, so it cannot block
+    the queue.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = {}
+        self.journal = None
+        # open segments whose events are in `pending`, oldest first
+        self.segments = []
+        # failed flushes per (kind, author, target) still pending
+        self.attempts = {}
+        self.thread = None
+        self.pid = None
+
+    def enabled(self):
+        return write_behind_setting('ENABLED')
+
+    def start(self):
+        """Replay orphaned segments and start the flush thread; a no-op while disabled."""
+        if not self.enabled():
+            return
+        with self.lock:
+            # threads do not survive a fork, a forked worker starts its own
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            os.makedirs(write_behind_setting('JOURNAL_DIR'), exist_ok=True)
+            self.thread = threading.Thread(target=self.run, name='like-write-behind', daemon=True)
+            self.thread.start()
+        atexit.register(self.flush)
+
+    def open_segment(self):
+        name = f"likes-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex}.log"
+        journal = open(os.path.join(write_behind_setting('JOURNAL_DIR'), name), 'a')
+        fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.segments.append(journal)
+        return journal
+
+    def add(self, kind, author_id, target_id, liked):
+        self.start()
+        key = (kind, str(author_id), str(target_id))
+        line = json.dumps([*key, liked]) + '\n'
+        with self.lock:
+            if self.journal is None:
+                self.journal = self.open_segment()
+            self.journal.write(line)
+            self.journal.flush()
+            if write_behind_setting('FSYNC'):
+                os.fsync(self.journal.fileno())
+            if key in self.pending:
+                incr('likes.write_behind.coalesced')
+            self.pending[key] = liked
+            full = len(self.pending) >= write_behind_setting('FLUSH_SIZE')
+        incr('likes.write_behind.buffered')
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        """Apply everything buffered so far; returns the number of (kind, author, target) pairs written."""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                segments, self.segments = self.segments, []
+                self.journal = None
+            failed = {}
+            if pending:
+                started = time.perf_counter()
+                try:
+                    failed = apply_isolated(pending)
+                except Exception:
+                    self.requeue(pending, segments)
+                    incr('likes.write_behind.flush_failed')
+                    raise
+                incr('likes.write_behind.flushed', len(pending) - len(failed))
+                incr('likes.write_behind.flush_us', int((time.perf_counter() - started) * 1000000))
+            retry, dead = {}, {}
+            for key in pending:
+                if key not in failed:
+                    self.attempts.pop(key, None)
+                    continue
+                self.attempts[key] = self.attempts.get(key, 0) + 1
+                if self.attempts[key] >= write_behind_setting('MAX_ATTEMPTS'):
+                    dead[key] = pending[key]
+                    del self.attempts[key]
+                else:
+                    retry[key] = pending[key]
+            dead_letter(dead, failed)
+            if retry:
+                # the segments still hold the retried events
+                self.requeue(retry, segments)
+                return len(pending) - len(failed)
+            for journal in segments:
+                # removed while still locked, so no replay can pick it up in between
+                os.remove(journal.name)
+                journal.close()
+            return len(pending) - len(failed)
+
+    def requeue(self, events, segments):
+        with self.lock:
+            # events added meanwhile are newer and win
+            self.pending = {**events, **self.pending}
+            self.segments = segments + self.segments
+            if self.journal is None and segments:
+                self.journal = segments[-1]
+
+    def run(self):
+        try:
+            replay()
+        except Exception:
+            logger.exception("Replaying like journals failed")
+        while True:
+            self.wakeup.wait(write_behind_setting('FLUSH_INTERVAL'))
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing buffered likes failed")
+            finally:
+                close_old_connections()
+
+
+def replay(directory=None):
+    """
+    Apply the journal segments of processes that stopped before flushing
+    them, oldest first, and delete them. Returns the number of segments
+    replayed.
+    """
+    directory = directory or write_behind_setting('JOURNAL_DIR')
+    segments = []
+    for path in glob.glob(os.path.join(directory, 'likes-*.log')):
+        try:
+            segments.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            # flushed by its owner since the listing
+            continue
+    replayed = 0
+    for mtime, path in sorted(segments):
+        try:
+            journal = open(path)
+        except FileNotFoundError:
+            continue
+        with journal:
+            try:
+                fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # still being written by a live process
+                continue
+            if not os.path.exists(path):
+                continue
+            changes = read_journal(path)
+            failed = apply_isolated(changes)
+            # nobody is left to retry them
+            dead_letter({key: changes[key] for key in failed}, failed, directory)
+            os.remove(path)
+        replayed += 1
+        incr('likes.write_behind.replayed')
+    return replayed
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,119 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from base_app.counters import shift_counter
+from base_app.response_cache import invalidate
+from users.models import User
+from .counters import shift_post_counters
+from .models import Post, PostComment, PostLike, CommentLike, shard_sum
+
+
+# ids accepted per kind by one batch request
+MAX_BATCH_SIZE = 100
+
+# kind -> (liked model, like model, name of the like's foreign key)
+LIKE_TARGETS = {
+    'posts': (Post, PostLike, 'post'),
+    'comments': (PostComment, CommentLike, 'comment'),
+}
+
+
+def liked_state(kind, user, ids):
+    """
+    Like count and whether `user` liked it, for every existing id of `kind`,
+    in one query for the counts and one for the viewer's likes.
+    """
+    model, like_model, field = LIKE_TARGETS[kind]
+    queryset = model.objects.filter(pk__in=ids)
+    if kind == 'posts':
+        queryset = queryset.annotate(total_like_count=F('like_count') + shard_sum('like_count'))
+    else:
+        queryset = queryset.annotate(total_like_count=F('like_count'))
+    counts = dict(queryset.values_list('pk', 'total_like_count'))
+    liked = set()
+    if user is not None and user.is_authenticated and counts:
+        liked = set(like_model.objects.filter(author=user, **{f'{field}__in': counts}).values_list(f'{field}_id', flat=True))
+    return {str(pk): {'liked': pk in liked, 'like_count': count} for pk, count in counts.items()}
+
+
+def post_ids_of(kind, ids):
+    if kind == 'posts':
+        return set(ids)
+    return set(PostComment.objects.filter(pk__in=ids).values_list('post_id', flat=True))
+
+
+def invalidate_liked(kind, ids):
+    # like the post_save/post_delete receivers, only the liked posts themselves
+    invalidate(*[f'post:{post_id}' for post_id in post_ids_of(kind, ids)])
+
+
+def apply_likes(kind, changes):
+    """
+    Apply `changes`, a dict of (author id, target id) -> True to like or
+    False to unlike, for targets of `kind`. Returns the counter change per
+    target id, counting only likes that were really added or removed, so
+    applying the same changes twice changes nothing the second time.
+
+    The cost is a fixed number of statements however many changes there are:
+    one multi-row insert, one delete and one counter update per distinct
+    delta (nearly always +1 or -1), plus one per hot post (see post.counters).
+    The exception is unliking comments: the CommentLike post_delete receiver
+    reads the comment of every removed like.
+    """
+    model, like_model, field = LIKE_TARGETS[kind]
+    likes = [pair for pair, liked in changes.items() if liked]
+    unlikes = {pair for pair, liked in changes.items() if not liked}
+    deltas = Counter()
+    with transaction.atomic():
+        if likes:
+            # a like of a missing row or by a deleted user would fail a foreign key,
+            # which ignore_conflicts does not cover, so both sides are filtered first
+            existing = {str(pk) for pk in model.objects.filter(pk__in={target for author, target in likes}).values_list('pk', flat=True)}
+            authors = {str(pk) for pk in User.objects.filter(pk__in={author for author, target in likes}).values_list('pk', flat=True)}
+            rows = [
+                like_model(author_id=author, **{f'{field}_id': target})
+                for author, target in likes if target in existing and author in authors
+            ]
+            # likes that already exist are skipped by the unique constraint instead of being looked up first
+            like_model.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+            # ids are generated here, so only the rows that were really inserted carry one of them
+            for target in like_model.objects.filter(pk__in=[row.pk for row in rows]).values_list(f'{field}_id', flat=True):
+                deltas[str(target)] += 1
+        if unlikes:
+            # locked, so a concurrent unlike of the same rows waits and then finds nothing to uncount
+            candidates = like_model.objects.select_for_update().filter(
+                author_id__in={author for author, target in unlikes},
+                **{f'{field}_id__in': {target for author, target in unlikes}},
+            ).values_list('pk', 'author_id', f'{field}_id')
+            rows = [(pk, str(target)) for pk, author, target in candidates if (str(author), str(target)) in unlikes]
+            if rows:
+                # sends post_delete per like, whose receivers bump the post's cache
+                # version (and for a comment like read its comment first); the same
+                # bump for the inserted likes, which send no signals, is invalidate_liked()
+                like_model.objects.filter(pk__in=[pk for pk, target in rows]).delete()
+                for pk, target in rows:
+                    deltas[target] -= 1
+        by_delta = {}
+        for target, delta in deltas.items():
+            by_delta.setdefault(delta, []).append(target)
+        for delta, targets in by_delta.items():
+            if kind == 'posts':
+                shift_post_counters(targets, 'like_count', delta)
+            else:
+                shift_counter(model.objects.filter(pk__in=targets), 'like_count', delta)
+    changed = [target for target, delta in deltas.items() if delta]
+    if changed:
+        invalidate_liked(kind, changed)
+    return deltas
+
+
+def like_many(kind, user, ids):
+    """Like every existing id of `kind` that `user` has not liked yet and return the ids liked now."""
+    return list(apply_likes(kind, {(str(user.pk), str(pk)): True for pk in ids}))
+
+
+def unlike_many(kind, user, ids):
+    """Remove the likes of `user` on `ids` of `kind` and return the ids that were unliked."""
+    return list(apply_likes(kind, {(str(user.pk), str(pk)): False for pk in ids}))
@@ -0,0 +1,93 @@
+import math
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import OuterRef
+
+from post.models import Post, PostComment, PostLike, count_subquery
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure a feed page read with the denormalized like/comment counters "
+        "against counting PostLike and PostComment rows per post"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, default=1000000)
+        parser.add_argument('--posts', type=int, default=1000, help="The likes are spread evenly over these posts")
+        parser.add_argument('--comments', type=int, default=10, help="Comments per post")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--rounds', type=int, default=50)
+
+    def handle(self, *args, **options):
+        marker = uuid.uuid4().hex[:8]
+        # one like per (user, post), so likes / posts users are enough
+        users = User.objects.bulk_create([
+            User(username=f'bench-{marker}-{number}', email=f'bench-{marker}-{number}@example.com')
+            for number in range(math.ceil(options['likes'] / options['posts']))
+        ], batch_size=1000)
+        user_ids = [user.pk for user in users]
+        posts = Post.objects.bulk_create([
+            Post(author=users[number % len(users)], caption='counter benchmark', media='posts/benchmark.jpg')
+            for number in range(options['posts'])
+        ], batch_size=1000)
+        post_ids = [post.pk for post in posts]
+        try:
+            self.populate(users, posts, options['likes'], options['comments'])
+            feed = Post.objects.filter(pk__in=post_ids).order_by('-created_at')
+            with_counters = feed.with_stats(users[0])
+            counted = with_counters.annotate(
+                counted_like_count=count_subquery(PostLike.objects.filter(post=OuterRef('pk')), 'post'),
+                counted_comment_count=count_subquery(PostComment.objects.filter(post=OuterRef('pk')), 'post'),
+            )
+            for name, queryset in (('counter columns', with_counters), ('counted per post', counted)):
+                elapsed = self.measure(queryset, options['page_size'], options['rounds'])
+                self.stdout.write(f"{name}: {elapsed * 1000:.2f}ms per page of {options['page_size']}")
+        finally:
+            self.cleanup(post_ids, user_ids)
+
+    def populate(self, users, posts, likes, comments):
+        started = time.perf_counter()
+        batch = []
+        for number in range(likes):
+            post = posts[number % len(posts)]
+            batch.append(PostLike(author=users[number // len(posts)], post=post))
+            if len(batch) == 10000:
+                PostLike.objects.bulk_create(batch)
+                batch = []
+        PostLike.objects.bulk_create(batch)
+        PostComment.objects.bulk_create([
+            PostComment(author=users[number % len(users)], post=post, comment='counter benchmark')
+            for post in posts for number in range(comments)
+        ], batch_size=10000)
+        # the columns as the views would have kept them
+        per_post = likes // len(posts)
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(like_count=per_post, comment_count=comments)
+        self.stdout.write(f"{likes} likes and {comments * len(posts)} comments written in {time.perf_counter() - started:.1f}s")
+
+    @staticmethod
+    def measure(queryset, page_size, rounds):
+        list(queryset[:page_size])
+        started = time.perf_counter()
+        for number in range(rounds):
+            list(queryset[:page_size])
+        return (time.perf_counter() - started) / rounds
+
+    @staticmethod
+    def cleanup(post_ids, user_ids):
+        # a million likes through Model.delete() would send a million post_delete signals
+        with connection.cursor() as cursor:
+            for model in (PostLike, PostComment):
+                table = connection.ops.quote_name(model._meta.db_table)
+                for start in range(0, len(post_ids), 500):
+                    chunk = post_ids[start:start + 500]
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE post_id IN ({', '.join(['%s'] * len(chunk))})",
+                        [Post._meta.pk.get_db_prep_value(pk, connection) for pk in chunk],
+                    )
+        Post.objects.filter(pk__in=post_ids).delete()
+        User.objects.filter(pk__in=user_ids).delete()
@@ -0,0 +1,93 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from base_app.jobs import enqueue
+from base_app.models import Job
+from post.models import Post, TimelineEntry
+from post.tasks import fan_out
+from post.timeline import fan_out_post, get_timeline_store
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure creating a post with the fan-out in the request against queueing it, "
+        "and the fan-out job itself, for an author with many followers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=5000)
+        parser.add_argument('--posts', type=int, default=5, help="Posts created per measurement")
+        parser.add_argument('--prefill', type=int, default=0,
+                            help="Older entries written to every timeline first; at MAX_ENTRIES each fan-out also trims")
+
+    def handle(self, *args, **options):
+        count, posts = options['followers'], options['posts']
+        marker = uuid.uuid4().hex[:8]
+        author = User.objects.create(username=f'bench-{marker}', email=f'bench-{marker}@example.com')
+        followers = User.objects.bulk_create([
+            User(username=f'bench-{marker}-{number}', email=f'bench-{marker}-{number}@example.com')
+            for number in range(count)
+        ], batch_size=1000)
+        follower_ids = [user.pk for user in followers]
+        Follow.objects.bulk_create([Follow(follower=user, following=author) for user in followers], batch_size=1000)
+        try:
+            if options['prefill']:
+                self.prefill(author, follower_ids, options['prefill'])
+
+            started = time.perf_counter()
+            for number in range(posts):
+                with transaction.atomic():
+                    post = Post.objects.create(author=author, caption='fan-out benchmark', media='posts/benchmark.jpg')
+                fan_out_post(post)
+            self.report_request('fan-out in the request', started, posts)
+
+            started = time.perf_counter()
+            jobs = []
+            for number in range(posts):
+                with transaction.atomic():
+                    post = Post.objects.create(author=author, caption='fan-out benchmark', media='posts/benchmark.jpg')
+                    jobs.append(enqueue('timeline.fan_out', {'post': str(post.pk)}))
+            self.report_request('fan-out queued', started, posts)
+
+            started = time.perf_counter()
+            for job in jobs:
+                fan_out(job.payload)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"fan-out job: {elapsed / posts * 1000:.1f}ms per post, "
+                f"{count * posts / elapsed:.0f} timeline entries/s "
+                f"(store {type(get_timeline_store()).__name__}, "
+                f"largest TimelineEntry timeline {self.largest_timeline(follower_ids)})"
+            )
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+        finally:
+            Post.objects.filter(author=author).delete()
+            User.objects.filter(pk__in=follower_ids + [author.pk]).delete()
+
+    def prefill(self, author, follower_ids, entries):
+        # older than anything the benchmark posts, so they are the ones trimmed
+        posted_at = timezone.now() - timedelta(days=30)
+        fillers = Post.objects.bulk_create([
+            Post(author=author, caption='fan-out benchmark filler', media='posts/benchmark.jpg')
+            for number in range(entries)
+        ], batch_size=1000)
+        for owner_id in follower_ids:
+            TimelineEntry.objects.bulk_create([
+                TimelineEntry(owner_id=owner_id, post=post, posted_at=posted_at - timedelta(seconds=number))
+                for number, post in enumerate(fillers)
+            ], batch_size=1000)
+
+    def report_request(self, name, started, posts):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{name}: {elapsed / posts * 1000:.1f}ms per created post")
+
+    @staticmethod
+    def largest_timeline(owner_ids):
+        sizes = [TimelineEntry.objects.filter(owner_id=owner_id).count() for owner_id in owner_ids[:100]]
+        return max(sizes, default=0)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from post.like_buffer import replay, write_behind_setting
+
+
+class Command(BaseCommand):
+    help = "Apply like journal segments left behind by processes that stopped before flushing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--directory', default=None, help="Journal directory, LIKE_WRITE_BEHIND['JOURNAL_DIR'] by default")
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or write_behind_setting('JOURNAL_DIR')
+        replayed = replay(directory)
+        self.stdout.write(f"{replayed} journal segments replayed from {directory}")
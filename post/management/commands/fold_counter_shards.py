@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from post.counters import cooled_posts, demote
+from post.models import PostCounterShard
+
+
+class Command(BaseCommand):
+    help = "Fold the counter shards of posts whose write rate cooled down back into the posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Fold every sharded post, hot or not")
+
+    def handle(self, *args, **options):
+        if options['all']:
+            post_ids = list(PostCounterShard.objects.values_list('post_id', flat=True).distinct())
+        else:
+            post_ids = cooled_posts()
+        folded = sum(demote(post_id) for post_id in post_ids)
+        self.stdout.write(f"{folded} posts folded back from counter shards")
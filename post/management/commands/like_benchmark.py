@@ -0,0 +1,89 @@
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.test.utils import override_settings
+
+from post.counters import add_post_likes
+from post.like_buffer import LikeBuffer
+from post.models import Post, PostLike
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sustained likes/s on one hot post: a transaction per like, "
+        "as PostLikeCreateAPIView does, against the write-behind buffer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, default=5000, help="Likes, each by a different user")
+        parser.add_argument('--threads', type=int, default=1, help="Concurrent clients; use more than 1 on PostgreSQL only")
+        parser.add_argument('--flush-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = options['likes']
+        marker = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create([
+            User(username=f'bench-{marker}-{number}', email=f'bench-{marker}-{number}@example.com')
+            for number in range(count)
+        ], batch_size=1000)
+        author_ids = [user.pk for user in users]
+        post = Post.objects.create(author=users[0], caption='like benchmark', media='posts/benchmark.jpg')
+        try:
+            elapsed = self.run_clients(options['threads'], lambda author_id: self.like(post.pk, author_id), author_ids)
+            self.report('transaction per like', post, count, elapsed)
+
+            PostLike.objects.filter(post=post).delete()
+            Post.objects.filter(pk=post.pk).update(like_count=0)
+
+            with tempfile.TemporaryDirectory() as directory, override_settings(LIKE_WRITE_BEHIND={
+                'ENABLED': True, 'JOURNAL_DIR': directory, 'FLUSH_SIZE': options['flush_size'],
+            }):
+                buffer = LikeBuffer()
+                buffer.start()
+                elapsed = self.run_clients(
+                    options['threads'], lambda author_id: buffer.add('posts', author_id, post.pk, True), author_ids
+                )
+                self.stdout.write(f"write-behind: {count / elapsed:.0f} likes/s accepted")
+                started = time.perf_counter()
+                buffer.flush()
+                self.report('write-behind', post, count, elapsed + time.perf_counter() - started)
+        finally:
+            post.delete()
+            User.objects.filter(pk__in=author_ids).delete()
+
+    def like(self, post_id, author_id):
+        post = Post.objects.get(id=post_id)
+        if not PostLike.objects.filter(author_id=author_id, post=post).exists():
+            with transaction.atomic():
+                PostLike.objects.create(author_id=author_id, post=post)
+                add_post_likes(post.pk)
+
+    @staticmethod
+    def run_clients(threads, like, author_ids):
+        def client(chunk):
+            try:
+                for author_id in chunk:
+                    like(author_id)
+            finally:
+                close_old_connections()
+
+        started = time.perf_counter()
+        if threads == 1:
+            for author_id in author_ids:
+                like(author_id)
+        else:
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(client, [author_ids[number::threads] for number in range(threads)]))
+        return time.perf_counter() - started
+
+    def report(self, name, post, count, elapsed):
+        post.refresh_from_db(fields=['like_count'])
+        self.stdout.write(
+            f"{name}: {count} likes in {elapsed:.2f}s, {count / elapsed:.0f} likes/s "
+            f"(like_count {post.like_count}, {PostLike.objects.filter(post=post).count()} rows)"
+        )
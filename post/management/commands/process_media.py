@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from post.media import media_setting, process
+from post.models import Post, MEDIA_PENDING, MEDIA_PROCESSING, MEDIA_FAILED
+
+
+class Command(BaseCommand):
+    help = "Process post media left pending (e.g. by a restarted worker), optionally retrying failed posts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            Post.objects.filter(media_status=MEDIA_FAILED).update(media_status=MEDIA_PENDING)
+        stale = timezone.now() - timedelta(seconds=media_setting('STALE_AFTER'))
+        waiting = Q(media_status=MEDIA_PENDING) | Q(media_status=MEDIA_PROCESSING, updated_at__lt=stale)
+
+        processed = 0
+        while True:
+            # process() moves every post it claims out of the waiting states,
+            # so the next batch never sees the same posts again
+            pks = list(Post.objects.filter(waiting).order_by('updated_at').values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            for pk in pks:
+                process(pk)
+                processed += 1
+        self.stdout.write(f"{processed} posts processed")
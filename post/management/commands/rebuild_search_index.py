@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from post.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the post/user search index of the configured search backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        indexed = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f"{type(backend).__name__}: {indexed or 0} posts indexed")
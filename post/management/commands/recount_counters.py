@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Q
+from django.db.models.functions import Greatest
+
+from post.models import Post, PostComment, PostLike, CommentLike, count_subquery, shard_sum
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment counters in batches to repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # the shards of hot posts hold the rest of their counts
+        repaired = self.recount(Post, {
+            'like_count': Greatest(
+                count_subquery(PostLike.objects.filter(post=OuterRef('pk')), 'post') - shard_sum('like_count'), 0
+            ),
+            'comment_count': Greatest(
+                count_subquery(PostComment.objects.filter(post=OuterRef('pk')), 'post') - shard_sum('comment_count'), 0
+            ),
+        }, batch_size)
+        self.stdout.write(f"Post: {repaired} rows repaired")
+        repaired = self.recount(PostComment, {
+            'like_count': count_subquery(CommentLike.objects.filter(comment=OuterRef('pk')), 'comment'),
+        }, batch_size)
+        self.stdout.write(f"PostComment: {repaired} rows repaired")
+
+    @staticmethod
+    def recount(model, counters, batch_size):
+        """
+        Walk the table in primary key order and rewrite only the rows whose
+        stored counters differ from the real counts.
+        """
+        actual = {f'actual_{field}': expression for field, expression in counters.items()}
+        drift = Q()
+        for field in counters:
+            drift |= ~Q(**{field: F(f'actual_{field}')})
+
+        repaired, last_pk = 0, None
+        while True:
+            queryset = model.objects.order_by('pk')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return repaired
+            last_pk = pks[-1]
+            with transaction.atomic():
+                drifted = list(
+                    model.objects.filter(pk__in=pks).annotate(**actual).filter(drift).values_list('pk', flat=True)
+                )
+                if drifted:
+                    repaired += model.objects.filter(pk__in=drifted).update(**counters)
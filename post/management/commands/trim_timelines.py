@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from post.models import TimelineEntry
+from post.timeline import DatabaseTimelineStore, get_timeline_store
+
+
+class Command(BaseCommand):
+    help = "Remove home-timeline entries above the per-user cap"
+
+    def handle(self, *args, **options):
+        store = get_timeline_store()
+        if not isinstance(store, DatabaseTimelineStore):
+            self.stdout.write("The configured timeline store caps itself, nothing to do")
+            return
+        owners = TimelineEntry.objects.values('owner_id').annotate(entries=Count('pk')).filter(
+            entries__gt=store.max_entries
+        ).values_list('owner_id', flat=True)
+        removed = 0
+        for owner_id in owners.iterator():
+            removed += store.trim(owner_id)
+        self.stdout.write(f"{removed} timeline entries removed")
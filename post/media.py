@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import blurhash
+from .models import Post, PostMedia, MEDIA_PENDING, MEDIA_PROCESSING, MEDIA_READY, MEDIA_FAILED
+
+try:
+    # HEIC uploads can only be decoded when pillow-heif is installed
+    from pillow_heif import register_heif_opener
+except ImportError:
+    pass
+else:
+    register_heif_opener()
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'EAGER': False,
+    'WORKERS': 2,
+    # kind -> (width, height); a height of None keeps the aspect ratio,
+    # an explicit height crops to that box
+    'RENDITIONS': {
+        'thumbnail': (150, 150),
+        'small': (320, None),
+        'medium': (640, None),
+        'large': (1080, None),
+    },
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'STALE_AFTER': 600,
+}
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.heic'}
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def media_setting(name):
+    return getattr(settings, 'MEDIA_PROCESSING', {}).get(name, DEFAULTS[name])
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=media_setting('WORKERS'), thread_name_prefix='post-media')
+    return _executor
+
+
+def schedule(post):
+    """
+    Queue `post` for processing once the current transaction commits.
+    Queued posts are recorded by their `pending` status, so work lost with a
+    restarted process is picked up again by `manage.py process_media`.
+    """
+    # robust: the post is already saved, a failure here only delays its media
+    if media_setting('EAGER'):
+        transaction.on_commit(lambda: process(post.pk), robust=True)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run_in_worker, post.pk), robust=True)
+
+
+def reschedule(post):
+    """Reprocess a post whose media file was replaced."""
+    post.renditions.all().delete()
+    post.media_status = MEDIA_PENDING
+    post.save(update_fields=['media_status', 'updated_at'])
+    schedule(post)
+
+
+def run_in_worker(post_id):
+    try:
+        process(post_id)
+    except Exception:
+        # nobody waits on the future, so this is the only place errors show up
+        logger.exception("Media worker failed for post %s", post_id)
+    finally:
+        close_old_connections()
+
+
+def claim(post_id):
+    """Move a pending (or stale in-progress) post to `processing`; False if another worker has it."""
+    stale = timezone.now() - timedelta(seconds=media_setting('STALE_AFTER'))
+    claimable = Post.objects.filter(
+        Q(media_status=MEDIA_PENDING) | Q(media_status=MEDIA_PROCESSING, updated_at__lt=stale),
+        pk=post_id,
+    )
+    return claimable.update(media_status=MEDIA_PROCESSING, updated_at=timezone.now()) == 1
+
+
+def process(post_id):
+    if not claim(post_id):
+        return
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return
+    try:
+        if os.path.splitext(post.media.name)[1].lower() in IMAGE_EXTENSIONS:
+            process_image(post)
+        # videos are served as uploaded until a transcoder is plugged in here
+        post.media_status = MEDIA_READY
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.exception("Could not process media of post %s", post_id)
+        post.media_status = MEDIA_FAILED
+    post.save(update_fields=['media_status', 'media_width', 'media_height', 'media_blurhash', 'media', 'updated_at'])
+
+
+def process_image(post):
+    with post.media.open('rb') as file:
+        original = Image.open(file)
+        # animated GIFs are rendered from their first frame
+        original.seek(0)
+        transposed = ImageOps.exif_transpose(original)
+        image = transposed.convert('RGB')
+        # the original stays downloadable, so location and camera data are
+        # removed from it too; animated GIFs and HEIC are left untouched
+        stripped = None
+        if original.format in ('JPEG', 'PNG') and (original.getexif() or 'exif' in original.info):
+            stripped = encode(transposed, original.format, quality=95)
+
+    if stripped is not None:
+        replace_original(post, stripped)
+    post.media_width, post.media_height = image.size
+    post.media_blurhash = blurhash.encode(image)
+
+    done = set()
+    for kind, (width, height) in media_setting('RENDITIONS').items():
+        width = min(width, image.width)
+        if height is None:
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+        else:
+            resized = ImageOps.fit(image, (width, min(height, image.height)), Image.Resampling.LANCZOS)
+        if resized.size in done:
+            continue
+        done.add(resized.size)
+        for format in media_setting('FORMATS'):
+            save_rendition(post, kind, format, resized)
+
+
+def encode(image, format, **options):
+    buffer = BytesIO()
+    # nothing from the source image (EXIF, XMP, ICC text chunks) is passed on
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def replace_original(post, content):
+    storage, name = post.media.storage, post.media.name
+    storage.delete(name)
+    post.media.name = storage.save(name, ContentFile(content))
+
+
+def save_rendition(post, kind, format, image):
+    content = encode(image, PIL_FORMATS[format], quality=media_setting('QUALITY'))
+    # a rendition left over from an interrupted run is replaced
+    PostMedia.objects.filter(post=post, kind=kind, format=format).delete()
+    rendition = PostMedia(post=post, kind=kind, format=format, width=image.width, height=image.height)
+    rendition.file.save(f"{post.pk}_{kind}.{format}", ContentFile(content))
+    return rendition
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0002_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['post', 'parent', 'created_at', 'id'], name='comment_post_parent_crt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postcomment',
+            index=models.Index(fields=['parent', 'created_at', 'id'], name='comment_parent_created_idx'),
+        ),
+    ]
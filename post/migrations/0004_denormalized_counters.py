@@ -0,0 +1,50 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:06
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    counts = queryset.order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('post', 'Post')
+    PostComment = apps.get_model('post', 'PostComment')
+    PostLike = apps.get_model('post', 'PostLike')
+    CommentLike = apps.get_model('post', 'CommentLike')
+    Post.objects.update(
+        like_count=count_of(PostLike.objects.filter(post=OuterRef('pk')), 'post'),
+        comment_count=count_of(PostComment.objects.filter(post=OuterRef('pk')), 'post'),
+    )
+    PostComment.objects.update(
+        like_count=count_of(CommentLike.objects.filter(comment=OuterRef('pk')), 'comment'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0003_comment_tree_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='postcomment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
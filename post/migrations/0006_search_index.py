@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:12
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+TRIGRAM_COLUMNS = ['username', 'first_name', 'last_name']
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    GIN indexes only exist on PostgreSQL; on other databases search falls
+    back to the in-process index in post.search.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    user_table = apps.get_model('users', 'User')._meta.db_table
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS post_search_vector_gin ON post_post USING gin (search_vector)"
+    )
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS user_{column}_trgm ON {user_table} USING gin ({column} gin_trgm_ops)"
+        )
+    schema_editor.execute("UPDATE post_post SET search_vector = to_tsvector('simple', caption)")
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS post_search_vector_gin")
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS user_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0005_timeline_entry'),
+        ('users', '0004_follow_graph'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
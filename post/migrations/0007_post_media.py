@@ -0,0 +1,66 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:23
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0006_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostMedia',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('kind', models.CharField(max_length=16)),
+                ('format', models.CharField(max_length=8)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('file', models.FileField(upload_to='posts/renditions/')),
+            ],
+            options={
+                'ordering': ['width', 'format'],
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='media_blurhash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='media_height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='media_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('ready', 'ready'), ('failed', 'failed')], default='pending', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='media_width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['media_status', 'updated_at'], name='post_media_status_idx'),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='post.post'),
+        ),
+        migrations.AddConstraint(
+            model_name='postmedia',
+            constraint=models.UniqueConstraint(fields=('post', 'kind', 'format'), name='post_media_rendition'),
+        ),
+    ]
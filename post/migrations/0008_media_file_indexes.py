@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:28
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0007_post_media'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='media',
+            field=models.FileField(db_index=True, upload_to='posts/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov', 'mkv', 'heic'])]),
+        ),
+        migrations.AlterField(
+            model_name='postmedia',
+            name='file',
+            field=models.FileField(db_index=True, upload_to='posts/renditions/'),
+        ),
+    ]
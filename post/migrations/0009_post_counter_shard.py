@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:49
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_media_file_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCounterShard',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('like_count', models.IntegerField(default=0)),
+                ('comment_count', models.IntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='post.post')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('post', 'shard'), name='post_counter_shard')],
+            },
+        ),
+    ]
@@ -1,22 +1,170 @@
 from django.db import models 
-from django.db.models import UniqueConstraint
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import UniqueConstraint, Count, Exists, Max, OuterRef, Subquery, Sum, IntegerField
+from django.db.models.functions import Coalesce
 from django.core.validators import FileExtensionValidator, MaxLengthValidator
 from users.models import User
-from base_app.models import BaseModel
+from base_app.models import BaseModel, CounterFieldsMixin
 
 
 
-class Post(BaseModel):
+def count_subquery(queryset, field):
+    """
+    Correlated COUNT(*) grouped by `field`. Used instead of Count() over a join,
+    so that counting likes and comments in the same query does not multiply rows.
+    """
+    counts = queryset.order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def shard_subquery(aggregate):
+    """Correlated aggregate over the PostCounterShard rows of each post, e.g. Sum('like_count')."""
+    shards = PostCounterShard.objects.filter(post=OuterRef('pk')).order_by().values('post')
+    return Subquery(shards.annotate(total=aggregate).values('total'))
+
+
+def shard_sum(field):
+    return Coalesce(shard_subquery(Sum(field)), 0, output_field=IntegerField())
+
+
+class PostQuerySet(models.QuerySet):
+    def with_stats(self, user=None):
+        """
+        Everything PostSerializer needs in a single query:
+        author and whether `user` liked the post. Like and comment counts
+        are read from the denormalized counter columns, plus the counter
+        shards of hot posts (see post.counters). Media renditions are
+        prefetched with one more query per page.
+        """
+        queryset = self.select_related('author').prefetch_related('renditions').annotate(
+            shard_like_count=shard_sum('like_count'),
+            shard_comment_count=shard_sum('comment_count'),
+            shards_updated_at=shard_subquery(Max('updated_at')),
+        )
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(
+                user_liked=Exists(PostLike.objects.filter(post=OuterRef('pk'), author=user))
+            )
+        return queryset
+
+
+class PostCommentQuerySet(models.QuerySet):
+    def with_stats(self, user=None):
+        """
+        Same as PostQuerySet.with_stats() for comments: author, reply count
+        and whether `user` liked the comment, in a single query.
+        """
+        queryset = self.select_related('author').annotate(
+            replies_count=count_subquery(PostComment.objects.filter(parent=OuterRef('pk')), 'parent'),
+        )
+        if user is not None and user.is_authenticated:
+            queryset = queryset.annotate(
+                user_liked=Exists(CommentLike.objects.filter(comment=OuterRef('pk'), author=user))
+            )
+        return queryset
+
+
+MEDIA_PENDING, MEDIA_PROCESSING, MEDIA_READY, MEDIA_FAILED = (
+    'pending', 'processing', 'ready', 'failed'
+)
+
+
+class Post(CounterFieldsMixin, BaseModel):
+    MEDIA_STATUSES = (
+        (MEDIA_PENDING, MEDIA_PENDING),
+        (MEDIA_PROCESSING, MEDIA_PROCESSING),
+        (MEDIA_READY, MEDIA_READY),
+        (MEDIA_FAILED, MEDIA_FAILED),
+    )
+
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
-    media = models.FileField(upload_to=f'posts/', 
+    # indexed for the blob reference checks of base_app.storage
+    media = models.FileField(upload_to=f'posts/', db_index=True,
                              validators=[FileExtensionValidator(
                                  allowed_extensions=['png', 'jpg', 'jpeg', 'gif', 'mp4', 'avi', 'mov', 'mkv','heic'])])
     caption = models.TextField(MaxLengthValidator(2000))
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Filled in by post.media once the upload has been processed
+    media_status = models.CharField(max_length=16, choices=MEDIA_STATUSES, default=MEDIA_PENDING)
+    media_width = models.PositiveIntegerField(null=True, blank=True)
+    media_height = models.PositiveIntegerField(null=True, blank=True)
+    media_blurhash = models.CharField(max_length=64, blank=True, default='')
+    # Maintained by post.search; its GIN index is created by migration 0006 on PostgreSQL only
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    objects = PostQuerySet.as_manager()
+    counter_fields = ('like_count', 'comment_count')
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='post_created_id_idx'),
+            models.Index(fields=['media_status', 'updated_at'], name='post_media_status_idx'),
+        ]
     
     def __str__(self) -> str:
         return f"{self.author} about: {self.caption}"
+    
+    @property
+    def total_like_count(self):
+        """like_count plus the counter shards, when loaded through with_stats()."""
+        return self.like_count + getattr(self, 'shard_like_count', 0)
+    
+    @property
+    def total_comment_count(self):
+        return self.comment_count + getattr(self, 'shard_comment_count', 0)
+
 
-class PostComment(BaseModel):
+class PostCounterShard(BaseModel):
+    """
+    A slice of the like and comment counters of a hot post, so concurrent
+    writes spread over several rows instead of queueing on the Post row.
+    The count of a post is its own column plus the sum of its shards;
+    shards hold deltas and may be negative. Created and folded back into
+    the post by post.counters.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    like_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['post','shard'],
+                name='post_counter_shard'
+            )
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.post_id} #{self.shard}"
+
+
+class PostMedia(BaseModel):
+    """
+    A resized, re-encoded copy of Post.media. Renditions carry no EXIF
+    metadata and are produced by post.media after the upload.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='renditions')
+    kind = models.CharField(max_length=16)
+    format = models.CharField(max_length=8)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(upload_to='posts/renditions/', db_index=True)
+    
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['post','kind','format'],
+                name='post_media_rendition'
+            )
+        ]
+        ordering = ['width', 'format']
+    
+    def __str__(self) -> str:
+        return f"{self.post_id} {self.kind} {self.format}"
+
+class PostComment(CounterFieldsMixin, BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     comment = models.TextField(MaxLengthValidator(2000))
@@ -27,6 +175,7 @@ class PostComment(BaseModel):
         null=True,
         blank=True                               
                                )
+    like_count = models.PositiveIntegerField(default=0)
     """
     'parent' field is used for reply to comment.
     It works like this: 
@@ -43,6 +192,15 @@ class PostComment(BaseModel):
                         parent = 1 #The replied comment ID
     """
     
+    objects = PostCommentQuerySet.as_manager()
+    counter_fields = ('like_count',)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'parent', 'created_at', 'id'], name='comment_post_parent_crt_idx'),
+            models.Index(fields=['parent', 'created_at', 'id'], name='comment_parent_created_idx'),
+        ]
+    
     def __str__(self) -> str:
         return f"{self.author} commented {self.comment}"
 
@@ -57,6 +215,9 @@ class PostLike(BaseModel):
                 name='post_like'
             )
         ]
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='postlike_post_created_idx'),
+        ]
     
     def __str__(self) -> str:
         return f"{self.author}"    
@@ -73,6 +234,33 @@ class CommentLike(BaseModel):
                 name='comment_like'
             )
         ]
+        indexes = [
+            models.Index(fields=['comment', 'created_at', 'id'], name='commentlike_comment_crt_idx'),
+        ]
     
     def __str__(self) -> str:
-        return f"{self.author}"    
+        return f"{self.author}"
+
+
+class TimelineEntry(BaseModel):
+    """
+    One row per (follower, post) written when the post is fanned out.
+    Used by post.timeline.DatabaseTimelineStore.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    posted_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['owner','post'],
+                name='timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-posted_at'], name='timeline_owner_posted_idx'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.owner}: {self.post_id}"
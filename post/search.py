@@ -0,0 +1,244 @@
+import bisect
+import re
+import threading
+from abc import ABCMeta, abstractmethod
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, When
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+from users.models import User, DONE, PHOTO_DONE
+from .models import Post
+
+
+SEARCHABLE_STATUSES = [DONE, PHOTO_DONE]
+token_regex = re.compile(r'\w+')
+
+
+def search_setting(name, default=None):
+    return getattr(settings, 'SEARCH', {}).get(name, default)
+
+
+def tokenize(text):
+    return token_regex.findall((text or '').lower())
+
+
+def searchable_users():
+    return User.objects.filter(auth_status__in=SEARCHABLE_STATUSES)
+
+
+class BaseSearchBackend(metaclass=ABCMeta):
+    """
+    search_users()/search_posts() return querysets ordered by relevance,
+    so callers can slice them for pagination.
+    """
+    @abstractmethod
+    def search_users(self, query):
+        """Searchable users matching `query`, most relevant first."""
+
+    @abstractmethod
+    def search_posts(self, query):
+        """Posts whose caption matches `query`, most relevant first."""
+
+    def update_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def update_user(self, user):
+        pass
+
+    def remove_user(self, user_id):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        pass
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Captions are matched against Post.search_vector (GIN indexed) and ranked
+    with ts_rank. Users are matched with pg_trgm similarity, which also
+    tolerates typos, on trigram GIN indexes over the name columns.
+    """
+    def __init__(self):
+        self.config = search_setting('CONFIG', 'simple')
+
+    def search_users(self, query):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return searchable_users().filter(
+            Q(username__trigram_similar=query) |
+            Q(first_name__trigram_similar=query) |
+            Q(last_name__trigram_similar=query) |
+            Q(username__icontains=query)
+        ).annotate(
+            relevance=Greatest(
+                TrigramSimilarity('username', query),
+                TrigramSimilarity('first_name', query),
+                TrigramSimilarity('last_name', query),
+            )
+        ).order_by('-relevance', 'username')
+
+    def search_posts(self, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(query, config=self.config, search_type='websearch')
+        return Post.objects.filter(search_vector=search_query).annotate(
+            relevance=SearchRank(F('search_vector'), search_query)
+        ).order_by('-relevance', '-created_at')
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector('caption', config=self.config)
+
+    def update_post(self, post):
+        Post.objects.filter(pk=post.pk).update(search_vector=self.vector())
+
+    def rebuild(self, batch_size=1000):
+        last_pk, updated = None, 0
+        while True:
+            queryset = Post.objects.order_by('pk')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return updated
+            updated += Post.objects.filter(pk__in=pks).update(search_vector=self.vector())
+            last_pk = pks[-1]
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    Portable in-process inverted index for SQLite and tests. Every query
+    token matches indexed terms by prefix, and documents are ranked by the
+    number of query tokens they match.
+    The terms of each kind are also kept sorted, so the terms with a prefix
+    are one bisect range instead of a scan of the vocabulary.
+    The index lives in process memory, so each worker keeps its own copy.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ready = False
+        self.indexes = {'users': defaultdict(set), 'posts': defaultdict(set)}
+        self.documents = {'users': {}, 'posts': {}}
+        self.terms = {'users': [], 'posts': []}
+
+    def _add(self, kind, pk, text):
+        self._remove(kind, pk)
+        terms = set(tokenize(text))
+        self.documents[kind][pk] = terms
+        index, sorted_terms = self.indexes[kind], self.terms[kind]
+        for term in terms:
+            # None while rebuild() fills the index, it sorts the terms once at the end
+            if sorted_terms is not None and term not in index:
+                bisect.insort(sorted_terms, term)
+            index[term].add(pk)
+
+    def _remove(self, kind, pk):
+        for term in self.documents[kind].pop(pk, ()):
+            ids = self.indexes[kind][term]
+            ids.discard(pk)
+            if not ids:
+                del self.indexes[kind][term]
+                sorted_terms = self.terms[kind]
+                if sorted_terms is not None:
+                    del sorted_terms[bisect.bisect_left(sorted_terms, term)]
+
+    def prefix_range(self, kind, prefix):
+        """The sorted terms of `kind` that start with `prefix`."""
+        terms = self.terms[kind]
+        start = bisect.bisect_left(terms, prefix)
+        end = bisect.bisect_left(terms, prefix + '\U0010ffff', start)
+        return terms[start:end]
+
+    @staticmethod
+    def user_text(user):
+        return f"{user.username} {user.first_name} {user.last_name}"
+
+    def rebuild(self, batch_size=1000):
+        with self.lock:
+            self.indexes = {'users': defaultdict(set), 'posts': defaultdict(set)}
+            self.documents = {'users': {}, 'posts': {}}
+            self.terms = {'users': None, 'posts': None}
+            for user in searchable_users().only('id', 'username', 'first_name', 'last_name').iterator(chunk_size=batch_size):
+                self._add('users', str(user.pk), self.user_text(user))
+            for post in Post.objects.only('id', 'caption').iterator(chunk_size=batch_size):
+                self._add('posts', str(post.pk), post.caption)
+            self.terms = {kind: sorted(index) for kind, index in self.indexes.items()}
+            self.ready = True
+            return len(self.documents['posts'])
+
+    def ensure_ready(self):
+        if not self.ready:
+            with self.lock:
+                if not self.ready:
+                    self.rebuild()
+
+    def update_post(self, post):
+        if self.ready:
+            with self.lock:
+                self._add('posts', str(post.pk), post.caption)
+
+    def remove_post(self, post_id):
+        if self.ready:
+            with self.lock:
+                self._remove('posts', str(post_id))
+
+    def update_user(self, user):
+        if self.ready:
+            with self.lock:
+                if user.auth_status in SEARCHABLE_STATUSES:
+                    self._add('users', str(user.pk), self.user_text(user))
+                else:
+                    self._remove('users', str(user.pk))
+
+    def remove_user(self, user_id):
+        if self.ready:
+            with self.lock:
+                self._remove('users', str(user_id))
+
+    def ranked_ids(self, kind, query):
+        self.ensure_ready()
+        # the lock is held only to copy the matching ids, writers do not wait on the scoring
+        with self.lock:
+            index = self.indexes[kind]
+            matches = [
+                set().union(*(index[term] for term in self.prefix_range(kind, token)))
+                for token in set(tokenize(query))
+            ]
+        scores = defaultdict(int)
+        for matched in matches:
+            for pk in matched:
+                scores[pk] += 1
+        ranked = sorted(scores, key=lambda pk: (-scores[pk], pk))
+        return ranked[:search_setting('MAX_RESULTS', 1000)]
+
+    @staticmethod
+    def in_order(queryset, ids):
+        if not ids:
+            return queryset.none()
+        ordering = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)], output_field=IntegerField())
+        return queryset.filter(pk__in=ids).annotate(relevance=ordering).order_by('relevance')
+
+    def search_users(self, query):
+        return self.in_order(searchable_users(), self.ranked_ids('users', query))
+
+    def search_posts(self, query):
+        return self.in_order(Post.objects.all(), self.ranked_ids('posts', query))
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    backend = search_setting('BACKEND')
+    if backend:
+        return import_string(backend)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return InvertedIndexSearchBackend()
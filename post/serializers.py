@@ -1,6 +1,12 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from base_app import uploads
 from users.models import User
-from .models import Post, PostComment, CommentLike, PostLike
+from .models import Post, PostComment, CommentLike, PostLike, PostMedia
+from .likes import MAX_BATCH_SIZE
+from .fragments import fragments_setting, get_fragments
 
 
 class UserSearchSerializer(serializers.ModelSerializer):
@@ -25,60 +31,162 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id','username','photo']
 
 
+class PostMediaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PostMedia
+        fields = ['kind','format','width','height','file']
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Renders a page of posts in two layers: the part that is the same for
+    every viewer comes from the fragment cache (post.fragments), and the
+    viewer's fields are laid over it, from the `user_liked` annotation of
+    with_stats() or one query for the whole page.
+    """
+    def to_representation(self, data):
+        request = self.context.get('request')
+        if request is None or not fragments_setting('ENABLED'):
+            return super().to_representation(data)
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        fragments = get_fragments(posts, request.build_absolute_uri('/'), self.child.shared_representation)
+        liked = self.child.get_page_liked(posts)
+        return [
+            {**fragment, 'request_user_liked': liked.get(post.pk)}
+            for post, fragment in zip(posts, fragments)
+        ]
+
+
 class PostSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     author = UserSerializer(read_only=True)
+    renditions = PostMediaSerializer(many=True, read_only=True)
+    upload = serializers.UUIDField(write_only=True, required=False)    #id of a finalized post upload
     post_likes = serializers.SerializerMethodField('get_post_likes_count')
     post_comments = serializers.SerializerMethodField('get_post_comments_count')
     request_user_liked = serializers.SerializerMethodField('get_request_user_liked')
     
     class Meta:
         model = Post
-        fields = ['id','author','media','caption','created_at','post_likes', 'post_comments','request_user_liked']
+        fields = ['id','author','media','upload','media_status','media_width','media_height','media_blurhash','renditions',
+                  'caption','created_at','post_likes', 'post_comments','request_user_liked']
+        read_only_fields = ['media_status','media_width','media_height','media_blurhash']
+        extra_kwargs = {
+            'media':{'required':False},
+        }
+        list_serializer_class = PostListSerializer
+    
+    # differ between viewers, so they are left out of the cached fragments
+    viewer_fields = ('request_user_liked',)
+        
+    def validate_media(self, value):
+        uploads.check_file('post', value.name, value.size)
+        return value
+    
+    def validate_upload(self, value):
+        return uploads.get_completed_session(self.context['request'].user, value, 'post')
+    
+    def validate(self, data):
+        if 'media' in data and 'upload' in data:
+            raise ValidationError({
+                'success':False,
+                'message':'Send either a media file or the id of a finalized upload'
+            })
+        if self.instance is None and 'media' not in data and 'upload' not in data:
+            raise ValidationError({'media':['No file was submitted.']})
+        return data
+    
+    def save(self, **kwargs):
+        upload = self.validated_data.pop('upload', None)
+        if upload is None:
+            return super().save(**kwargs)
+        with uploads.open_upload(upload) as file:
+            # FileSystemStorage moves the assembled file into place
+            self.validated_data['media'] = file
+            instance = super().save(**kwargs)
+        uploads.discard(upload)
+        return instance
         
     def get_post_likes_count(self, obj):
-        return obj.post_likes.count()
+        return obj.total_like_count
     
     def get_post_comments_count(self, obj):
-        return obj.comments.count()
+        return obj.total_comment_count
     
     def get_request_user_liked(self, obj):
         request = self.context.get('request', None)
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'user_liked'):
+                return obj.user_liked
+            return PostLike.objects.filter(post=obj, author=request.user).exists()
+    
+    def shared_representation(self, instance):
+        """to_representation() without `viewer_fields`."""
+        ret = {}
+        for field in self._readable_fields:
+            if field.field_name in self.viewer_fields:
+                continue
             try:
-                PostLike.objects.get(post=obj, author=request.user)
-                return True
-            except PostLike.DoesNotExist:
-                return False
+                attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+            check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+            ret[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+        return ret
+    
+    def get_page_liked(self, posts):
+        """`request_user_liked` of every post by pk, with at most one query for the page."""
+        request = self.context.get('request', None)
+        if not (request and request.user.is_authenticated):
+            return {}
+        liked = {post.pk: post.user_liked for post in posts if hasattr(post, 'user_liked')}
+        unknown = [post.pk for post in posts if post.pk not in liked]
+        if unknown:
+            found = set(PostLike.objects.filter(author=request.user, post_id__in=unknown).values_list('post_id', flat=True))
+            liked.update((pk, pk in found) for pk in unknown)
+        return liked
             
 
 class CommentSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     author = UserSerializer(read_only=True)
     replies = serializers.SerializerMethodField('get_comment_replies')
+    replies_count = serializers.SerializerMethodField('get_comment_replies_count')
     request_user_liked = serializers.SerializerMethodField('get_request_user_liked')
     comment_likes_count = serializers.SerializerMethodField('get_comment_likes_count')
     
     class Meta:
         model = PostComment
-        fields = ['id','author','comment','parent','created_at','replies','request_user_liked','comment_likes_count']
+        fields = ['id','author','comment','parent','created_at','replies','replies_count','request_user_liked','comment_likes_count']
         
     def get_comment_replies(self, obj):
-        if obj.child.exists():
-            serializers = self.__class__(obj.child.all(), many=True, context=self.context)
-            return serializers.data
+        if hasattr(obj, 'loaded_replies'):
+            replies = obj.loaded_replies
+        elif obj.child.exists():
+            replies = obj.child.all()
         else:
             return None
+        if not replies:
+            return None
+        serializers = self.__class__(replies, many=True, context=self.context)
+        return serializers.data
+    
+    def get_comment_replies_count(self, obj):
+        if hasattr(obj, 'replies_count'):
+            return obj.replies_count
+        return obj.child.count()
         
     def get_request_user_liked(self, obj):
         user = self.context.get('request').user
         if user.is_authenticated:
+            if hasattr(obj, 'user_liked'):
+                return obj.user_liked
             return obj.likes.filter(author=user).exists()
         else:
             return False
         
     def get_comment_likes_count(self,obj):
-        return obj.likes.count()
+        return obj.like_count
     
 
 class CommentLikeSerializer(serializers.ModelSerializer):
@@ -99,5 +207,20 @@ class PostLikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostLike
         fields = ['id','author','post']
-               
-               
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    posts = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=MAX_BATCH_SIZE)
+    comments = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=MAX_BATCH_SIZE)
+    
+    def validate(self, data):
+        if not data.get('posts') and not data.get('comments'):
+            raise ValidationError({
+                'success':False,
+                'message':'Send the ids of posts or comments'
+            })
+        return data
+    
+    
+class LikeActionSerializer(LikeBatchSerializer):
+    action = serializers.ChoiceField(choices=['like', 'unlike'])
@@ -0,0 +1,99 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from base_app.response_cache import invalidate
+from base_app.storage import track_files
+from users.models import User
+from .models import Post, PostComment, PostLike, CommentLike, PostMedia
+from .search import SEARCHABLE_STATUSES, get_search_backend
+
+
+track_files(Post)
+track_files(PostMedia)
+
+# user fields embedded in post, comment and like payloads
+AUTHOR_FIELDS = ('username', 'photo')
+# user fields that decide what user search returns and shows
+SEARCHED_FIELDS = ('username', 'first_name', 'last_name', 'photo', 'auth_status')
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_search_backend().update_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_search_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, **kwargs):
+    get_search_backend().update_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    get_search_backend().remove_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    invalidate('posts', f'post:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=PostComment)
+@receiver([post_save, post_delete], sender=PostLike)
+def invalidate_post_children(sender, instance, **kwargs):
+    # not 'posts': every like would retire the cached post list, which only
+    # shows counts and may lag by RESPONSE_CACHE['TIMEOUT']
+    invalidate(f'post:{instance.post_id}')
+
+
+@receiver([post_save, post_delete], sender=CommentLike)
+def invalidate_comment_like(sender, instance, **kwargs):
+    try:
+        post_id = instance.comment.post_id
+    except PostComment.DoesNotExist:
+        # removed together with its comment, which invalidates the post itself
+        return
+    invalidate(f'post:{post_id}')
+
+
+@receiver(post_init, sender=User)
+def remember_user_fields(sender, instance, **kwargs):
+    # deferred fields are skipped, reading them here would cost a query each
+    instance._cached_user_fields = {
+        name: str(instance.__dict__[name]) for name in SEARCHED_FIELDS if name in instance.__dict__
+    }
+
+
+def changed_user_fields(instance, names, update_fields):
+    remembered = getattr(instance, '_cached_user_fields', {})
+    return [
+        name for name in names
+        if name in instance.__dict__ and (update_fields is None or name in update_fields)
+        and remembered.get(name) != str(instance.__dict__[name])
+    ]
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, created, update_fields=None, **kwargs):
+    # most saves (verification, login rehashes, last_login) change nothing
+    # that cached responses show, and must not retire the cached feeds
+    if created:
+        scopes = ['users'] if instance.auth_status in SEARCHABLE_STATUSES else []
+    else:
+        scopes = []
+        if changed_user_fields(instance, AUTHOR_FIELDS, update_fields):
+            scopes += ['posts', 'authors']
+        if changed_user_fields(instance, SEARCHED_FIELDS, update_fields):
+            scopes.append('users')
+    if scopes:
+        invalidate(*scopes)
+    remember_user_fields(sender, instance)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    invalidate('users', 'posts', 'authors')
@@ -0,0 +1,11 @@
+from base_app.jobs import task
+from .models import Post
+from .timeline import fan_out_post
+
+
+@task('timeline.fan_out')
+def fan_out(payload):
+    post = Post.objects.select_related('author').filter(pk=payload['post']).first()
+    # deleted before a worker got to it
+    if post is not None:
+        fan_out_post(post)
@@ -1,3 +1,648 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from base_app.counters import shift_counter
+from base_app.jobs import claim, run
+from base_app.models import Job
+from base_app.response_cache import scope_versions
+from users.models import DONE, Follow, User
+from . import counters, fragments, like_buffer, media
+from .async_views import AsyncKeysetListView
+from .like_buffer import DEAD_LETTER_FILE, LikeBuffer, replay
+from .models import Post, PostComment, PostLike, CommentLike, PostMedia, PostCounterShard, TimelineEntry,\
+    MEDIA_FAILED, MEDIA_PENDING, MEDIA_PROCESSING, MEDIA_READY
+from .search import BaseSearchBackend, InvertedIndexSearchBackend, PostgresSearchBackend, get_search_backend
+from .tasks import fan_out
+from .timeline import get_timeline_store
+
+
+def create_user(username):
+    return User.objects.create(username=username, email=f'{username}@example.com')
+
+
+def create_post(author, caption='caption'):
+    return Post.objects.create(author=author, caption=caption, media='posts/test.jpg')
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class FeedQueryCountTests(TestCase):
+    """Listing posts and comments costs the same number of queries whatever the page size."""
+    def setUp(self):
+        clear_caches()
+        self.viewer = create_user('viewer')
+        authors = [create_user(f'author{number}') for number in range(3)]
+        self.posts = [create_post(authors[number % 3], f'post {number}') for number in range(12)]
+        for post in self.posts:
+            PostLike.objects.create(author=self.viewer, post=post)
+            PostMedia.objects.create(post=post, kind='small', format='webp', width=320, height=320, file='posts/renditions/test.webp')
+        self.post = self.posts[0]
+        for number in range(12):
+            comment = PostComment.objects.create(author=authors[number % 3], post=self.post, comment=f'comment {number}')
+            CommentLike.objects.create(author=self.viewer, comment=comment)
+            PostComment.objects.create(author=self.viewer, post=self.post, comment='reply', parent=comment)
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, url):
+        # the first request also fills the cached row count
+        self.client.get(f'{url}?page_size=2')
+        small = self.count_queries(f'{url}?page_size=2')
+        with self.assertNumQueries(small):
+            response = self.client.get(f'{url}?page_size=10')
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_post_list(self):
+        self.assert_constant_queries('/post/list/')
+
+    def test_comment_list(self):
+        self.assert_constant_queries(f'/post/{self.post.pk}/comments/')
+
+
+class AsyncPostListTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        author = create_user('author')
+        for number in range(3):
+            create_post(author, f'post {number}')
+
+    def test_same_page_as_the_sync_list(self):
+        client = APIClient()
+        sync = client.get('/post/list/?page_size=2').json()
+        response = client.get('/async/post/list/?page_size=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            [post['id'] for post in sync['results']],
+        )
+
+    def test_subclass_must_define_get_queryset(self):
+        class IncompleteView(AsyncKeysetListView):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteView()
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = create_user('viewer')
+        self.post = create_post(create_user('author'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_counts(self, likes, comments):
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (likes, comments))
+
+    def test_like_and_unlike(self):
+        self.assertEqual(self.client.post(f'/post/{self.post.pk}/likes/create/').status_code, 201)
+        # a second like of the same post is not counted
+        self.client.post(f'/post/{self.post.pk}/likes/create/')
+        self.assert_counts(1, 0)
+        like = PostLike.objects.get()
+        self.assertEqual(self.client.delete(f'/post/{like.pk}/likes/delete/').status_code, 200)
+        self.assert_counts(0, 0)
+
+    def test_deleting_a_comment_uncounts_its_replies(self):
+        response = self.client.post(f'/post/{self.post.pk}/comments/create/', {'comment': 'first'})
+        self.assertEqual(response.status_code, 201)
+        comment = PostComment.objects.get()
+        self.client.post(f'/post/{self.post.pk}/comments/create/', {'comment': 'reply', 'parent': comment.pk})
+        self.assert_counts(0, 2)
+        self.assertEqual(self.client.delete(f'/post/comments/delete/{comment.pk}/').status_code, 200)
+        self.assert_counts(0, 0)
+
+    def test_comment_like(self):
+        comment = PostComment.objects.create(author=self.user, post=self.post, comment='comment')
+        self.client.post(f'/post/comments/{comment.pk}/likes/create/')
+        comment.refresh_from_db()
+        self.assertEqual(comment.like_count, 1)
+
+    def test_likes_and_comments_invalidate_only_their_post(self):
+        before = scope_versions(['posts', f'post:{self.post.pk}'])
+        self.client.post(f'/post/{self.post.pk}/likes/create/')
+        self.client.post(f'/post/{self.post.pk}/comments/create/', {'comment': 'comment'})
+        after = scope_versions(['posts', f'post:{self.post.pk}'])
+        self.assertEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+    def test_batch_unlike(self):
+        posts = [self.post, create_post(self.user)]
+        comment = PostComment.objects.create(author=self.user, post=self.post, comment='comment')
+        ids = {'posts': [str(post.pk) for post in posts], 'comments': [str(comment.pk)]}
+        self.client.post('/post/likes/batch/', {**ids, 'action': 'like'}, format='json')
+        self.assertEqual((PostLike.objects.count(), CommentLike.objects.count()), (2, 1))
+        response = self.client.post('/post/likes/batch/', {**ids, 'action': 'unlike'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PostLike.objects.exists() or CommentLike.objects.exists())
+        self.assert_counts(0, 0)
+        comment.refresh_from_db()
+        self.assertEqual(comment.like_count, 0)
+
+    def test_decrement_is_clamped_at_zero(self):
+        shift_counter(Post.objects.filter(pk=self.post.pk), 'like_count', -5)
+        self.assert_counts(0, 0)
+
+    def test_recount_repairs_drift(self):
+        PostLike.objects.create(author=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=3)
+        call_command('recount_counters', stdout=io.StringIO())
+        self.assert_counts(1, 0)
+
+
+@override_settings(COUNTER_SHARDS={'SHARDS': 4, 'WINDOW': 10, 'PROMOTE_RATE': 1, 'DEMOTE_RATE': 1})
+class CounterShardTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.post = create_post(create_user('author'))
+        # pinned inside one window
+        patcher = mock.patch.object(counters, 'time')
+        self.clock = patcher.start()
+        self.clock.time.return_value = 1000005.0
+        self.addCleanup(patcher.stop)
+
+    def like(self, times=1):
+        for number in range(times):
+            with self.captureOnCommitCallbacks(execute=True):
+                counters.add_post_likes(self.post.pk)
+
+    def test_hot_post_is_promoted_and_folded_back(self):
+        # PROMOTE_RATE * WINDOW writes make it hot, the rest go to the shards
+        self.like(15)
+        self.assertEqual(PostCounterShard.objects.filter(post=self.post).count(), 4)
+        sharded = sum(PostCounterShard.objects.filter(post=self.post).values_list('like_count', flat=True))
+        self.assertEqual(sharded, 5)
+        self.assertEqual(Post.objects.with_stats().get(pk=self.post.pk).total_like_count, 15)
+
+        self.assertTrue(counters.demote(self.post.pk))
+        self.assertFalse(PostCounterShard.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 15)
+
+    def test_post_busy_in_either_window_is_not_cooled(self):
+        self.like(10)
+        # still busy in the current window
+        self.assertEqual(counters.cooled_posts(), [])
+        # a window later the busy one is the previous window
+        self.clock.time.return_value += 10
+        self.assertEqual(counters.cooled_posts(), [])
+        # quiet in both, hot again in the current one
+        self.clock.time.return_value += 10
+        self.assertEqual(counters.cooled_posts(), [self.post.pk])
+        self.like(10)
+        self.assertEqual(counters.cooled_posts(), [])
+
+
+class ConditionalGetTests(TestCase):
+    """The post detail ETag covers likes, for viewers and for the cached anonymous response."""
+    def setUp(self):
+        clear_caches()
+        self.viewer = create_user('viewer')
+        self.post = create_post(create_user('author'))
+        self.url = f'/post/{self.post.pk}/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def like(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post(f'{self.url}likes/create/').status_code, 201)
+
+    def assert_revalidated(self, client):
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        return etag
+
+    def test_like_changes_the_etag(self):
+        etag = self.assert_revalidated(self.client)
+        self.like(self.viewer)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['request_user_liked'])
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_anonymous_response_is_revalidated_after_a_like(self):
+        anonymous = APIClient()
+        etag = self.assert_revalidated(anonymous)
+        # a cache hit is answered with 304 as well
+        self.assertEqual(anonymous.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.like(self.viewer)
+        response = anonymous.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['post_likes'], 1)
+
+    @override_settings(COUNTER_SHARDS={'SHARDS': 4, 'WINDOW': 10, 'PROMOTE_RATE': 1, 'DEMOTE_RATE': 1})
+    def test_like_of_a_sharded_post_changes_the_etag(self):
+        with mock.patch.object(counters, 'time') as clock:
+            clock.time.return_value = 1000005.0
+            for number in range(12):
+                with self.captureOnCommitCallbacks(execute=True):
+                    counters.add_post_likes(self.post.pk)
+            self.assertTrue(PostCounterShard.objects.filter(post=self.post).exists())
+            etag = self.assert_revalidated(self.client)
+            self.like(self.viewer)
+            # the post row is left alone, only a shard has moved
+            self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 10)
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['post_likes'], 13)
+
+
+class FragmentTests(TestCase):
+    """Post pages share cached fragments between viewers and lay the viewer's fields over them."""
+    def setUp(self):
+        clear_caches()
+        self.liker = create_user('liker')
+        self.other = create_user('other')
+        author = create_user('author')
+        self.posts = [create_post(author, f'post {number}') for number in range(3)]
+        PostLike.objects.create(author=self.liker, post=self.posts[0])
+        counters.add_post_likes(self.posts[0].pk)
+
+    def page(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/post/list/?page_size=10')
+        self.assertEqual(response.status_code, 200)
+        return {item['id']: item for item in response.json()['results']}
+
+    def key(self, post):
+        return fragments.fragment_key(Post.objects.with_stats().get(pk=post.pk), 'http://testserver/')
+
+    def test_viewers_share_the_fragment_but_not_their_likes(self):
+        liked = self.page(self.liker)
+        with mock.patch.object(fragments, 'get_cache', return_value=mock.Mock(wraps=fragments.get_cache())) as get_cache:
+            other = self.page(self.other)
+        cache = get_cache.return_value
+        # a warm page is one get_many() and nothing is stored
+        self.assertEqual(cache.get_many.call_count, 1)
+        self.assertFalse(cache.set_many.called)
+
+        first = str(self.posts[0].pk)
+        self.assertTrue(liked[first]['request_user_liked'])
+        self.assertFalse(other[first]['request_user_liked'])
+        for item in (liked[first], other[first]):
+            item.pop('request_user_liked')
+        self.assertEqual(liked[first], other[first])
+        self.assertEqual(other[first]['post_likes'], 1)
+
+    def test_like_and_edit_change_the_key(self):
+        post = self.posts[1]
+        key = self.key(post)
+        PostLike.objects.create(author=self.other, post=post)
+        counters.add_post_likes(post.pk)
+        liked_key = self.key(post)
+        self.assertNotEqual(liked_key, key)
+
+        post.refresh_from_db()
+        post.caption = 'edited'
+        post.save()
+        self.assertNotIn(self.key(post), (key, liked_key))
+        self.assertEqual(self.page(self.other)[str(post.pk)]['caption'], 'edited')
+
+
+class UserInvalidationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.author = create_user('author')
+        self.post = create_post(self.author)
+
+    def versions(self):
+        return scope_versions(['posts', 'authors', 'users'])
+
+    def test_saves_that_change_no_shown_field_keep_the_feed(self):
+        before = self.versions()
+        create_user('newcomer')
+        self.author.last_login = timezone.now()
+        self.author.save(update_fields=['last_login'])
+        self.author.first_name = 'Ann'
+        self.author.save()
+        after = self.versions()
+        self.assertEqual(after[:2], before[:2])
+        # first_name is searched
+        self.assertNotEqual(after[2], before[2])
+
+    def test_rename_refreshes_cached_post_pages(self):
+        client = APIClient()
+        comment = PostComment.objects.create(author=self.author, post=self.post, comment='comment')
+        urls = [f'/post/{self.post.pk}/', f'/post/{self.post.pk}/comments/', '/post/list/']
+        for url in urls:
+            self.assertEqual(client.get(url).status_code, 200)
+        self.author.username = 'renamed'
+        self.author.save()
+        self.assertEqual(client.get(urls[0]).json()['author']['username'], 'renamed')
+        self.assertEqual(client.get(urls[1]).json()['results'][0]['author']['username'], 'renamed')
+        self.assertEqual(client.get(urls[2]).json()['results'][0]['author']['username'], 'renamed')
+
+
+class InvertedIndexSearchTests(TestCase):
+    def setUp(self):
+        self.author = create_user('author')
+        self.sunset = create_post(self.author, 'Sunset over the sea')
+        self.sunny = create_post(self.author, 'Sunny day at the sea')
+        create_post(self.author, 'Mountains')
+        self.backend = InvertedIndexSearchBackend()
+        self.backend.rebuild()
+
+    def ids(self, query):
+        return list(self.backend.search_posts(query).values_list('pk', flat=True))
+
+    def test_prefix_match_ranked_by_matched_tokens(self):
+        self.assertEqual(set(self.ids('sun')), {self.sunset.pk, self.sunny.pk})
+        self.assertEqual(self.ids('sunse sea'), [self.sunset.pk, self.sunny.pk])
+        self.assertEqual(self.ids('valley'), [])
+
+    def test_updates_keep_the_terms_sorted(self):
+        self.sunny.caption = 'Rainy day'
+        self.backend.update_post(self.sunny)
+        self.backend.remove_post(self.sunset.pk)
+        self.assertEqual(self.backend.terms['posts'], sorted(self.backend.indexes['posts']))
+        self.assertEqual(self.ids('sun'), [])
+        self.assertEqual(self.ids('rain'), [self.sunny.pk])
+
+    def test_users(self):
+        user = User.objects.create(username='sunny_jim', email='jim@example.com', first_name='Jim', auth_status=DONE)
+        self.backend.update_user(user)
+        self.assertEqual(list(self.backend.search_users('jim').values_list('pk', flat=True)), [user.pk])
+        # the author never finished signing up
+        self.assertFalse(self.backend.search_users('author').exists())
+
+
+class SearchBackendTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        get_search_backend.cache_clear()
+        self.addCleanup(get_search_backend.cache_clear)
+
+    def test_backend_must_implement_both_searches(self):
+        class UserSearchBackend(BaseSearchBackend):
+            def search_users(self, query):
+                return User.objects.none()
+
+        with self.assertRaises(TypeError):
+            UserSearchBackend()
+
+    def test_backend_for_the_database(self):
+        self.assertIsInstance(get_search_backend(), InvertedIndexSearchBackend)
+        get_search_backend.cache_clear()
+        with self.settings(SEARCH={'BACKEND': 'post.search.PostgresSearchBackend', 'CONFIG': 'english'}):
+            backend = get_search_backend()
+        self.assertIsInstance(backend, PostgresSearchBackend)
+        self.assertEqual(backend.config, 'english')
+
+    def test_search_endpoint(self):
+        author = User.objects.create(username='sunny', email='sunny@example.com', auth_status=DONE)
+        post = create_post(author, 'Sunset over the sea')
+        create_post(author, 'Mountains')
+        response = APIClient().get('/search/?q=sun')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['caption'] for item in response.json()['posts']], [post.caption])
+        self.assertEqual([item['username'] for item in response.json()['users']], ['sunny'])
+
+
+class LikeBufferTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(LIKE_WRITE_BEHIND={
+            'ENABLED': True, 'JOURNAL_DIR': self.directory, 'MAX_ATTEMPTS': 2,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # flushed by the tests, not by a background thread
+        patcher = mock.patch.object(LikeBuffer, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.buffer = LikeBuffer()
+        self.author = create_user('author')
+        self.post = create_post(self.author)
+
+    def journals(self):
+        return sorted(name for name in os.listdir(self.directory) if name != DEAD_LETTER_FILE)
+
+    def dead_letters(self):
+        path = os.path.join(self.directory, DEAD_LETTER_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as file:
+            return [json.loads(line) for line in file]
+
+    def test_flush_coalesces_and_removes_the_journal(self):
+        user = create_user('liker')
+        self.buffer.add('posts', user.pk, self.post.pk, True)
+        self.buffer.add('posts', user.pk, self.post.pk, False)
+        self.buffer.add('posts', user.pk, self.post.pk, True)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(PostLike.objects.filter(post=self.post).count(), 1)
+        self.assertEqual(self.journals(), [])
+
+    def test_like_of_deleted_user_is_dropped(self):
+        user = create_user('gone')
+        self.buffer.add('posts', user.pk, self.post.pk, True)
+        user.delete()
+        self.buffer.flush()
+        self.assertFalse(PostLike.objects.exists())
+        self.assertEqual(self.buffer.pending, {})
+        self.assertEqual(self.journals(), [])
+
+    def test_failing_event_is_retried_then_dead_lettered(self):
+        good, bad = create_user('good'), create_user('bad')
+        apply_likes = like_buffer.apply_likes
+
+        def reject_bad(kind, changes):
+            if any(author == str(bad.pk) for author, target in changes):
+                raise IntegrityError('rejected')
+            return apply_likes(kind, changes)
+
+        with mock.patch.object(like_buffer, 'apply_likes', side_effect=reject_bad):
+            self.buffer.add('posts', good.pk, self.post.pk, True)
+            self.buffer.add('posts', bad.pk, self.post.pk, True)
+            self.assertEqual(self.buffer.flush(), 1)
+            # the good like is written, the bad one waits for another attempt
+            self.assertTrue(PostLike.objects.filter(author=good).exists())
+            self.assertEqual(list(self.buffer.pending), [('posts', str(bad.pk), str(self.post.pk))])
+            self.assertEqual(len(self.journals()), 1)
+
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(self.buffer.pending, {})
+        self.assertEqual(self.journals(), [])
+        self.assertEqual([event[:4] for event in self.dead_letters()], [['posts', str(bad.pk), str(self.post.pk), True]])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_replay_applies_orphaned_segments_once(self):
+        first, second = create_user('first'), create_user('second')
+        path = os.path.join(self.directory, 'likes-host-1-orphan.log')
+        with open(path, 'w') as journal:
+            journal.write(json.dumps(['posts', str(first.pk), str(self.post.pk), True]) + '\n')
+            journal.write(json.dumps(['posts', str(second.pk), str(self.post.pk), True]) + '\n')
+            journal.write(json.dumps(['posts', str(second.pk), str(self.post.pk), False]) + '\n')
+            # cut short by the crash
+            journal.write('["posts", "')
+
+        self.assertEqual(replay(), 1)
+        self.assertFalse(os.path.exists(path))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(list(PostLike.objects.values_list('author_id', flat=True)), [first.pk])
+        self.assertEqual(replay(), 0)
+
+    def test_replay_skips_segments_of_live_buffers(self):
+        user = create_user('liker')
+        self.buffer.add('posts', user.pk, self.post.pk, True)
+        self.assertEqual(replay(), 0)
+        self.assertFalse(PostLike.objects.exists())
+        self.assertEqual(len(self.journals()), 1)
+
+
+@override_settings(TIMELINE={'BACKEND': 'post.timeline.DatabaseTimelineStore', 'MAX_ENTRIES': 2})
+class FanOutTests(TestCase):
+    def setUp(self):
+        # the created post stores its media file
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        get_timeline_store.cache_clear()
+        self.addCleanup(get_timeline_store.cache_clear)
+        self.author = create_user('author')
+        self.followers = [create_user(f'follower{number}') for number in range(3)]
+        Follow.objects.bulk_create([Follow(follower=user, following=self.author) for user in self.followers])
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    @staticmethod
+    def image():
+        file = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(file, 'JPEG')
+        return SimpleUploadedFile('post.jpg', file.getvalue(), content_type='image/jpeg')
+
+    def test_create_queues_the_fan_out(self):
+        with mock.patch('post.media.schedule'), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/post/create/', {'caption': 'queued', 'media': self.image()})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(Job.objects.filter(name='timeline.fan_out').count(), 1)
+
+        run(claim())
+        self.assertEqual(TimelineEntry.objects.filter(post_id=response.json()['id']).count(), 3)
+
+    def test_fan_out_trims_timelines_to_the_cap(self):
+        posts = [create_post(self.author, f'post {number}') for number in range(3)]
+        for post in posts:
+            fan_out({'post': str(post.pk)})
+        for user in self.followers:
+            self.assertEqual(
+                set(TimelineEntry.objects.filter(owner=user).values_list('post_id', flat=True)),
+                {posts[1].pk, posts[2].pk},
+            )
+
+    def test_fan_out_of_deleted_post_does_nothing(self):
+        post = create_post(self.author)
+        post_id = str(post.pk)
+        post.delete()
+        fan_out({'post': post_id})
+        self.assertFalse(TimelineEntry.objects.exists())
+
+
+@override_settings(MEDIA_PROCESSING={'RENDITIONS': {'thumbnail': (150, 150), 'small': (320, None), 'large': (1080, None)}})
+class MediaProcessingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = create_user('author')
+
+    def create_post(self, content, name='post.jpg'):
+        return Post.objects.create(author=self.author, caption='photo', media=SimpleUploadedFile(name, content))
+
+    @staticmethod
+    def photo():
+        # 400x200 as stored, shown rotated to 200x400, with camera and location data
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010f] = 'Camera maker'
+        exif[0x8825] = {2: (52.0, 31.0, 0.0)}
+        file = io.BytesIO()
+        Image.new('RGB', (400, 200), 'blue').save(file, 'JPEG', exif=exif)
+        return file.getvalue()
+
+    def test_photo_is_stripped_and_rendered(self):
+        content = self.photo()
+        with Image.open(io.BytesIO(content)) as source:
+            self.assertEqual(source.getexif()[0x010f], 'Camera maker')
+        post = self.create_post(content)
+        self.assertEqual(post.media_status, MEDIA_PENDING)
+        media.process(post.pk)
+
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, MEDIA_READY)
+        self.assertEqual((post.media_width, post.media_height), (200, 400))
+        self.assertTrue(post.media_blurhash)
+        with post.media.open('rb') as file, Image.open(file) as original:
+            # the rotation is applied to the pixels, nothing of the EXIF is left
+            self.assertEqual(original.size, (200, 400))
+            self.assertFalse(original.getexif())
+            self.assertNotIn('exif', original.info)
+
+        renditions = {(item.kind, item.format): (item.width, item.height) for item in post.renditions.all()}
+        # 'large' would not be larger than 'small', so it is skipped
+        self.assertEqual(renditions, {
+            ('thumbnail', 'webp'): (150, 150), ('thumbnail', 'jpeg'): (150, 150),
+            ('small', 'webp'): (200, 400), ('small', 'jpeg'): (200, 400),
+        })
+        for rendition in post.renditions.all():
+            with rendition.file.open('rb') as file, Image.open(file) as image:
+                self.assertEqual(image.size, (rendition.width, rendition.height))
+
+    def test_post_is_processed_once(self):
+        post = self.create_post(self.photo())
+        Post.objects.filter(pk=post.pk).update(media_status=MEDIA_PROCESSING, updated_at=timezone.now())
+        # another worker has it
+        media.process(post.pk)
+        self.assertFalse(post.renditions.exists())
+
+        Post.objects.filter(pk=post.pk).update(media_status=MEDIA_PENDING)
+        media.process(post.pk)
+        media.process(post.pk)
+        self.assertEqual(post.renditions.count(), 4)
+
+    def test_unreadable_image_fails(self):
+        post = self.create_post(b'not an image')
+        with self.assertLogs('post.media', 'ERROR'):
+            media.process(post.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, MEDIA_FAILED)
+        self.assertFalse(post.renditions.exists())
@@ -0,0 +1,241 @@
+import bisect
+import threading
+from abc import ABCMeta, abstractmethod
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils.module_loading import import_string
+
+from users.models import Follow
+from .models import Post, TimelineEntry
+
+
+DEFAULTS = {
+    'BACKEND': 'post.timeline.DatabaseTimelineStore',
+    'OPTIONS': {},
+    'MAX_ENTRIES': 800,
+    'FANOUT_FOLLOWER_LIMIT': 10000,
+    'FANOUT_BATCH_SIZE': 1000,
+    'BACKFILL_POSTS': 50,
+}
+
+
+def timeline_setting(name):
+    return getattr(settings, 'TIMELINE', {}).get(name, DEFAULTS[name])
+
+
+class BaseTimelineStore(metaclass=ABCMeta):
+    """
+    Per-user list of post ids, newest first, capped at `max_entries`.
+    Stores only keep ids; posts themselves are always read from the database.
+    """
+    def __init__(self, max_entries, **options):
+        self.max_entries = max_entries
+
+    @abstractmethod
+    def fan_out(self, post, owner_ids):
+        """Add one post to the timelines of many owners."""
+
+    @abstractmethod
+    def add(self, owner_id, posts):
+        """Add many posts to the timeline of one owner."""
+
+    @abstractmethod
+    def remove_author(self, owner_id, author_id):
+        """Drop every post of `author_id` from the timeline of `owner_id`."""
+
+    @abstractmethod
+    def post_ids(self, owner_id):
+        """Newest post ids of `owner_id`, usable as the right side of `pk__in`."""
+
+
+class DatabaseTimelineStore(BaseTimelineStore):
+    """
+    Timeline rows in the TimelineEntry table. post_ids() returns a subquery,
+    so the home feed stays a single SQL query.
+    Every write trims the timelines it touched back to the cap;
+    `manage.py trim_timelines` trims all of them, e.g. after lowering it.
+    """
+    batch_size = 1000
+
+    def fan_out(self, post, owner_ids):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post.pk, posted_at=post.created_at) for owner_id in owner_ids],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        self.trim_many(owner_ids)
+
+    def add(self, owner_id, posts):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post.pk, posted_at=post.created_at) for post in posts],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        self.trim(owner_id)
+
+    def remove_author(self, owner_id, author_id):
+        TimelineEntry.objects.filter(owner_id=owner_id, post__author_id=author_id).delete()
+
+    def post_ids(self, owner_id):
+        return TimelineEntry.objects.filter(owner_id=owner_id).order_by('-posted_at').values('post_id')[:self.max_entries]
+
+    def trim(self, owner_id):
+        cutoff = list(
+            TimelineEntry.objects.filter(owner_id=owner_id).order_by('-posted_at')
+            .values_list('posted_at', flat=True)[self.max_entries:self.max_entries + 1]
+        )
+        if cutoff:
+            return TimelineEntry.objects.filter(owner_id=owner_id, posted_at__lte=cutoff[0]).delete()[0]
+        return 0
+
+    def trim_many(self, owner_ids):
+        """trim() for many owners in two statements: the entries ranked past the cap, then their delete."""
+        extra = list(
+            TimelineEntry.objects.filter(owner_id__in=owner_ids)
+            .annotate(rank=Window(RowNumber(), partition_by=F('owner_id'), order_by=F('posted_at').desc()))
+            .filter(rank__gt=self.max_entries).values_list('pk', flat=True)
+        )
+        if extra:
+            return TimelineEntry.objects.filter(pk__in=extra).delete()[0]
+        return 0
+
+
+class InMemoryTimelineStore(BaseTimelineStore):
+    """
+    Process-local store. Every worker keeps its own timelines, so this is
+    meant for development, tests and single-process deployments.
+    """
+    def __init__(self, max_entries, **options):
+        super().__init__(max_entries, **options)
+        self.lock = threading.Lock()
+        self.timelines = {}
+
+    def _insert(self, owner_id, post):
+        # entries are (-timestamp, post_id, author_id), so the list is newest first
+        entries = self.timelines.setdefault(str(owner_id), [])
+        entry = (-post.created_at.timestamp(), str(post.pk), str(post.author_id))
+        if entry not in entries:
+            bisect.insort(entries, entry)
+            del entries[self.max_entries:]
+
+    def fan_out(self, post, owner_ids):
+        with self.lock:
+            for owner_id in owner_ids:
+                self._insert(owner_id, post)
+
+    def add(self, owner_id, posts):
+        with self.lock:
+            for post in posts:
+                self._insert(owner_id, post)
+
+    def remove_author(self, owner_id, author_id):
+        with self.lock:
+            entries = self.timelines.get(str(owner_id), [])
+            entries[:] = [entry for entry in entries if entry[2] != str(author_id)]
+
+    def post_ids(self, owner_id):
+        with self.lock:
+            return [entry[1] for entry in self.timelines.get(str(owner_id), [])]
+
+
+class RedisTimelineStore(BaseTimelineStore):
+    """
+    One sorted set per owner, scored by post timestamp. Requires the `redis`
+    package and works with any Redis-protocol compatible server.
+    """
+    def __init__(self, max_entries, url='redis://localhost:6379/0', key_prefix='timeline', **options):
+        super().__init__(max_entries, **options)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisTimelineStore requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def key(self, owner_id):
+        return f"{self.key_prefix}:{owner_id}"
+
+    @staticmethod
+    def member(post):
+        return f"{post.pk}:{post.author_id}"
+
+    def _push(self, pipeline, owner_id, mapping):
+        key = self.key(owner_id)
+        pipeline.zadd(key, mapping)
+        pipeline.zremrangebyrank(key, 0, -(self.max_entries + 1))
+
+    def fan_out(self, post, owner_ids):
+        mapping = {self.member(post): post.created_at.timestamp()}
+        with self.client.pipeline(transaction=False) as pipeline:
+            for owner_id in owner_ids:
+                self._push(pipeline, owner_id, mapping)
+            pipeline.execute()
+
+    def add(self, owner_id, posts):
+        mapping = {self.member(post): post.created_at.timestamp() for post in posts}
+        if mapping:
+            with self.client.pipeline(transaction=False) as pipeline:
+                self._push(pipeline, owner_id, mapping)
+                pipeline.execute()
+
+    def remove_author(self, owner_id, author_id):
+        key, suffix = self.key(owner_id), f":{author_id}".encode()
+        members = [member for member in self.client.zrange(key, 0, -1) if member.endswith(suffix)]
+        if members:
+            self.client.zrem(key, *members)
+
+    def post_ids(self, owner_id):
+        members = self.client.zrevrange(self.key(owner_id), 0, self.max_entries - 1)
+        return [member.decode().split(':', 1)[0] for member in members]
+
+
+@lru_cache(maxsize=None)
+def get_timeline_store():
+    store_class = import_string(timeline_setting('BACKEND'))
+    return store_class(timeline_setting('MAX_ENTRIES'), **timeline_setting('OPTIONS'))
+
+
+def is_fanned_out(author):
+    """
+    Accounts with many followers are not fanned out on write; their posts
+    are merged into the home feed at read time instead.
+    """
+    return author.followers_count < timeline_setting('FANOUT_FOLLOWER_LIMIT')
+
+
+def fan_out_post(post):
+    if not is_fanned_out(post.author):
+        return
+    store, batch_size = get_timeline_store(), timeline_setting('FANOUT_BATCH_SIZE')
+    follower_ids = Follow.objects.filter(following_id=post.author_id).values_list('follower_id', flat=True)
+    follower_ids = follower_ids.iterator(chunk_size=batch_size)
+    while batch := list(islice(follower_ids, batch_size)):
+        store.fan_out(post, batch)
+
+
+def backfill_timeline(user, author):
+    """Copy the latest posts of a newly followed account into `user`'s timeline."""
+    if not is_fanned_out(author):
+        return
+    posts = Post.objects.filter(author=author).order_by('-created_at')[:timeline_setting('BACKFILL_POSTS')]
+    get_timeline_store().add(user.pk, list(posts))
+
+
+def home_feed_queryset(user):
+    """
+    Posts from the user's timeline, from followed high-follower accounts
+    (fan-out on read) and the user's own posts, in one query.
+    """
+    store = get_timeline_store()
+    pulled_authors = Follow.objects.filter(
+        follower=user,
+        following__followers_count__gte=timeline_setting('FANOUT_FOLLOWER_LIMIT'),
+    ).values('following_id')
+    return Post.objects.with_stats(user).filter(
+        Q(pk__in=store.post_ids(user.pk)) | Q(author_id__in=pulled_authors) | Q(author=user)
+    )
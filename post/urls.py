@@ -3,12 +3,15 @@ from .views import PostListAPIView,  PostCreateAPIView, PostRetrieveUpdateDestro
     PostCommentListAPIView, PostCommentCreateAPIView, PostCommentDeleteAPIView,\
         PostLikeListAPIView,PostCommentLikeListAPIView, PostCommentDetailAPIView,\
             PostLikeCreateAPIView, PostCommentLikeCreateAPIView, PostCommentLikeDeleteAPIView,\
-                PostLikeDeleteAPIView
+                PostLikeDeleteAPIView, HomeFeedAPIView, LikeLookupAPIView, LikeBatchAPIView
 
 
 urlpatterns = [
     path('list/',PostListAPIView.as_view()),
+    path('feed/',HomeFeedAPIView.as_view()),
     path('create/',PostCreateAPIView.as_view()),
+    path('likes/lookup/',LikeLookupAPIView.as_view()),
+    path('likes/batch/',LikeBatchAPIView.as_view()),
     path('<uuid:pk>/',PostRetrieveUpdateDestroyAPIView.as_view()),
     path('<uuid:pk>/comments/',PostCommentListAPIView.as_view()),
     path('<uuid:pk>/comments/create/',PostCommentCreateAPIView.as_view()),
@@ -1,21 +1,40 @@
-from django.db.models import Q, Count
+from django.db import transaction
 from rest_framework.generics import ListAPIView, CreateAPIView, \
     RetrieveUpdateDestroyAPIView, DestroyAPIView, RetrieveAPIView, GenericAPIView
 from rest_framework import permissions
 from rest_framework.exceptions import PermissionDenied, NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-from base_app.custom_pagination import CustomPagination
+from base_app.conditional import ConditionalGetMixin
+from base_app.jobs import enqueue
+from base_app.custom_pagination import CustomPagination, KeysetPagination, OldestFirstKeysetPagination
+from base_app.response_cache import CachedResponseMixin
 from .models import Post, PostComment, PostLike, CommentLike
-from users.models import User, DONE, PHOTO_DONE
+from .comment_tree import load_replies
+from .counters import add_post_likes, add_post_comments, add_comment_likes
+from .likes import LIKE_TARGETS, liked_state, like_many, unlike_many
+from .like_buffer import like_buffer
+from .timeline import home_feed_queryset
+from . import media
+from .search import get_search_backend
 from . import serializers
 # Create your views here.
 
-class PostListAPIView(ListAPIView):
+POST_ETAG_FIELDS = ('updated_at', 'total_like_count', 'total_comment_count', 'user_liked', 'author.updated_at')
+COMMENT_ETAG_FIELDS = ('updated_at', 'like_count', 'replies_count', 'user_liked', 'author.updated_at')
+LIKE_ETAG_FIELDS = ('updated_at', 'author.updated_at')
+
+
+class PostListAPIView(CachedResponseMixin, ConditionalGetMixin, ListAPIView):
     permission_classes = [permissions.AllowAny,]
     serializer_class = serializers.PostSerializer
-    pagination_class = CustomPagination
-    queryset = Post.objects.all()
+    pagination_class = KeysetPagination
+    cache_scopes = ('posts',)
+    etag_fields = POST_ETAG_FIELDS
+    
+    def get_queryset(self):
+        return Post.objects.with_stats(self.request.user)
     
     
 class PostCreateAPIView(CreateAPIView):
@@ -26,13 +45,36 @@ class PostCreateAPIView(CreateAPIView):
         return self.request.user
     
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        # written to the followers' timelines by a job worker, not in this request
+        enqueue('timeline.fan_out', {'post': str(post.pk)})
+        media.schedule(post)
+        serializer.instance = Post.objects.with_stats(self.request.user).get(pk=post.pk)
+        
+        
+class HomeFeedAPIView(ConditionalGetMixin, ListAPIView):
+    permission_classes = [permissions.IsAuthenticated,]
+    serializer_class = serializers.PostSerializer
+    pagination_class = KeysetPagination
+    etag_fields = POST_ETAG_FIELDS
+    
+    def get_queryset(self):
+        return home_feed_queryset(self.request.user)
         
         
-class PostRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
+class PostRetrieveUpdateDestroyAPIView(CachedResponseMixin, ConditionalGetMixin, RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly,]
     serializer_class = serializers.PostSerializer
-    queryset = Post.objects.all()
+    etag_fields = POST_ETAG_FIELDS
+    # counter updates bump updated_at (or that of a counter shard) too, and a viewer's like bumps like_count
+    last_modified_fields = ('updated_at', 'shards_updated_at', 'author.updated_at')
+    
+    def get_cache_scopes(self):
+        # 'authors': usernames and photos of the users shown
+        return [f"post:{self.kwargs['pk']}", 'authors']
+    
+    def get_queryset(self):
+        return Post.objects.with_stats(self.request.user)
     
     def put(self, request, *args, **kwargs):
         post = self.get_object()
@@ -41,7 +83,10 @@ class PostRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
             raise PermissionDenied("You do not have permission to update this post")
         serializer = self.serializer_class(post,data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        post = serializer.save()
+        if 'media' in serializer.validated_data:
+            media.reschedule(post)
+            serializer.instance = Post.objects.with_stats(self.request.user).get(pk=post.pk)
         
         return Response({
             "success":True,
@@ -61,14 +106,58 @@ class PostRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
         })
         
         
-class PostCommentListAPIView(ListAPIView):
+class CommentTreeMixin:
+    """
+    `reply_depth` and `reply_limit` query params control how much of each
+    thread is rendered together with a comment.
+    """
+    reply_depth = 3
+    max_reply_depth = 10
+    reply_limit = 5
+    max_reply_limit = 50
+    
+    def get_reply_option(self, name, default, maximum):
+        query_params = getattr(self.request, 'query_params', self.request.GET)
+        try:
+            value = int(query_params.get(name, default))
+        except ValueError:
+            value = default
+        return max(0, min(value, maximum))
+    
+    def get_reply_options(self):
+        return {
+            'user': self.request.user,
+            'depth': self.get_reply_option('reply_depth', self.reply_depth, self.max_reply_depth),
+            'limit': self.get_reply_option('reply_limit', self.reply_limit, self.max_reply_limit),
+        }
+    
+    def load_replies(self, comments):
+        return load_replies(comments, **self.get_reply_options())
+    
+    def prepare_objects(self, objects):
+        return self.load_replies(objects)
+    
+    def get_etag_parts(self, obj):
+        parts = super().get_etag_parts(obj)
+        for reply in getattr(obj, 'loaded_replies', ()):
+            parts.append(self.get_etag_parts(reply))
+        return parts
+    
+    
+class PostCommentListAPIView(CachedResponseMixin, CommentTreeMixin, ConditionalGetMixin, ListAPIView):
     serializer_class = serializers.CommentSerializer
     permission_classes = [permissions.AllowAny,]
+    pagination_class = OldestFirstKeysetPagination
+    etag_fields = COMMENT_ETAG_FIELDS
+    
+    def get_cache_scopes(self):
+        # 'authors': usernames and photos of the users shown
+        return [f"post:{self.kwargs['pk']}", 'authors']
     
     def get_queryset(self):
         post_id = self.kwargs['pk']
         
-        queryset = PostComment.objects.filter(post__id=post_id, parent=None)
+        queryset = PostComment.objects.with_stats(self.request.user).filter(post__id=post_id, parent=None)
         return queryset
     
     
@@ -79,7 +168,9 @@ class PostCommentCreateAPIView(CreateAPIView):
     
     def perform_create(self, serializer):
         post_id = self.kwargs['pk']
-        serializer.save(author=self.request.user, post_id=post_id)
+        with transaction.atomic():
+            serializer.save(author=self.request.user, post_id=post_id)
+            add_post_comments(post_id)
         
         
 class PostCommentDeleteAPIView(DestroyAPIView):
@@ -90,8 +181,11 @@ class PostCommentDeleteAPIView(DestroyAPIView):
     
     def delete(self, request, *args, **kwargs):
         try:
-            like = self.get_object()  
-            like.delete()
+            comment = self.get_object()
+            with transaction.atomic():
+                # replies are removed by the cascade and must be uncounted too
+                deleted, deleted_per_model = comment.delete()
+                add_post_comments(comment.post_id, -deleted_per_model.get(PostComment._meta.label, 0))
             return Response({
                 "success": True,
                 "message": "Comment successfully deleted"
@@ -103,31 +197,51 @@ class PostCommentDeleteAPIView(DestroyAPIView):
             }, status=404)
         
         
-class PostCommentDetailAPIView(RetrieveAPIView):
+class PostCommentDetailAPIView(CommentTreeMixin, ConditionalGetMixin, RetrieveAPIView):
     permission_classes = [permissions.AllowAny,]
     serializer_class = serializers.CommentSerializer
-    queryset = PostComment.objects.all()
+    etag_fields = COMMENT_ETAG_FIELDS
+    
+    def get_queryset(self):
+        return PostComment.objects.with_stats(self.request.user)
         
         
-class PostLikeListAPIView(ListAPIView):
+class PostLikeListAPIView(CachedResponseMixin, ConditionalGetMixin, ListAPIView):
     serializer_class = serializers.PostLikeSerializer
     permission_classes = [permissions.AllowAny,]
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
+    etag_fields = LIKE_ETAG_FIELDS
+    
+    def get_cache_scopes(self):
+        # 'authors': usernames and photos of the users shown
+        return [f"post:{self.kwargs['pk']}", 'authors']
     
     def get_queryset(self):
         post_id = self.kwargs['pk']
-        return PostLike.objects.filter(post_id=post_id)
+        return PostLike.objects.filter(post_id=post_id).select_related('author')
 
 
 class PostLikeCreateAPIView(CreateAPIView):
     serializer_class = serializers.PostLikeSerializer
+    throttle_scope = 'like'
     permission_classes = [permissions.IsAuthenticated,]
     
+    def create(self, request, *args, **kwargs):
+        if like_buffer.enabled():
+            like_buffer.add('posts', request.user.pk, self.kwargs['pk'], True)
+            return Response({
+                "success":True,
+                "message":"Like accepted"
+            }, status=202)
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         try:
             post = Post.objects.get(id=self.kwargs['pk'])
             if not PostLike.objects.filter(author=self.request.user, post=post).exists():
-                serializer.save(author=self.request.user, post=post)
+                with transaction.atomic():
+                    serializer.save(author=self.request.user, post=post)
+                    add_post_likes(post.pk)
         except NotFound:
             raise NotFound("This post unavailable!")
     
@@ -141,7 +255,9 @@ class PostLikeDeleteAPIView(DestroyAPIView):
     def delete(self, request, *args, **kwargs):
         try:
             like = self.get_object()  # Automatically filtered by the current user in `get_queryset()`
-            like.delete()
+            with transaction.atomic():
+                like.delete()
+                add_post_likes(like.post_id, -1)
             return Response({
                 "success": True,
                 "message": "Like successfully deleted"
@@ -153,25 +269,38 @@ class PostLikeDeleteAPIView(DestroyAPIView):
             }, status=404)
 
 
-class PostCommentLikeListAPIView(ListAPIView):
+class PostCommentLikeListAPIView(ConditionalGetMixin, ListAPIView):
     serializer_class = serializers.CommentLikeSerializer
     permission_classes = [permissions.AllowAny,]
-    pagination_class = CustomPagination
+    pagination_class = KeysetPagination
+    etag_fields = LIKE_ETAG_FIELDS
     
     def get_queryset(self):
         comment_id = self.kwargs['pk']
-        return CommentLike.objects.filter(comment_id=comment_id)
+        return CommentLike.objects.filter(comment_id=comment_id).select_related('author')
     
 
 class PostCommentLikeCreateAPIView(CreateAPIView):
     serializer_class = serializers.CommentLikeSerializer
+    throttle_scope = 'like'
     permission_classes = [permissions.IsAuthenticated,]
     
+    def create(self, request, *args, **kwargs):
+        if like_buffer.enabled():
+            like_buffer.add('comments', request.user.pk, self.kwargs['pk'], True)
+            return Response({
+                "success":True,
+                "message":"Like accepted"
+            }, status=202)
+        return super().create(request, *args, **kwargs)
+    
     def perform_create(self, serializer):
         try:
             comment = PostComment.objects.get(id=self.kwargs['pk'])
             if not CommentLike.objects.filter(author=self.request.user, comment=comment).exists():
-                serializer.save(author=self.request.user, comment=comment)
+                with transaction.atomic():
+                    serializer.save(author=self.request.user, comment=comment)
+                    add_comment_likes(comment.pk)
         except NotFound:
             raise NotFound("This comment unavailable!")
         
@@ -185,7 +314,9 @@ class PostCommentLikeDeleteAPIView(DestroyAPIView):
     def delete(self, request, *args, **kwargs):
         try:
             like = self.get_object()
-            like.delete()
+            with transaction.atomic():
+                like.delete()
+                add_comment_likes(like.comment_id, -1)
             return Response({
                 "success": True,
                 "message": "Like successfully deleted"
@@ -195,39 +326,105 @@ class PostCommentLikeDeleteAPIView(DestroyAPIView):
                 "success": False,
                 "message": "Like not found or permission denied"
             }, status=404)
+
+
+
+class LikeLookupAPIView(GenericAPIView):
+    """Like counts and the viewer's liked flags for a batch of posts and comments."""
+    permission_classes = [permissions.AllowAny,]
+    serializer_class = serializers.LikeBatchSerializer
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({
+            "success":True,
+            "data":{
+                kind: liked_state(kind, request.user, serializer.validated_data.get(kind, []))
+                for kind in LIKE_TARGETS
+            }
+        })
+
+
+class LikeBatchAPIView(GenericAPIView):
+    """Like or unlike a batch of posts and comments; answers with their new state."""
+    permission_classes = [permissions.IsAuthenticated,]
+    serializer_class = serializers.LikeActionSerializer
+    throttle_scope = 'like-batch'
+    
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        liked = serializer.validated_data['action'] == 'like'
+        if like_buffer.enabled():
+            for kind in LIKE_TARGETS:
+                for pk in serializer.validated_data.get(kind, []):
+                    like_buffer.add(kind, request.user.pk, pk, liked)
+            return Response({
+                "success":True,
+                "message":"Likes accepted"
+            }, status=202)
+        change = like_many if liked else unlike_many
+        data = {}
+        for kind in LIKE_TARGETS:
+            ids = serializer.validated_data.get(kind, [])
+            if ids:
+                change(kind, request.user, ids)
+            data[kind] = liked_state(kind, request.user, ids)
+        return Response({
+            "success":True,
+            "message":"Likes successfully updated",
+            "data":data
+        })
             
             
-class SearchAPIView(GenericAPIView):
+class SearchMixin:
+    page_size = 10
+    max_page_size = 50
+    
+    def get_page_params(self, request):
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        try:
+            page_size = min(max(int(request.GET.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+        return page, page_size
+    
+    def get_search_querysets(self, query, page, page_size):
+        backend = get_search_backend()
+        start, end = (page - 1) * page_size, page * page_size
+        # one extra row tells whether there is a next page without COUNT(*)
+        users = backend.search_users(query)[start:end + 1]
+        posts = backend.search_posts(query).select_related('author')[start:end + 1]
+        return users, posts
+    
+    def get_search_results(self, request, page, page_size, users=(), posts=()):
+        has_next = len(users) > page_size or len(posts) > page_size
+        url = request.build_absolute_uri()
+        return {
+            'next': replace_query_param(url, 'page', page + 1) if has_next else None,
+            'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            'users': serializers.UserSearchSerializer(users[:page_size], many=True).data,
+            'posts': serializers.PostSearchSerializer(posts[:page_size], many=True).data
+        }
+            
+            
+class SearchAPIView(CachedResponseMixin, SearchMixin, GenericAPIView):
     permission_classes = [permissions.AllowAny,]
+    throttle_scope = 'search'
+    cache_scopes = ('posts', 'users')
+    
     def get(self, request, *args, **kwargs):
-        query = request.GET.get('q', '')
-        user_results, post_results = [], []
-
-        if query:
-            user_queryset = User.objects.filter(
-                Q(auth_status=DONE) | Q(auth_status=PHOTO_DONE) &
-                Q(username__icontains=query) |
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query)
-            ).annotate(
-                relevance=Count('username', filter=Q(username__icontains=query)) +
-                          Count('first_name', filter=Q(first_name__icontains=query)) +
-                          Count('last_name', filter=Q(last_name__icontains=query))
-            ).order_by('-relevance')
-
-            user_results = serializers.UserSearchSerializer(user_queryset, many=True).data
-            post_queryset = Post.objects.filter(
-                Q(caption__icontains=query)
-            ).annotate(
-                relevance=Count('caption', filter=Q(caption__icontains=query))
-            ).order_by('-relevance')
-
-            # Serialize the post results
-            post_results =  serializers.PostSearchSerializer(post_queryset, many=True).data
-
-        # Combine user and post results
-        results = {
-            'users': user_results,
-            'posts': post_results
-        }
-        return Response(results)
\ No newline at end of file
+        return self.cached_get(self.search, request, *args, **kwargs)
+    
+    def search(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        page, page_size = self.get_page_params(request)
+        if not query:
+            return Response(self.get_search_results(request, page, page_size))
+        
+        users, posts = self.get_search_querysets(query, page, page_size)
+        return Response(self.get_search_results(request, page, page_size, list(users), list(posts)))
@@ -1,10 +1,17 @@
 from django.contrib import admin
-from .models import User, UserConfirmation
+from .models import User, UserConfirmation, Follow
 # Register your models here.
 
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ['username', 'email', 'phone_number']
+    
+    def save_model(self, request, obj, form, change):
+        # the form edits the stored value; whatever is typed there is a raw password
+        if 'password' in form.changed_data:
+            obj.set_password(form.cleaned_data['password'])
+        super().save_model(request, obj, form, change)
 
 admin.site.register(User, UserAdmin)
-admin.site.register(UserConfirmation)
\ No newline at end of file
+admin.site.register(UserConfirmation)
+admin.site.register(Follow)
\ No newline at end of file
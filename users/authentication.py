@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from base_app.metrics import incr
+
+
+DEFAULTS = {
+    'ALIAS': None,          # None disables the cache
+    'TIMEOUT': 60,
+    'KEY_PREFIX': 'auth-user',
+    # user fields kept in the cache; the others are loaded from the database when read
+    'FIELDS': ('id', 'username', 'is_active', 'is_staff', 'is_superuser', 'auth_type', 'auth_status'),
+    # a per-process cache cannot be invalidated from other processes; only for a single process and tests
+    'ALLOW_LOCAL': False,
+}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def auth_cache_setting(name):
+    return getattr(settings, 'AUTH_USER_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_auth_cache():
+    """The cache of AUTH_USER_CACHE['ALIAS'], or None while the user cache is disabled."""
+    alias = auth_cache_setting('ALIAS')
+    if alias is None:
+        return None
+    cache = caches[alias]
+    if isinstance(cache, LocMemCache) and not auth_cache_setting('ALLOW_LOCAL'):
+        raise ImproperlyConfigured(
+            f"AUTH_USER_CACHE['ALIAS'] '{alias}' is a per-process cache, so deactivated or logged out "
+            "users would stay authenticated on other workers. Use a shared cache or set ALIAS to None."
+        )
+    return cache
+
+
+def user_key(user_id):
+    return f"{auth_cache_setting('KEY_PREFIX')}:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Drop the cached copy of a user, so the next request loads it from the database."""
+    cache = get_auth_cache()
+    if cache is not None:
+        cache.delete(user_key(user_id))
+
+
+def dump_user(user):
+    """
+    The cache entry of `user`: its AUTH_USER_CACHE['FIELDS'] and, instead of
+    the password hash, the digest that access tokens are checked against.
+    """
+    fields = {name: getattr(user, name) for name in auth_cache_setting('FIELDS')}
+    return {'fields': fields, 'revoke_hash': get_md5_hash_password(user.password)}
+
+
+def restore_user(model, entry):
+    """A user instance from a cache entry; fields that are not cached are deferred."""
+    fields = entry['fields']
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+    return model.from_db(router.db_for_read(model), names, [fields[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the resolved user in the cache for
+    AUTH_USER_CACHE['TIMEOUT'] seconds instead of selecting it on every
+    request. Saving or deleting a user drops the cached copy (see
+    users.signals), so the cache has to be shared by all processes; a
+    per-process cache is refused. Only AUTH_USER_CACHE['FIELDS'] are
+    cached, never the password hash.
+
+    Only safe methods use the cache. Views that change request.user
+    always get a fresh row, so a stale copy is never saved back.
+    """
+    def authenticate(self, request):
+        self.request = request
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        cache = get_auth_cache()
+        if cache is None or self.request.method not in SAFE_METHODS:
+            return super().get_user(validated_token)
+        user_id = self.get_user_id(validated_token)
+        entry = cache.get(user_key(user_id))
+        if entry is None:
+            incr('auth.user_cache.miss')
+            entry = dump_user(self.load_user(user_id))
+            cache.set(user_key(user_id), entry, auth_cache_setting('TIMEOUT'))
+        else:
+            incr('auth.user_cache.hit')
+        return self.check_user(restore_user(self.user_model, entry), validated_token, entry['revoke_hash'])
+
+    @staticmethod
+    def get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def load_user(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    @staticmethod
+    def check_user(user, validated_token, revoke_hash=None):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if revoke_hash is None:
+                revoke_hash = get_md5_hash_password(user.password)
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != revoke_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    CachedJWTAuthentication for async views. Header parsing and token
+    validation are pure CPU work and reused as is; only the cache and the
+    user lookup are awaited.
+    """
+    async def aauthenticate(self, request):
+        self.request = request
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        cache = get_auth_cache()
+        entry = None if cache is None else await cache.aget(user_key(user_id))
+        if entry is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if cache is None:
+                return self.check_user(user, validated_token)
+            incr('auth.user_cache.miss')
+            entry = dump_user(user)
+            await cache.aset(user_key(user_id), entry, auth_cache_setting('TIMEOUT'))
+        else:
+            incr('auth.user_cache.hit')
+        return self.check_user(restore_user(self.user_model, entry), validated_token, entry['revoke_hash'])
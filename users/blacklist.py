@@ -0,0 +1,175 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from base_app.metrics import incr
+
+
+DEFAULTS = {
+    'ERROR_RATE': 0.01,
+    'MIN_CAPACITY': 100000,
+    'SYNC_INTERVAL': 1,     # seconds between checks for tokens blacklisted by other processes
+    # ids are assigned at insert but become visible at commit, possibly out of
+    # order; every sync looks this many ids back so a late commit is not missed
+    'SYNC_LOOKBACK': 50,
+}
+
+
+def blacklist_setting(name):
+    return getattr(settings, 'TOKEN_BLACKLIST_FILTER', {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    """
+    Set membership in `capacity * -ln(error_rate) / ln(2)^2` bits, about
+    1.2 bytes per item at 1%. `item in filter` is never wrong when False and
+    wrong with probability `error_rate` when True, as long as no more than
+    `capacity` items were added.
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        # double hashing: k positions from two independent 64 bit halves
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        if item in self:
+            return
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class BlacklistFilter:
+    """
+    Bloom filter of blacklisted refresh token JTIs, so refreshing with a
+    token that is not blacklisted (nearly every refresh) needs no query.
+    A hit is confirmed against the database, because it may be a false
+    positive.
+
+    Each process builds its filter in the background at startup and
+    checks the database for rows it has not seen yet at most every
+    SYNC_INTERVAL seconds. Until the filter is built, checks go to the
+    database. The sync query runs outside the lock and only one thread
+    runs it at a time; the others check against the filter as it is.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ready = False
+        self.warming = False
+        self.syncing = False
+        self.filter = None
+        self.last_id = 0
+        self.synced_at = 0.0
+
+    def rebuild(self, chunk_size=10000):
+        total = BlacklistedToken.objects.count()
+        capacity = max(blacklist_setting('MIN_CAPACITY'), total * 2)
+        bloom = BloomFilter(capacity, blacklist_setting('ERROR_RATE'))
+        last_id = 0
+        while True:
+            # keyset batches, one short query each, instead of one cursor over the whole table
+            rows = list(
+                BlacklistedToken.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'token__jti')[:chunk_size]
+            )
+            if not rows:
+                break
+            for row_id, jti in rows:
+                bloom.add(jti)
+            last_id = rows[-1][0]
+        with self.lock:
+            # synced_at 0: the next check picks up what was blacklisted while building
+            self.filter, self.last_id, self.synced_at = bloom, last_id, 0.0
+            self.ready = True
+        incr('blacklist.rebuilds')
+
+    def warm(self):
+        try:
+            self.rebuild()
+        finally:
+            self.warming = False
+            # the thread's own connection, it would otherwise stay open
+            connection.close()
+
+    def warm_in_background(self):
+        with self.lock:
+            if self.warming:
+                return
+            self.warming = True
+        threading.Thread(target=self.warm, name='token-blacklist-warm', daemon=True).start()
+
+    def sync(self):
+        """Add tokens blacklisted by other processes since the last sync."""
+        with self.lock:
+            if self.syncing or time.monotonic() - self.synced_at < blacklist_setting('SYNC_INTERVAL'):
+                return
+            self.syncing = True
+            self.synced_at = time.monotonic()
+            since = self.last_id - blacklist_setting('SYNC_LOOKBACK')
+        try:
+            rows = list(
+                BlacklistedToken.objects.filter(id__gt=since).order_by('id').values_list('id', 'token__jti')
+            )
+        finally:
+            self.syncing = False
+        with self.lock:
+            for row_id, jti in rows:
+                self.filter.add(jti)
+                self.last_id = max(self.last_id, row_id)
+            saturated = self.filter.count > self.filter.capacity
+        if saturated:
+            # past its capacity the error rate climbs quickly; rebuild a bigger one
+            self.warm_in_background()
+
+    def add(self, jti):
+        if self.ready:
+            with self.lock:
+                self.filter.add(jti)
+
+    def is_blacklisted(self, jti):
+        if not self.ready:
+            self.warm_in_background()
+            incr('blacklist.db_checks')
+            return BlacklistedToken.objects.filter(token__jti=jti).exists()
+        self.sync()
+        if jti not in self.filter:
+            incr('blacklist.filter_negatives')
+            return False
+        incr('blacklist.db_checks')
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+    """RefreshToken that checks the blacklist through `blacklist_filter`."""
+    def check_blacklist(self):
+        if blacklist_filter.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        transaction.on_commit(lambda: blacklist_filter.add(jti))
+        return result
@@ -0,0 +1,65 @@
+import base64
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+# Costs of the tuned hashers below. Changing a value makes every stored hash
+# of that algorithm outdated; it is upgraded the next time its owner logs in.
+DEFAULTS = {
+    'pbkdf2_sha256': {'iterations': hashers.PBKDF2PasswordHasher.iterations},
+    'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 1},
+    'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+}
+
+
+def hasher_cost(algorithm, name):
+    return getattr(settings, 'PASSWORD_HASHER_COST', {}).get(algorithm, {}).get(name, DEFAULTS[algorithm][name])
+
+
+class TunedPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return hasher_cost('pbkdf2_sha256', 'iterations')
+
+
+class TunedScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """Memory hard; stdlib only, so it works without extra packages."""
+    @property
+    def work_factor(self):
+        return hasher_cost('scrypt', 'work_factor')
+
+    @property
+    def block_size(self):
+        return hasher_cost('scrypt', 'block_size')
+
+    @property
+    def parallelism(self):
+        return hasher_cost('scrypt', 'parallelism')
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        # OpenSSL refuses more than 32MB unless allowed; scrypt needs 128 * n * r
+        # bytes, and hashes stored with a higher cost than today's must still verify
+        hash_ = hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=256 * n * r, dklen=64)
+        hash_ = base64.b64encode(hash_).decode('ascii').strip()
+        return "%s$%d$%s$%d$%d$%s" % (self.algorithm, n, salt, r, p, hash_)
+
+
+class TunedArgon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs the argon2-cffi package."""
+    @property
+    def time_cost(self):
+        return hasher_cost('argon2', 'time_cost')
+
+    @property
+    def memory_cost(self):
+        return hasher_cost('argon2', 'memory_cost')
+
+    @property
+    def parallelism(self):
+        return hasher_cost('argon2', 'parallelism')
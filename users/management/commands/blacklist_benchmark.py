@@ -0,0 +1,71 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as DatabaseRefreshToken
+
+from users.blacklist import BloomFilter, RefreshToken, blacklist_filter, blacklist_setting
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure refresh token blacklist checks with and without the bloom filter, "
+        "optionally after inserting --populate blacklisted tokens (e.g. 10000000)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--populate', type=int, default=0, help="Blacklisted tokens to insert first")
+        parser.add_argument('--checks', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['populate']:
+            self.populate(options['populate'], options['batch_size'])
+        total = BlacklistedToken.objects.count()
+        self.stdout.write(f"{total} blacklisted tokens")
+
+        started = time.perf_counter()
+        blacklist_filter.rebuild()
+        bloom = blacklist_filter.filter
+        self.stdout.write(
+            f"filter built in {time.perf_counter() - started:.1f}s: {len(bloom.bits) / 1024 / 1024:.1f}MB, "
+            f"{bloom.hashes} hashes, capacity {bloom.capacity}"
+        )
+
+        user = User.objects.order_by('pk').first()
+        if user is None:
+            self.stdout.write("No user to issue tokens for, create one first")
+            return
+        tokens = [str(DatabaseRefreshToken.for_user(user)) for _ in range(options['checks'])]
+        # not blacklisted, the common case of a refresh
+        for name, token_class in (('database', DatabaseRefreshToken), ('bloom filter', RefreshToken)):
+            started = time.perf_counter()
+            for token in tokens:
+                token_class(token)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{name}: {len(tokens) / elapsed:.0f} refresh tokens verified/s")
+
+        probe = BloomFilter(max(total, 1), blacklist_setting('ERROR_RATE'))
+        for number in range(total):
+            probe.add(f"member-{number}")
+        misses = sum(f"other-{number}" in probe for number in range(100000))
+        self.stdout.write(f"false positive rate at capacity: {misses / 100000:.4f}")
+
+    def populate(self, count, batch_size):
+        expires_at = timezone.now() + timedelta(days=1)
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            jtis = [uuid.uuid4().hex for _ in range(size)]
+            OutstandingToken.objects.bulk_create(
+                [OutstandingToken(jti=jti, token='', expires_at=expires_at) for jti in jtis]
+            )
+            outstanding = OutstandingToken.objects.filter(jti__in=jtis).values_list('id', flat=True)
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=pk) for pk in outstanding])
+            created += size
+            self.stdout.write(f"{created}/{count} blacklisted tokens inserted", ending='\r')
+        self.stdout.write('')
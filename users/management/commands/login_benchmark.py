@@ -0,0 +1,48 @@
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+
+from users.models import User, DONE
+from users.serializers import LoginSerializer
+
+
+class Command(BaseCommand):
+    help = "Measure login throughput and the cost of every configured password hasher"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20)
+
+    def handle(self, *args, **options):
+        password = 'benchmark-password-1'
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except (ValueError, ImportError) as exc:
+                # argon2/bcrypt without their library
+                self.stdout.write(f"{hasher.algorithm}: unavailable ({exc})")
+                continue
+            started = time.perf_counter()
+            hasher.verify(password, encoded)
+            self.stdout.write(f"{hasher.algorithm}: {(time.perf_counter() - started) * 1000:.0f}ms per verify")
+
+        with transaction.atomic():
+            user = User(username='login_benchmark', email='login_benchmark@example.com', auth_status=DONE)
+            user.set_password(password)
+            user.save()
+            for user_input in ('login_benchmark', 'login_benchmark@example.com'):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(options['logins']):
+                        serializer = LoginSerializer(data={'user_input': user_input, 'password': password})
+                        serializer.is_valid(raise_exception=True)
+                    elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"login by {'email' if '@' in user_input else 'username'}: "
+                    f"{options['logins'] / elapsed:.1f} logins/s, {len(queries) / options['logins']:.1f} queries per login"
+                )
+            # the benchmark user is never kept
+            transaction.set_rollback(True)
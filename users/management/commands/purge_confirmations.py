@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import UserConfirmation
+
+
+class Command(BaseCommand):
+    help = "Delete expired verification codes in batches, confirmed or not"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--grace', type=int, default=0, help="Keep codes for this many seconds after they expire")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        purged = 0
+        while True:
+            pks = list(
+                UserConfirmation.objects.filter(expiration_time__lt=cutoff)
+                .order_by('expiration_time').values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            UserConfirmation.objects.filter(pk__in=pks).delete()
+            purged += len(pks)
+        self.stdout.write(f"{purged} expired verification codes purged")
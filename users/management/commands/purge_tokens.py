@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding refresh tokens, and their blacklist entries, in small batches. "
+        "Unlike flushexpiredtokens it never holds long locks on big tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between batches")
+
+    def handle(self, *args, **options):
+        now = aware_utcnow()
+        purged = 0
+        while True:
+            pks = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not pks:
+                break
+            # BlacklistedToken rows go with them through the cascade
+            OutstandingToken.objects.filter(pk__in=pks).delete()
+            purged += len(pks)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(f"{purged} expired tokens purged")
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_photo_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userconfirmation',
+            index=models.Index(fields=['user', 'is_confirmed', 'expiration_time'], name='confirmation_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userconfirmation',
+            index=models.Index(fields=['expiration_time'], name='confirmation_expiry_idx'),
+        ),
+    ]
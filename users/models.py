@@ -1,10 +1,13 @@
-from datetime import datetime,timedelta
+from datetime import timedelta
+import hmac
 import random
+import secrets
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import FileExtensionValidator
-from base_app.models import BaseModel
+from base_app.models import BaseModel, CounterFieldsMixin
 from rest_framework_simplejwt.tokens import RefreshToken
 
 ORDINARY_USER, MANAGER, ADMIN = "ordinary_user", "manager", "admin"
@@ -12,7 +15,7 @@ VIA_EMAIL, VIA_PHONE = "via_email", "via_phone"
 NEW, CODE_VERIFIED, DONE, PHOTO_DONE= "new", "code_verified","done", "photo_done"
 
 
-class User(AbstractUser, BaseModel):
+class User(CounterFieldsMixin, AbstractUser, BaseModel):
     USER_ROLES = (
         (ORDINARY_USER, ORDINARY_USER),
         (MANAGER, MANAGER),
@@ -35,8 +38,12 @@ class User(AbstractUser, BaseModel):
     auth_status = models.CharField(max_length=30, choices=AUTH_STATE, default=NEW)
     email = models.EmailField(null=True, unique=True, blank=True)
     phone_number = models.CharField(max_length=16, null=True, blank=True, unique=True)
-    photo = models.ImageField(upload_to="images/users/avatar/", null=True, blank=True, 
+    photo = models.ImageField(upload_to="images/users/avatar/", null=True, blank=True, db_index=True,
                               validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'heic'])])
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    
+    counter_fields = ('followers_count', 'following_count')
     
     def __str__(self):
         return f"{self.username}"
@@ -46,7 +53,7 @@ class User(AbstractUser, BaseModel):
         return f"{self.first_name} {self.last_name}"
     
     def create_verification_code(self, verification_type):
-        verification_code = f"{random.randint(1000,9999)}"
+        verification_code = f"{secrets.randbelow(9000) + 1000}"
         UserConfirmation.objects.create(
             user_id = self.id,
             verification_type = verification_type,
@@ -73,13 +80,12 @@ class User(AbstractUser, BaseModel):
             self.email = email
         
     def check_pass(self):
+        # a raw password is only ever stored through set_password(); guessing
+        # at save time whether `password` is already a hash would keep a raw
+        # one that happens to look like one (e.g. 'argon2$...') in plaintext
         if not self.password:
             password = f"password-{uuid.uuid4().__str__().split('-')[-1]}"
-            self.password = password
-            
-    def hashing_password(self):
-        if not self.password.startswith('pbkdf2_sha256'):
-            self.set_password(self.password)
+            self.set_password(password)
             
     def token(self):
         refresh = RefreshToken.for_user(self)
@@ -92,7 +98,6 @@ class User(AbstractUser, BaseModel):
         self.check_email()
         self.check_username()
         self.check_pass()
-        self.hashing_password()
     
     def save(self, *args, **kwargs) -> None:
         
@@ -104,6 +109,27 @@ EMAIL_EXPIRE = 5
 PHONE_EXPIRE = 2
 
 
+class UserConfirmationQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_confirmed=False, expiration_time__gte=timezone.now())
+    
+    def confirm(self, user, code):
+        """
+        Mark the active code `code` of `user` as confirmed; False when there
+        is none. Codes are compared in constant time, and the conditional
+        UPDATE lets only one of two concurrent requests confirm a code.
+        """
+        code = str(code or '').encode()
+        matched = None
+        for pk, stored in self.active().filter(user=user).values_list('pk', 'verification_code'):
+            # every candidate is compared, so timing does not tell which one matched
+            if hmac.compare_digest(stored.encode(), code) and matched is None:
+                matched = pk
+        if matched is None:
+            return False
+        return self.active().filter(pk=matched).update(is_confirmed=True, updated_at=timezone.now()) == 1
+    
+    
 class UserConfirmation(BaseModel):
     VERIFICATION_TYPES = (
         (VIA_EMAIL, VIA_EMAIL),
@@ -116,13 +142,42 @@ class UserConfirmation(BaseModel):
     expiration_time = models.DateTimeField(null=True)
     is_confirmed = models.BooleanField(default=False)
     
+    objects = UserConfirmationQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # active codes of a user: verification and the resend check
+            models.Index(fields=['user', 'is_confirmed', 'expiration_time'], name='confirmation_active_idx'),
+            # `manage.py purge_confirmations`
+            models.Index(fields=['expiration_time'], name='confirmation_expiry_idx'),
+        ]
+    
     def __str__(self):
         return f"insta-{self.user}"
     
     def save(self, *args, **kwargs):
-        if self.verification_type == VIA_EMAIL:
-            self.expiration_time = datetime.now() + timedelta(minutes=EMAIL_EXPIRE)
-        else:
-            self.expiration_time = datetime.now() + timedelta(minutes=PHONE_EXPIRE)
+        # set once; saving a code again must not extend its lifetime
+        if self.expiration_time is None:
+            minutes = EMAIL_EXPIRE if self.verification_type == VIA_EMAIL else PHONE_EXPIRE
+            self.expiration_time = timezone.now() + timedelta(minutes=minutes)
         super(UserConfirmation, self).save(*args, **kwargs)
-    
\ No newline at end of file
+    
+
+class Follow(BaseModel):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    following = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'following'],
+                name='follow'
+            ),
+            models.CheckConstraint(
+                condition=~models.Q(follower=models.F('following')),
+                name='follow_not_self'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.follower} follows {self.following}"
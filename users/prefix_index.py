@@ -0,0 +1,134 @@
+import threading
+
+from .models import User, DONE, PHOTO_DONE
+
+
+SEARCHABLE_STATUSES = [DONE, PHOTO_DONE]
+
+
+class TrieNode:
+    __slots__ = ('children', 'user_ids')
+
+    def __init__(self):
+        self.children = {}
+        self.user_ids = set()
+
+
+class UserPrefixIndex:
+    """
+    In-memory trie over lowercased username, first name, last name and full
+    name of verified users. A lookup walks the prefix and then collects
+    matches depth first until `limit` users are found, so its cost depends
+    on the prefix length and `limit`, not on the number of users.
+
+    Each process keeps its own copy, built on first use (or by warm())
+    and updated from User post_save/post_delete signals.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ready = False
+        self.root = TrieNode()
+        self.terms = {}
+        self.payloads = {}
+
+    @staticmethod
+    def user_terms(user):
+        full_name = f"{user.first_name} {user.last_name}".strip()
+        return {term.lower() for term in (user.username, user.first_name, user.last_name, full_name) if term}
+
+    @staticmethod
+    def user_payload(user):
+        return {
+            'id': str(user.pk),
+            'username': user.username,
+            'full_name': user.full_name,
+            'photo': user.photo.url if user.photo else None,
+        }
+
+    def _insert(self, term, user_id):
+        node = self.root
+        for char in term:
+            node = node.children.setdefault(char, TrieNode())
+        node.user_ids.add(user_id)
+
+    def _delete(self, term, user_id):
+        path, node = [], self.root
+        for char in term:
+            if char not in node.children:
+                return
+            path.append((node, char))
+            node = node.children[char]
+        node.user_ids.discard(user_id)
+        # prune branches that no longer lead to any user
+        for parent, char in reversed(path):
+            child = parent.children[char]
+            if child.user_ids or child.children:
+                break
+            del parent.children[char]
+
+    def _remove(self, user_id):
+        for term in self.terms.pop(user_id, ()):
+            self._delete(term, user_id)
+        self.payloads.pop(user_id, None)
+
+    def _add(self, user):
+        user_id = str(user.pk)
+        self._remove(user_id)
+        if user.auth_status not in SEARCHABLE_STATUSES:
+            return
+        terms = self.user_terms(user)
+        for term in terms:
+            self._insert(term, user_id)
+        self.terms[user_id] = terms
+        self.payloads[user_id] = self.user_payload(user)
+
+    def warm(self, chunk_size=2000):
+        with self.lock:
+            self.root, self.terms, self.payloads = TrieNode(), {}, {}
+            users = User.objects.filter(auth_status__in=SEARCHABLE_STATUSES).only(
+                'id', 'username', 'first_name', 'last_name', 'photo', 'auth_status'
+            )
+            for user in users.iterator(chunk_size=chunk_size):
+                self._add(user)
+            self.ready = True
+
+    def update(self, user):
+        if self.ready:
+            with self.lock:
+                self._add(user)
+
+    def remove(self, user_id):
+        if self.ready:
+            with self.lock:
+                self._remove(str(user_id))
+
+    def ensure_ready(self):
+        if not self.ready:
+            with self.lock:
+                if not self.ready:
+                    self.warm()
+
+    def warm_in_background(self):
+        threading.Thread(target=self.ensure_ready, name='user-prefix-index-warm', daemon=True).start()
+
+    def search(self, prefix, limit=10):
+        self.ensure_ready()
+        prefix = prefix.lower()
+        with self.lock:
+            node = self.root
+            for char in prefix:
+                node = node.children.get(char)
+                if node is None:
+                    return []
+            found, seen, stack = [], set(), [node]
+            while stack and len(found) < limit:
+                node = stack.pop()
+                for user_id in sorted(node.user_ids - seen):
+                    seen.add(user_id)
+                    found.append(user_id)
+                # reversed so that the alphabetically first child is visited first
+                stack.extend(node.children[char] for char in sorted(node.children, reverse=True))
+            return [self.payloads[user_id] for user_id in found[:limit]]
+
+
+user_prefix_index = UserPrefixIndex()
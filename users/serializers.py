@@ -1,6 +1,5 @@
 from typing import Any, Dict
 from django.db.models import Q
-from django.contrib.auth import authenticate
 from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import PermissionDenied
@@ -11,7 +10,10 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, Toke
 from rest_framework_simplejwt.tokens import AccessToken
 
 from .models import User, VIA_EMAIL, VIA_PHONE, NEW, CODE_VERIFIED, DONE, PHOTO_DONE
+from .authentication import invalidate_user
+from .blacklist import RefreshToken
 from base_app.utils import check_email_or_phone, send_async_mail, send_sms_verification_code, check_username
+from base_app import uploads
 
 
 class SignUpSerializer(serializers.ModelSerializer):
@@ -37,16 +39,14 @@ class SignUpSerializer(serializers.ModelSerializer):
         user = super(SignUpSerializer, self).create(validated_data)
         if user.auth_type == VIA_EMAIL:
             code = user.create_verification_code(VIA_EMAIL)
-            print(code)
             send_async_mail(
                 "Instagram authentication",
                 f"Your confirmation code: {code}",
                 [user.email,]
             )
         elif user.auth_type == VIA_PHONE:
-            code = user.create_verification_code(VIA_EMAIL)
-            #send_sms_verification_code(user.phone_number, code) #It's not working if you don't have twilio subscription!
-            print(code)
+            code = user.create_verification_code(VIA_PHONE)
+            send_sms_verification_code(user.phone_number, code)
         user.save()
         return user
         
@@ -158,7 +158,6 @@ class UpdateUserInfoSerializer(serializers.Serializer):
         instance.username = validated_data.get('username',instance.username)
         instance.first_name = validated_data.get('first_name',instance.first_name)
         instance.last_name = validated_data.get('last_name',instance.last_name)
-        instance.password = validated_data.get('password',instance.password)
         if validated_data.get('password'):
             instance.set_password(validated_data.get('password'))
         if instance.auth_status == CODE_VERIFIED:
@@ -169,23 +168,36 @@ class UpdateUserInfoSerializer(serializers.Serializer):
 
 
 class SetUserPhotoSerializer(serializers.Serializer):
-    photo = serializers.ImageField()
+    photo = serializers.ImageField(required=False)
+    upload = serializers.UUIDField(write_only=True, required=False)    #id of a finalized avatar upload
     
     def validate_photo(self, data):
-        file_size = data.size
-        max_size = 10 * 1024 * 1024 #10MB
-        if file_size>max_size:
-            ValidationError({
+        uploads.check_file('avatar', data.name, data.size)
+        return data
+    
+    def validate_upload(self, value):
+        return uploads.get_completed_session(self.context['request'].user, value, 'avatar')
+    
+    def validate(self, data):
+        if ('photo' in data) == ('upload' in data):
+            raise ValidationError({
                 'success':False,
-                'message':'Image file is too large. Maximum allowed size is 10MB.'
+                'message':'Send either a photo or the id of a finalized upload'
             })
         return data
     
     def update(self, instance, validated_data):
-        instance.photo = validated_data.get('photo', instance.photo)
+        upload = validated_data.get('upload')
+        if upload is not None:
+            with uploads.open_upload(upload) as file:
+                instance.photo.save(upload.filename, file, save=False)
+        else:
+            instance.photo = validated_data.get('photo', instance.photo)
         if instance.auth_status == DONE and instance.photo:
             instance.auth_status = PHOTO_DONE
         instance.save()
+        if upload is not None:
+            uploads.discard(upload)
         return instance
     
 
@@ -197,52 +209,34 @@ class LoginSerializer(TokenObtainPairSerializer):
         
     def auth_validate(self, data):
         user_input = data.get('user_input')
+        # classified once; emails are stored lowercased, so the lookup can use the unique index
+        lookups = {
+            'email': ('email', lambda value: value.lower(), 'No user found for this email'),
+            'phone': ('phone_number', lambda value: value, 'No user found for this phone number'),
+            'username': ('username', lambda value: value, 'No user found for this username'),
+        }
+        input_type = check_email_or_phone(user_input)
+        if input_type not in lookups:
+            raise ValidationError({
+                'message':'No user found. Check your login data or Register now!'
+            })
+        field, normalize, not_found = lookups[input_type]
+        user = User.objects.filter(**{field: normalize(user_input)}).first()
+        if user is None:
+            raise ValidationError({
+                'message': not_found
+            })
         
-        if check_email_or_phone(user_input)=="email":
-            try:
-                user = User.objects.get(email__iexact=user_input)
-                username = user.username
-            except:
-                raise ValidationError({
-                    'message':'No user found for this email'
-                })
-        elif check_email_or_phone(user_input)=="phone":
-            try:
-                user = User.objects.get(phone_number=user_input)
-                username = user.username
-            except Exception as e:
-                raise ValidationError({
-                    'message':'No user found for this phone number'
-                })
-        elif check_email_or_phone(user_input)=="username":
-            try:
-                user = User.objects.get(username=user_input)
-                username = user.username
-            except:
-                raise ValidationError({
-                    'message':'No user found for this username'
-                })
-        else:
-                raise ValidationError({
-                    'message':'No user found. Check your login data or Register now!'
-                })
-        
-        authentication_kwargs = {
-            self.username_field : username,
-            "password":data["password"]
-        }    
-        
-        if user is not None and user.auth_status in [CODE_VERIFIED, NEW]:
+        if user.auth_status in [CODE_VERIFIED, NEW]:
             raise ValidationError({
                 'message': 'You are not fully registered yet!'
             })
-        user = authenticate(**authentication_kwargs)
-        if user is not None:
-            self.user = user
-        else:
+        # check_password() also rehashes the password when the hasher or its cost changed
+        if not user.is_active or not user.check_password(data['password']):
             raise ValidationError({
                 'message':'Sorry, your username or password incorrect, please try again!'
             })
+        self.user = user
         
     def validate(self, attrs: Dict[str, Any]) -> Dict[str, str]:
         self.auth_validate(attrs)
@@ -255,6 +249,8 @@ class LoginSerializer(TokenObtainPairSerializer):
         
         
 class RefreshTokenSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
+    
     def validate(self, attrs: Dict[str, Any]) -> Dict[str, str]:
         data = super().validate(attrs)
         acces_token_instance = AccessToken(data["access"])
@@ -313,4 +309,7 @@ class ResetUserPasswordSerializer(serializers.ModelSerializer):
         password = validated_data.pop('password') # .pop() Retrieves and removes 'password' from validated_data
         instance.set_password(password)
         instance.save()
+        # save() already did this through users.signals; a password change
+        # must never leave the old user behind, so it does not rely on it
+        invalidate_user(instance.pk)
         return super().update(instance, validated_data)
\ No newline at end of file
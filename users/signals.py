@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from base_app.storage import track_files
+from .authentication import invalidate_user
+from .models import User
+from .prefix_index import user_prefix_index
+
+
+track_files(User)
+
+@receiver(post_save, sender=User)
+def update_prefix_index(sender, instance, **kwargs):
+    user_prefix_index.update(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_prefix_index(sender, instance, **kwargs):
+    user_prefix_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
@@ -1,3 +1,242 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import get_auth_cache, user_key
+from .blacklist import BlacklistFilter
+from .models import User, UserConfirmation, CODE_VERIFIED, DONE, NEW, VIA_EMAIL
+from .prefix_index import user_prefix_index
+from .serializers import UpdateUserInfoSerializer
+
+
+def create_user(username, **fields):
+    return User.objects.create(username=username, email=f'{username}@example.com', auth_status=DONE, **fields)
+
+
+class ConfirmationTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create(username='alice', email='alice@example.com', auth_status=NEW, auth_type=VIA_EMAIL)
+        self.code = self.user.create_verification_code(VIA_EMAIL)
+
+    def test_right_code_confirms_once(self):
+        self.assertTrue(UserConfirmation.objects.confirm(self.user, self.code))
+        self.assertFalse(UserConfirmation.objects.confirm(self.user, self.code))
+
+    def test_wrong_code(self):
+        wrong = '1000' if self.code != '1000' else '1001'
+        self.assertFalse(UserConfirmation.objects.confirm(self.user, wrong))
+        self.assertFalse(UserConfirmation.objects.confirm(self.user, None))
+        self.assertTrue(UserConfirmation.objects.confirm(self.user, self.code))
+
+    def test_expired_code(self):
+        UserConfirmation.objects.update(expiration_time=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(UserConfirmation.objects.confirm(self.user, self.code))
+
+    def test_code_of_another_user(self):
+        other = User.objects.create(username='bob', email='bob@example.com')
+        self.assertFalse(UserConfirmation.objects.confirm(other, self.code))
+
+    def test_verify_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.post('/users/verify/', {'verification_code': self.code}).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.auth_status, CODE_VERIFIED)
+        self.assertEqual(client.post('/users/verify/', {'verification_code': self.code}).status_code, 400)
+
+
+class PasswordTests(TestCase):
+    def test_new_user_gets_a_hashed_password(self):
+        user = create_user('alice')
+        self.assertTrue(user.has_usable_password())
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    def test_password_that_looks_like_a_hash_is_hashed(self):
+        user = create_user('alice')
+        raw = 'argon2$argon2id$v=19$m=102400,t=2,p=8$c2FsdA$aGFzaA'
+        serializer = UpdateUserInfoSerializer(user, data={'password': raw, 'confirm_password': raw}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        user.refresh_from_db()
+        self.assertNotEqual(user.password, raw)
+        self.assertTrue(user.check_password(raw))
+
+    def test_saving_keeps_the_hash(self):
+        user = create_user('alice')
+        user.set_password('secret-password')
+        user.save()
+        user.first_name = 'Alice'
+        user.save()
+        self.assertTrue(user.check_password('secret-password'))
+
+
+class LoginRehashTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = create_user('alice')
+
+    def login(self, password):
+        return APIClient().post('/users/login/', {'user_input': 'alice', 'password': password})
+
+    def test_hash_of_an_older_hasher_is_upgraded(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret-password', hasher='pbkdf2_sha1'))
+        self.assertEqual(self.login('secret-password').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('secret-password'))
+
+    def test_hash_of_an_older_cost_is_upgraded(self):
+        with self.settings(PASSWORD_HASHER_COST={'pbkdf2_sha256': {'iterations': 1000}}):
+            self.user.set_password('secret-password')
+            self.user.save()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_HASHER_COST={'pbkdf2_sha256': {'iterations': 2000}}):
+            # a wrong password changes nothing
+            self.assertEqual(self.login('wrong-password').status_code, 400)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+            self.assertEqual(self.login('secret-password').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+
+@override_settings(AUTH_USER_CACHE={'ALIAS': 'default', 'ALLOW_LOCAL': True})
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = create_user('alice')
+        self.user.set_password('secret-password')
+        self.user.save()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_cache_holds_no_password_hash(self):
+        self.assertEqual(self.client.get('/post/feed/').status_code, 200)
+        entry = caches['default'].get(user_key(self.user.pk))
+        self.assertNotIn('password', entry['fields'])
+        self.assertNotIn(self.user.password, repr(entry))
+
+    def test_cached_user_saves_the_lookup(self):
+        self.client.get('/post/feed/')
+        with self.assertNumQueries(1):
+            # only the feed itself
+            self.client.get('/post/feed/')
+
+    def test_deactivated_user_is_rejected_at_once(self):
+        self.client.get('/post/feed/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/post/feed/').status_code, 401)
+
+    def test_uncached_fields_are_loaded_on_access(self):
+        self.client.get('/post/feed/')
+        response = self.client.get('/post/feed/')
+        user = response.wsgi_request.user
+        self.assertEqual(user.email, 'alice@example.com')
+
+    @override_settings(AUTH_USER_CACHE={'ALIAS': 'default'})
+    def test_per_process_cache_is_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_auth_cache()
+
+    @override_settings(AUTH_USER_CACHE={'ALIAS': None})
+    def test_disabled_cache(self):
+        self.assertIsNone(get_auth_cache())
+        self.assertEqual(self.client.get('/post/feed/').status_code, 200)
+        self.assertIsNone(caches['default'].get(user_key(self.user.pk)))
+
+
+@override_settings(TOKEN_BLACKLIST_FILTER={'SYNC_INTERVAL': 0, 'SYNC_LOOKBACK': 2})
+class BlacklistFilterTests(TestCase):
+    def setUp(self):
+        self.user = create_user('alice')
+        self.filter = BlacklistFilter()
+        self.filter.rebuild()
+
+    def blacklist(self, jti):
+        token = OutstandingToken.objects.create(user=self.user, jti=jti, token=jti, expires_at='2100-01-01T00:00Z')
+        return BlacklistedToken.objects.create(token=token)
+
+    def test_sync_picks_up_tokens_blacklisted_elsewhere(self):
+        self.assertFalse(self.filter.is_blacklisted('elsewhere'))
+        self.blacklist('elsewhere')
+        self.assertTrue(self.filter.is_blacklisted('elsewhere'))
+
+    def test_sync_reads_only_the_last_rows(self):
+        for number in range(10):
+            last = self.blacklist(f'token-{number}')
+        self.filter.sync()
+        self.assertEqual(self.filter.last_id, last.pk)
+        self.blacklist('new')
+        with mock.patch.object(self.filter.filter, 'add', wraps=self.filter.filter.add) as add:
+            self.filter.sync()
+        # the new row plus SYNC_LOOKBACK already seen ones
+        self.assertEqual(add.call_count, 3)
+
+    def test_sync_in_progress_is_not_waited_for(self):
+        self.filter.syncing = True
+        self.blacklist('elsewhere')
+        with self.assertNumQueries(0):
+            self.filter.sync()
+        self.assertNotIn('elsewhere', self.filter.filter)
+
+
+class PrefixIndexTests(TestCase):
+    def setUp(self):
+        # built from this test's users, and rebuilt after its rollback
+        user_prefix_index.ready = False
+        self.addCleanup(setattr, user_prefix_index, 'ready', False)
+        self.alice = create_user('alice', first_name='Alice', last_name='Smith')
+        create_user('alicia')
+        create_user('bob')
+
+    def usernames(self, prefix, limit=10):
+        return [user['username'] for user in user_prefix_index.search(prefix, limit)]
+
+    def test_prefix_lookup(self):
+        self.assertEqual(self.usernames('ali'), ['alice', 'alicia'])
+        self.assertEqual(self.usernames('ALIC'), ['alice', 'alicia'])
+        self.assertEqual(self.usernames('alice s'), ['alice'])
+        self.assertEqual(self.usernames('smi'), ['alice'])
+        self.assertEqual(self.usernames('carol'), [])
+
+    def test_signals_keep_the_index_current(self):
+        user_prefix_index.ensure_ready()
+        User.objects.create(username='alfred', email='alfred@example.com', auth_status=NEW)
+        carol = create_user('carol')
+        self.assertEqual(self.usernames('al'), ['alice', 'alicia'])
+        self.assertEqual(self.usernames('car'), ['carol'])
+
+        self.alice.username = 'zoe'
+        self.alice.save()
+        self.assertEqual(self.usernames('zo'), ['zoe'])
+        # still found by name
+        self.assertEqual(self.usernames('alic'), ['zoe', 'alicia'])
+        self.assertEqual(self.usernames('alice'), ['zoe'])
+        bob = User.objects.get(username='bob')
+        bob.username = 'robert'
+        bob.save()
+        self.assertEqual(self.usernames('bo'), [])
+        self.assertEqual(self.usernames('rob'), ['robert'])
+
+        carol.delete()
+        self.assertEqual(self.usernames('car'), [])
+        # the branch that only led to carol is gone
+        self.assertNotIn('c', user_prefix_index.root.children)
+
+    def test_limit(self):
+        for number in range(12):
+            create_user(f'user{number:02}')
+        self.assertEqual(self.usernames('user', 5), [f'user{number:02}' for number in range(5)])
+        response = APIClient().get('/search/users/prefix/?q=user&limit=3')
+        self.assertEqual([user['username'] for user in response.json()['results']], ['user00', 'user01', 'user02'])
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import CreateUserAPIView, VerifyAPIView, GetNewVerificationCodeAPIView, \
     UpdateUserInfoAPIView, SetOrUpdateUserPhotoAPIView, LoginAPIView, LoginRefreshAPIView,\
-        LogoutAPIView, ForgotPasswordAPIView, ResetUserPasswordAPIView
+        LogoutAPIView, ForgotPasswordAPIView, ResetUserPasswordAPIView, FollowAPIView
 
 urlpatterns = [
     path('login/', LoginAPIView.as_view()),
@@ -14,4 +14,5 @@ urlpatterns = [
     path('update-user-photo/', SetOrUpdateUserPhotoAPIView.as_view()),
     path('forgot-password/', ForgotPasswordAPIView.as_view()),
     path('reset-password/', ResetUserPasswordAPIView.as_view()),
+    path('<uuid:pk>/follow/', FollowAPIView.as_view()),
 ]
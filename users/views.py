@@ -1,30 +1,36 @@
 from django.shortcuts import render
-from datetime import datetime
+from django.db import IntegrityError, transaction
 from rest_framework.generics import CreateAPIView, UpdateAPIView
 from rest_framework.views import APIView
 from rest_framework import permissions
 from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 
 from .serializers import SignUpSerializer, UpdateUserInfoSerializer, \
     SetUserPhotoSerializer, LoginSerializer, RefreshTokenSerializer,\
         LogoutSerializer, ForgotPasswordSerializer, ResetUserPasswordSerializer
-from .models import User, DONE, CODE_VERIFIED, VIA_EMAIL, VIA_PHONE, PHOTO_DONE
+from .models import User, UserConfirmation, Follow, DONE, CODE_VERIFIED, VIA_EMAIL, VIA_PHONE, PHOTO_DONE
+from .authentication import invalidate_user
+from .blacklist import RefreshToken
+from base_app.counters import shift_counter
 from base_app.utils import send_async_mail, send_sms_verification_code, check_email_or_phone
+from post.timeline import get_timeline_store, backfill_timeline
+from .prefix_index import user_prefix_index
 
 
 
 class CreateUserAPIView(CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny, )
+    throttle_scope = 'signup'
     serializer_class = SignUpSerializer
     
     
 class VerifyAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = 'verify'
     
     def post(self, requset, *args, **kwargs):
         user = self.request.user
@@ -43,14 +49,10 @@ class VerifyAPIView(APIView):
         
     @staticmethod
     def check_verification_code(user, code):
-        verifications = user.user_verification_codes.filter(
-            expiration_time__gte = datetime.now(), verification_code=code, is_confirmed=False)
-        if not verifications.exists():
+        if not UserConfirmation.objects.confirm(user, code):
             raise ValidationError({
                 'message':'Your verification code is invalid or has expired!'
             })
-        else:
-            verifications.update(is_confirmed=True)
         if user.auth_status not in [DONE, PHOTO_DONE]:
             user.auth_status = CODE_VERIFIED
             user.save()
@@ -59,6 +61,7 @@ class VerifyAPIView(APIView):
     
 class GetNewVerificationCodeAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated,]
+    throttle_scope = 'verify-resend'
     
     def get(self, request, *args, **kwargs):
         user = self.request.user
@@ -70,8 +73,7 @@ class GetNewVerificationCodeAPIView(APIView):
                                   [user.email])
         elif user.auth_type == VIA_PHONE:
             code = user.create_verification_code(VIA_PHONE)
-            # send_sms_verification_code(user.phone_number, code) #It's not working if you don't have twilio subscription!
-            print(code)
+            send_sms_verification_code(user.phone_number, code)
         else:
             raise ValidationError({
                 'message':'Your phone number or email incorrect'
@@ -84,9 +86,7 @@ class GetNewVerificationCodeAPIView(APIView):
         
     @staticmethod
     def check_verification(user):
-        verifications = user.user_verification_codes.filter(
-            expiration_time__gte = datetime.now(),  is_confirmed=False)
-        if verifications.exists():
+        if user.user_verification_codes.active().exists():
             raise ValidationError({
                 'message':'Your code has been sent, please wait!'
             })
@@ -132,6 +132,7 @@ class SetOrUpdateUserPhotoAPIView(UpdateAPIView):
         
 class LoginAPIView(TokenObtainPairView):
     serializer_class = LoginSerializer
+    throttle_scope = 'login'
     
 
 class LoginRefreshAPIView(TokenRefreshView):
@@ -148,6 +149,7 @@ class LogoutAPIView(APIView):
             refresh_token = self.request.data['refresh']
             token = RefreshToken(refresh_token)
             token.blacklist()
+            invalidate_user(request.user.pk)
             return Response({
                 'success':True,
                 'message':'You successfully logged out!'
@@ -158,6 +160,7 @@ class LogoutAPIView(APIView):
     
 class ForgotPasswordAPIView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'forgot-password'
     serializer_class = ForgotPasswordSerializer
     
     def post(self, requst, *args, **kwargs):
@@ -172,8 +175,7 @@ class ForgotPasswordAPIView(APIView):
                             [email_or_phone,])
         elif check_email_or_phone(email_or_phone)=="phone":
             code = user.create_verification_code(VIA_PHONE)
-            # send_sms_verification_code(email_or_phone, code) #If you don't have twilio subscription this function doesn't works
-            print(code)
+            send_sms_verification_code(email_or_phone, code)
             
         return Response({
             'success':True,
@@ -200,4 +202,75 @@ class ResetUserPasswordAPIView(UpdateAPIView):
             'message':'Your Password Changed Successfully!',
             'access': user.token()['access'],
             'refresh': user.token()['refresh_token']
-        })
\ No newline at end of file
+        })
+
+
+class FollowAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated,]
+    
+    def get_target(self):
+        try:
+            target = User.objects.get(id=self.kwargs['pk'], auth_status__in=[DONE, PHOTO_DONE])
+        except User.DoesNotExist:
+            raise NotFound("User not found")
+        if target.pk == self.request.user.pk:
+            raise ValidationError({
+                'message':'You can not follow yourself'
+            })
+        return target
+    
+    def post(self, request, *args, **kwargs):
+        target = self.get_target()
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower=request.user, following=target)
+                shift_counter(User.objects.filter(pk=request.user.pk), 'following_count', 1)
+                shift_counter(User.objects.filter(pk=target.pk), 'followers_count', 1)
+        except IntegrityError:
+            return Response({
+                'success':False,
+                'message':'You already follow this user'
+            }, status=400)
+        transaction.on_commit(lambda: backfill_timeline(request.user, target))
+        return Response({
+            'success':True,
+            'message':f'You are now following {target.username}'
+        }, status=201)
+    
+    def delete(self, request, *args, **kwargs):
+        target = self.get_target()
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=request.user, following=target).delete()
+            if deleted:
+                shift_counter(User.objects.filter(pk=request.user.pk), 'following_count', -1)
+                shift_counter(User.objects.filter(pk=target.pk), 'followers_count', -1)
+        if not deleted:
+            return Response({
+                'success':False,
+                'message':'You do not follow this user'
+            }, status=404)
+        get_timeline_store().remove_author(request.user.pk, target.pk)
+        return Response({
+            'success':True,
+            'message':f'You unfollowed {target.username}'
+        })
+
+
+class UserPrefixSearchAPIView(APIView):
+    permission_classes = [permissions.AllowAny,]
+    default_limit = 10
+    max_limit = 50
+    
+    def get(self, request, *args, **kwargs):
+        prefix = request.GET.get('q', '').strip()
+        try:
+            limit = min(max(int(request.GET.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        results = user_prefix_index.search(prefix, limit) if prefix else []
+        return Response({
+            'results': [
+                dict(user, photo=request.build_absolute_uri(user['photo'])) if user['photo'] else user
+                for user in results
+            ]
+        })